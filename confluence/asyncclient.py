@@ -0,0 +1,860 @@
+"""
+An asyncio version of the Confluence client.
+
+Requires Python 3.6+ and aiohttp, install with
+``pip install confluence-rest-library[async]``.
+"""
+import asyncio
+import logging
+import os
+import ssl
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import aiohttp
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from confluence.attachmentsync import HASH_ALGORITHM, HASH_PROPERTY, SyncResult, file_digest, hash_record, unchanged
+from confluence.bulk import BulkResult, PageSpec, _fail_descendants, _ordered_results, _plan, size_batches
+from confluence.cache import HttpCache, ObjectCache
+from confluence.client import CQL_MAX_IDS, CQL_MAX_LENGTH, MAX_BATCH_BYTES, MAX_BATCH_FILES, STREAM_CHUNK_SIZE, Confluence, \
+    _attachment_body, _attachment_download, _attachment_files, _can_resend, _check_size, _count_chunk, \
+    _finish_download, _id_batches, _last_byte, _make_dirs, _match_attachments, _open_destination, _range_headers, \
+    _range_response, _range_shortfall, _range_wanted
+from confluence.codec import JsonCodec
+from confluence.contentstore import ContentStore
+from confluence.download import RangesNotSupported, join_segments, partial_path, partial_size, remove_segments, \
+    segment_ranges
+from confluence.exceptions.generalerror import ConfluenceError
+from confluence.exceptions.resourcenotfound import ConfluenceResourceNotFound
+from confluence.exceptions.timeout import ConfluenceTimeout
+from confluence.exceptions.versionconflict import ConfluenceVersionConflict
+from confluence.export import ExportManifest, ExportResult, attachment_path
+from confluence.metrics import Metrics
+from confluence.mirror import LISTING_PAGE_SIZE, OVERLAP_MINUTES, MirrorResult, MirrorRun, MirrorStore
+from confluence.models.content import Content, ContentProperty, ContentStatus, ContentType
+from confluence.models.space import SpaceProperty
+from confluence.multipart import MultipartEncoder, ProgressCallback, ProgressTotal, content_length
+from confluence.ratelimit import RateLimiter, RequestKind
+from confluence.retry import RetryPolicy, clock
+from confluence.timeouts import DEFAULT_TIMEOUT, CallOptions, Timeout
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+class AsyncConfluence(Confluence):
+    """
+    Asyncio interface into this library with the same methods as Confluence.
+
+    Methods which return a single object are coroutines and methods which
+    return an iterable of results return an async iterator which fetches each
+    page on demand. e.g.
+    ```
+    async with AsyncConfluence(...) as c:
+        page = await c.get_content_by_id(1)
+        async for p in c.search('space = SP'):
+            ...
+    ```
+
+    Many calls can be awaited concurrently from a single client, the number
+    of simultaneous connections is bounded by pool_maxsize.
+    """
+
+    def __init__(self,
+                 base_url,  # type: str
+                 basic_auth,  # type: Tuple[str, str]
+                 verify_confluence_certificate=True,  # type: Union[bool, str]
+                 pool_connections=10,  # type: int
+                 pool_maxsize=100,  # type: int
+                 keep_alive=True,  # type: bool
+                 retry_policy=None,  # type: Optional[RetryPolicy]
+                 rate_limiter=None,  # type: Optional[RateLimiter]
+                 prefetch_pages=0,  # type: int
+                 parallel_pages=0,  # type: int
+                 ordered_pages=True,  # type: bool
+                 page_size=None,  # type: Optional[int]
+                 stream_pages=False,  # type: bool
+                 json_codec=None,  # type: Optional[JsonCodec]
+                 timeout=DEFAULT_TIMEOUT,  # type: Timeout
+                 deadline=None,  # type: Optional[float]
+                 http2=False,  # type: bool
+                 http_cache=None,  # type: Optional[HttpCache]
+                 object_cache=None,  # type: Optional[ObjectCache]
+                 content_store=None,  # type: Optional[ContentStore]
+                 coalesce_requests=False,  # type: bool
+                 metrics=None,  # type: Optional[Metrics]
+                 ):  # type: (...) -> None
+        """
+        Takes the same parameters as Confluence. pool_maxsize is the maximum
+        number of requests in flight to a single host and defaults to 100.
+
+        The caches, the content store and request coalescing are only
+        implemented by the synchronous client, so http_cache, object_cache
+        and content_store must be None and coalesce_requests False.
+        """
+        if http_cache is not None or object_cache is not None or content_store is not None or coalesce_requests:
+            raise ValueError('AsyncConfluence does not support http_cache, object_cache, content_store or '
+                             'coalesce_requests')
+
+        super(AsyncConfluence, self).__init__(base_url, basic_auth,
+                                              verify_confluence_certificate=verify_confluence_certificate,
+                                              pool_connections=pool_connections,
+                                              pool_maxsize=pool_maxsize,
+                                              keep_alive=keep_alive,
+                                              retry_policy=retry_policy,
+                                              rate_limiter=rate_limiter,
+                                              prefetch_pages=prefetch_pages,
+                                              parallel_pages=parallel_pages,
+                                              ordered_pages=ordered_pages,
+                                              page_size=page_size,
+                                              stream_pages=stream_pages,
+                                              json_codec=json_codec,
+                                              timeout=timeout,
+                                              deadline=deadline,
+                                              http2=http2,
+                                              http_cache=http_cache,
+                                              object_cache=object_cache,
+                                              content_store=content_store,
+                                              coalesce_requests=coalesce_requests,
+                                              metrics=metrics)
+        self._session = None  # type: Optional[aiohttp.ClientSession]
+
+    def __enter__(self):
+        raise TypeError('AsyncConfluence must be used with "async with"')
+
+    async def __aenter__(self):  # type: () -> AsyncConfluence
+        _ = self.client
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):  # type: () -> None
+        """
+        Close all pooled connections. The client can still be used after this
+        call, a new pool is created on the next request.
+        """
+        if self._session:
+            session, self._session = self._session, None
+            await session.close()
+
+    def call_options(self, timeout=None, deadline=None):
+        # Options are held per thread which isn't meaningful when many calls
+        # share the event loop.
+        raise TypeError('AsyncConfluence does not support call_options, use asyncio.wait_for to bound a call')
+
+    def _current_options(self):  # type: () -> CallOptions
+        return CallOptions(self._timeout, self._deadline)
+
+    @staticmethod
+    def _client_timeout(timeout):  # type: (Timeout) -> aiohttp.ClientTimeout
+        if timeout is None:
+            return aiohttp.ClientTimeout(total=None)
+        connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        return aiohttp.ClientTimeout(total=None, sock_connect=connect, sock_read=read)
+
+    def _ssl(self):  # type: () -> Any
+        if self._verify_confluence_certificate is False:
+            return False
+        if isinstance(self._verify_confluence_certificate, str):
+            return ssl.create_default_context(cafile=self._verify_confluence_certificate)
+        return None
+
+    @property
+    def client(self):
+        # type: () -> aiohttp.ClientSession
+        """
+        The aiohttp session used for all calls, created on first use. Must be
+        accessed from within a running event loop.
+
+        :return: The aiohttp.ClientSession used for all calls.
+        """
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self._pool_connections * self._pool_maxsize,
+                                             limit_per_host=self._pool_maxsize,
+                                             force_close=not self._keep_alive,
+                                             ssl=self._ssl())
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  auth=aiohttp.BasicAuth(*self._basic_auth))
+        return self._session
+
+    @staticmethod
+    def _query(params):  # type: (Dict[str, Any]) -> List[Tuple[str, str]]
+        # aiohttp only accepts strings and doesn't expand lists into repeated
+        # parameters the way requests does.
+        query = []
+        for key, value in params.items():
+            for v in (value if isinstance(value, (list, tuple)) else [value]):
+                query.append((key, str(v).lower() if isinstance(v, bool) else str(v)))
+        return query
+
+    @staticmethod
+    async def _to_response(url, response, stream=False):
+        # type: (str, aiohttp.ClientResponse, bool) -> requests.Response
+        # Build a requests.Response so that the error handling, retry policy
+        # and exceptions are shared with the synchronous client.
+        result = requests.Response()
+        result.status_code = response.status
+        result.headers = CaseInsensitiveDict(response.headers)
+        result.url = url
+        result.reason = response.reason
+        if stream and response.status < 300:
+            # The caller reads the body from raw and must release it.
+            result.raw = response
+            return result
+
+        try:
+            result._content = await response.read()
+        finally:
+            response.release()
+        return result
+
+    @staticmethod
+    def _translate_error(error):  # type: (Exception) -> requests.RequestException
+        if isinstance(error, aiohttp.ClientConnectorError):
+            return requests.exceptions.ConnectTimeout(str(error))
+        if isinstance(error, asyncio.TimeoutError):
+            return requests.exceptions.ReadTimeout(str(error))
+        return requests.exceptions.ConnectionError(str(error))
+
+    async def _request(self, method, path, params, kind=None, options=None, **kwargs):
+        # type: (str, str, Dict[str, Any], Optional[RequestKind], Optional[CallOptions], **Any) -> requests.Response
+        if kind is None:
+            kind = RequestKind.READ if method == 'GET' else RequestKind.WRITE
+        if options is None:
+            options = self._current_options()
+
+        url = self._make_url(path)
+        policy = self._retry_policy
+        stream = kwargs.pop('stream', False)
+        body = kwargs.get('data')
+        start = clock()
+        attempt = 0
+
+        while True:
+            attempt += 1
+
+            if self._rate_limiter:
+                wait = self._rate_limiter.reserve(kind)
+                remaining = options.remaining()
+                if remaining is not None and wait >= remaining:
+                    raise ConfluenceTimeout(path, params, options.deadline)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+
+            if isinstance(body, MultipartEncoder):
+                if attempt > 1:
+                    body.rewind()
+                kwargs['data'] = _aiter(body)
+
+            if options.expired():
+                raise ConfluenceTimeout(path, params, options.deadline)
+
+            try:
+                r = await self.client.request(method, url, params=AsyncConfluence._query(params),
+                                              timeout=AsyncConfluence._client_timeout(options.request_timeout()),
+                                              **kwargs)
+                response = await AsyncConfluence._to_response(url, r, stream)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = AsyncConfluence._translate_error(e)
+                if isinstance(error, requests.Timeout) and options.expired():
+                    raise ConfluenceTimeout(path, params, options.deadline) from e
+                delay = policy.delay_after_error(method, error, attempt, clock() - start)
+                if delay is None or not _can_resend(body):
+                    raise error from e
+                logger.warning('%s %s failed (%s), retrying in %.2fs', method, path, e, delay)
+            else:
+                delay = policy.delay_after_response(method, response, attempt, clock() - start)
+                if delay is None or not _can_resend(body):
+                    Confluence._handle_response_errors(path, params, response)
+                    return response
+                logger.warning('%s %s returned %d, retrying in %.2fs', method, path, response.status_code, delay)
+
+            remaining = options.remaining()
+            if remaining is not None and delay >= remaining:
+                raise ConfluenceTimeout(path, params, options.deadline)
+
+            await asyncio.sleep(delay)
+
+    async def _get_single_result(self, item_type, path, params, expand):
+        # type: (Callable, str, Dict[str, str], Optional[List[str]]) -> Any
+        return item_type(self._decode(await self._get(path, params, expand)))
+
+    async def _get_paged_results(self, item_type, path, params, expand, page_size=None):
+        # type: (Callable, str, Dict[str, str], Optional[List[str]], Optional[int]) -> AsyncIterator[Any]
+        if expand:
+            params['expand'] = ','.join(expand)
+
+        page_size = page_size or self._page_size
+        if page_size:
+            params['limit'] = str(page_size)
+
+        options = self._current_options()
+        while path != "":
+            search_results = self._decode(await self._get(path, params, [], options))
+
+            if 'next' in search_results['_links']:
+                path = search_results['_links']['next']
+                params.clear()
+            else:
+                path = ""
+
+            for result in search_results['results']:
+                yield item_type(result)
+
+    async def get_content_by_ids(self, content_ids, expand=None, max_workers=4):
+        # type: (Iterable[int], Optional[List[str]], int) -> Tuple[Dict[int, Content], List[int]]
+        ids = list(dict.fromkeys(int(i) for i in content_ids))
+        found = {content.id: content for content in await self._get_by_ids(Content, ids, expand, max_workers)}
+        return found, [i for i in ids if i not in found]
+
+    async def mirror_space(self, store, space_key, expand=None, detect_deletions=False, overlap_minutes=OVERLAP_MINUTES,
+                           max_workers=4):
+        # type: (MirrorStore, str, Optional[List[str]], bool, int, int) -> MirrorResult
+        run = MirrorRun(store, space_key, expand, overlap_minutes)
+
+        if run.full:
+            async for content in self._get_paged_results(dict, 'content/search', {'cql': run.scope}, run.expand):
+                run.add(content)
+        else:
+            listed = {c.id: c.version.number async for c in self.search(run.changes, expand=['version'])}
+            current = None
+            if detect_deletions:
+                current = [c.id async for c in self.search(run.scope, page_size=LISTING_PAGE_SIZE)]
+            stale = run.plan(listed, current)
+            for i in range(0, len(stale), LISTING_PAGE_SIZE):
+                for content in await self._get_by_ids(dict, stale[i:i + LISTING_PAGE_SIZE], run.expand, max_workers):
+                    run.add(content)
+
+        result = run.finish()
+        self._metrics.increment('mirror.updated', len(result.updated))
+        self._metrics.increment('mirror.deleted', len(result.deleted))
+        logger.info('%s', result)
+        return result
+
+    async def _get_by_ids(self, item_type, content_ids, expand, max_workers):
+        # type: (Callable, List[int], Optional[List[str]], int) -> List[Any]
+        semaphore = _semaphore(max_workers)
+
+        async def fetch(batch):  # type: (List[str]) -> List[Any]
+            async with semaphore:
+                return [c async for c in self._get_paged_results(item_type, 'content/search',
+                                                                 {'cql': 'id in ({})'.format(','.join(batch))},
+                                                                 expand, page_size=len(batch))]
+
+        batches = await asyncio.gather(*[fetch(b) for b in _id_batches(content_ids, CQL_MAX_IDS, CQL_MAX_LENGTH)])
+        return [c for results in batches for c in results]
+
+    async def _compare_and_swap(self, fetch, update, max_attempts):
+        # type: (Callable[[], Any], Callable[[Any], Any], int) -> Any
+        if max_attempts < 1:
+            raise ValueError('max_attempts must be at least 1')
+
+        options = self._current_options()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result = await update(await fetch())
+                self._metrics.increment('cas.updates')
+                return result
+            except ConfluenceVersionConflict:
+                self._metrics.increment('cas.conflicts')
+                if attempt >= max_attempts:
+                    self._metrics.increment('cas.failures')
+                    raise
+
+            delay = self._retry_policy.backoff(attempt)
+            remaining = options.remaining()
+            if remaining is not None and delay >= remaining:
+                self._metrics.increment('cas.failures')
+                raise ConfluenceTimeout('compare and swap', {}, options.deadline)
+
+            self._metrics.increment('cas.retries')
+            logger.info('Version conflict on attempt %d, retrying in %.2fs', attempt, delay)
+            await asyncio.sleep(delay)
+
+    async def _get_optional(self, item_type, path):  # type: (Callable, str) -> Any
+        try:
+            return item_type(self._decode(await self._get(path, {}, ['version'])))
+        except ConfluenceResourceNotFound:
+            return None
+
+    async def modify_content(self, content_id, transform, max_attempts=5, minor_edit=False, edit_message=None,
+                             expand=None):
+        # type: (int, Callable[[Content], Optional[str]], int, bool, Optional[str], Optional[List[str]]) -> Content
+        async def fetch():  # type: () -> Content
+            return Content(self._decode(await self._get('content/{}'.format(content_id), {}, ['body.storage', 'version'])))
+
+        async def update(current):  # type: (Content) -> Content
+            new_content = transform(current)
+            if new_content is None:
+                return current
+            return await self.update_content(content_id, current.type, current.version.number + 1, new_content,
+                                             current.title, minor_edit=minor_edit, edit_message=edit_message,
+                                             expand=expand)
+
+        return await self._compare_and_swap(fetch, update, max_attempts)
+
+    async def publish_pages(self, specs, max_workers=4, max_attempts=5):
+        # type: (Iterable[PageSpec], int, int) -> List[BulkResult]
+        semaphore = _semaphore(max_workers)
+        specs = list(specs)
+        ready, children, results = _plan(specs)
+
+        async def publish(spec, parent_id):  # type: (PageSpec, Optional[int]) -> Content
+            async def fetch():  # type: () -> Content
+                return Content(self._decode(await self._get('content/{}'.format(spec.content_id), {}, ['version'])))
+
+            async def update(current):  # type: (Content) -> Content
+                return await self.update_content(spec.content_id, current.type, current.version.number + 1, spec.body,
+                                                 spec.title, new_parent=parent_id)
+
+            async with semaphore:
+                if spec.content_id is None:
+                    content = await self.create_content(ContentType.PAGE, spec.title, spec.space_key, spec.body,
+                                                        parent_content_id=parent_id)
+                    self._metrics.increment('bulk.created')
+                else:
+                    content = await self._compare_and_swap(fetch, update, max_attempts)
+                    self._metrics.increment('bulk.updated')
+                return content
+
+        async def publish_tree(spec, parent_id):  # type: (PageSpec, Optional[int]) -> None
+            try:
+                content = await publish(spec, parent_id)
+            except Exception as e:
+                logger.warning('Failed to publish %s: %s', spec, e)
+                results[id(spec)] = BulkResult(spec, error=e)
+                _fail_descendants(spec, e, children, results)
+                return
+
+            results[id(spec)] = BulkResult(spec, content=content)
+            await asyncio.gather(*[publish_tree(child, content.id) for child in children.pop(id(spec), [])])
+
+        await asyncio.gather(*[publish_tree(spec, spec.parent) for spec in ready])  # type: ignore
+        ordered = _ordered_results(specs, results)
+        failed = sum(1 for result in ordered if not result.ok)
+        if failed:
+            self._metrics.increment('bulk.failed', failed)
+        return ordered
+
+    async def modify_content_property(self, content_id, property_key, transform, max_attempts=5):
+        # type: (int, str, Callable[[Optional[Any]], Optional[Any]], int) -> Optional[ContentProperty]
+        async def fetch():  # type: () -> Optional[ContentProperty]
+            return await self._get_optional(ContentProperty, 'content/{}/property/{}'.format(content_id, property_key))
+
+        async def update(current):  # type: (Optional[ContentProperty]) -> Optional[ContentProperty]
+            new_value = transform(current.value if current else None)
+            if new_value is None:
+                return current
+            new_version = current.version.number + 1 if current else 1
+            return await self.update_content_property(content_id, property_key, new_value, new_version)
+
+        return await self._compare_and_swap(fetch, update, max_attempts)
+
+    async def modify_space_property(self, space_key, property_key, transform, max_attempts=5):
+        # type: (str, str, Callable[[Optional[Any]], Optional[Any]], int) -> Optional[SpaceProperty]
+        async def fetch():  # type: () -> Optional[SpaceProperty]
+            return await self._get_optional(SpaceProperty, 'space/{}/property/{}'.format(space_key, property_key))
+
+        async def update(current):  # type: (Optional[SpaceProperty]) -> Optional[SpaceProperty]
+            new_value = transform(current.value if current else None)
+            if new_value is None:
+                return current
+            new_version = current.version.number + 1 if current else 1
+            return await self.update_space_property(space_key, property_key, new_value, new_version)
+
+        return await self._compare_and_swap(fetch, update, max_attempts)
+
+    async def get_space_property(self, space_key, property_key, expand=None):
+        # type: (str, str, Optional[List[str]]) -> AsyncIterator[SpaceProperty]
+        yield await self._get_single_result(SpaceProperty, 'space/{}/property/{}'.format(space_key, property_key), {},
+                                            expand)
+
+    async def _post_return_single(self, item_type, path, params, data, expand=None):
+        # type: (Callable, str, Dict[str, str], Any, Optional[List[str]]) -> Any
+        return item_type(self._decode(await self._post(path, params, data, expand=expand)))
+
+    async def _post_return_multiple(self, item_type, path, params, data, expand=None):
+        # type: (Callable, str, Dict[str, str], Any, Optional[List[str]]) -> Any
+        response = await self._post(path, params, data, expand=expand)
+
+        return [item_type(r) for r in self._decode(response)['results']]
+
+    async def _put_return_single(self, item_type, path, params, data, expand=None):
+        # type: (Callable, str, Dict[str, str], Any, Optional[List[str]]) -> Any
+        return item_type(self._decode(await self._put(path, params, data, expand)))
+
+    async def delete_content(self, content_id, content_status):  # type: (int, ContentStatus) -> None
+        await self._delete('content/{}'.format(content_id), params={'status': content_status.value})
+
+    async def download_attachment(self, attachment):  # type: (Content) -> bytes
+        path, _ = _attachment_download(attachment)
+        return (await self._request('GET', path, {}, kind=RequestKind.DOWNLOAD)).content
+
+    async def iter_attachment(self, attachment, chunk_size=STREAM_CHUNK_SIZE, checksum=None):
+        # type: (Content, int, Optional[Any]) -> AsyncIterator[bytes]
+        path, expected_size = _attachment_download(attachment)
+        response = await self._request('GET', path, {}, kind=RequestKind.DOWNLOAD, stream=True)
+        size = 0
+        try:
+            async for chunk in response.raw.content.iter_chunked(chunk_size):
+                size = _count_chunk(path, chunk, size, expected_size, checksum)
+                yield chunk
+        finally:
+            response.raw.release()
+        _check_size(path, size, expected_size)
+
+    async def download_attachment_to(self, attachment, destination, chunk_size=STREAM_CHUNK_SIZE, checksum=None):
+        # type: (Content, Any, int, Optional[Any]) -> int
+        with _open_destination(destination) as f:
+            size = 0
+            async for chunk in self.iter_attachment(attachment, chunk_size=chunk_size, checksum=checksum):
+                f.write(chunk)
+                size += len(chunk)
+            return size
+
+    async def download_attachment_resumable(self, attachment, path, segments=1, max_resumes=5,
+                                            chunk_size=STREAM_CHUNK_SIZE, checksum=None):
+        # type: (Content, str, int, int, int, Optional[Any]) -> int
+        source, expected_size = _attachment_download(attachment)
+        options = self._current_options()
+        ranges = segment_ranges(expected_size or 0, segments) if segments > 1 else []
+
+        total = None  # type: Optional[int]
+        if len(ranges) > 1:
+            try:
+                # Every segment is left to finish before any error is raised
+                # so that none are still writing while the files are cleaned up.
+                results = await asyncio.gather(*[self._download_range(source, partial_path(path, start), start, end,
+                                                                      max_resumes, chunk_size, options)
+                                                 for start, end in ranges], return_exceptions=True)
+                errors = [r for r in results if isinstance(r, BaseException)]
+                if errors:
+                    raise errors[0]
+                join_segments(path, ranges)
+            except RangesNotSupported:
+                logger.info('%s does not support range requests, downloading it in one piece', source)
+                remove_segments(path, ranges)
+                ranges = []
+
+        if len(ranges) <= 1:
+            total = await self._download_range(source, partial_path(path, 0), 0, None, max_resumes, chunk_size, options)
+
+        return _finish_download(source, path, expected_size if expected_size is not None else total, chunk_size,
+                                checksum)
+
+    async def _download_range(self, source, part, start, end, max_resumes, chunk_size, options):
+        # type: (str, str, int, Optional[int], int, int, CallOptions) -> Optional[int]
+        total = None  # type: Optional[int]
+        resumes = 0
+        while True:
+            offset = start + partial_size(part)
+            if not _range_wanted(part, offset, end, total):
+                return total
+
+            response = await self._request('GET', source, {}, kind=RequestKind.DOWNLOAD, options=options, stream=True,
+                                           headers=_range_headers(offset, end))
+            try:
+                mode, total = _range_response(source, response, offset, start, end)
+                if mode is None:
+                    continue
+
+                try:
+                    with open(part, mode) as f:
+                        async for chunk in response.raw.content.iter_chunked(chunk_size):
+                            f.write(chunk)
+                    error = _range_shortfall(source, part, start, end, total)  # type: Optional[Exception]
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = AsyncConfluence._translate_error(e)
+            finally:
+                if response.raw is not None:
+                    response.raw.release()
+
+            if error is None:
+                if _last_byte(end, total) is None:
+                    return total
+                continue
+
+            resumes += 1
+            if resumes > max_resumes:
+                raise error
+
+            delay = self._retry_policy.backoff(resumes)
+            remaining = options.remaining()
+            if remaining is not None and delay >= remaining:
+                raise ConfluenceTimeout(source, {}, options.deadline)
+
+            self._metrics.increment('download.resumes')
+            logger.warning('Download of %s interrupted at byte %d (%s), resuming in %.2fs',
+                           source, start + partial_size(part), error, delay)
+            await asyncio.sleep(delay)
+
+    async def export_attachments(self, directory, space_key=None, root_page_id=None, max_workers=4, max_resumes=5):
+        # type: (str, Optional[str], Optional[int], int, int) -> ExportResult
+        if (space_key is None) == (root_page_id is None):
+            raise ValueError('Exactly one of space_key and root_page_id must be given')
+
+        listing = _semaphore(max_workers)
+        downloading = _semaphore(max_workers)
+        downloads = []  # type: List[asyncio.Future]
+        result = ExportResult()
+
+        with ExportManifest(directory) as manifest:
+            async def download(page_id, attachment):  # type: (int, Content) -> None
+                try:
+                    async with downloading:
+                        await self._export_attachment(manifest, result, page_id, attachment, max_resumes)
+                except Exception as e:
+                    logger.warning('Failed to export attachment %s of page %s: %s', attachment, page_id, e)
+                    self._metrics.increment('export.failed')
+                    result.add_failed(attachment, e)
+
+            async def list_attachments(page_id):  # type: (int) -> None
+                try:
+                    async with listing:
+                        async for attachment in self.get_attachments(page_id, expand=['version']):
+                            downloads.append(asyncio.ensure_future(download(page_id, attachment)))
+                except Exception as e:
+                    logger.warning('Failed to list the attachments of page %s: %s', page_id, e)
+                    self._metrics.increment('export.failed')
+                    result.add_failed(page_id, e)
+
+            listings = []  # type: List[asyncio.Future]
+            try:
+                async for page_id in self._export_pages(space_key, root_page_id):
+                    listings.append(asyncio.ensure_future(list_attachments(page_id)))
+            finally:
+                # Everything started has to finish before the manifest is
+                # closed, even if walking the pages failed part way.
+                await asyncio.gather(*listings, return_exceptions=True)
+                await asyncio.gather(*downloads, return_exceptions=True)
+
+        logger.info('Exported attachments to %s: %s', directory, result)
+        return result
+
+    async def _export_pages(self, space_key, root_page_id):  # type: (Optional[str], Optional[int]) -> AsyncIterator[int]
+        if space_key is not None:
+            for content_type in (ContentType.PAGE, ContentType.BLOG_POST):
+                async for content in self.get_space_content_with_type(space_key, content_type):
+                    yield content.id
+        else:
+            yield root_page_id  # type: ignore
+            async for content in self.search('ancestor = {} and type = page'.format(root_page_id)):
+                yield content.id
+
+    async def _export_attachment(self, manifest, result, page_id, attachment, max_resumes):
+        # type: (ExportManifest, ExportResult, int, Content, int) -> None
+        _, size = _attachment_download(attachment)
+        if manifest.unchanged(attachment.id, attachment.version.number, size):
+            self._metrics.increment('export.skipped')
+            result.add_skipped(attachment)
+            return
+
+        path = attachment_path(manifest.directory, page_id, attachment.title)
+        _make_dirs(os.path.dirname(path))
+        written = await self.download_attachment_resumable(attachment, path, max_resumes=max_resumes)
+        manifest.record(attachment.id, page_id, attachment.title, attachment.version.number, written, path)
+        self._metrics.increment('export.downloaded')
+        result.add_downloaded(attachment, written)
+
+    async def add_attachment(self, content_id, file_path, file_name=None, status=None, progress=None):
+        # type: (int, Any, Optional[str], Optional[ContentStatus], Optional[ProgressCallback]) -> List[Content]
+        params = Confluence._new_attachment_params(status)
+        body = _attachment_body(file_path, file_name, [], progress)
+
+        response = await self._post_multipart('content/{}/child/attachment'.format(content_id), params, body)
+        return [Content(r) for r in self._decode(response)['results']]
+
+    async def add_attachments(self, content_id, files, status=None, max_batch_bytes=MAX_BATCH_BYTES,
+                              max_batch_files=MAX_BATCH_FILES, max_workers=4, progress=None):
+        # type: (int, Iterable[Any], Optional[ContentStatus], int, int, int, Optional[ProgressCallback]) -> List[BulkResult]
+        semaphore = _semaphore(max_workers)
+        files = list(files)
+        named = _attachment_files(files)
+        params = Confluence._new_attachment_params(status)
+        path = 'content/{}/child/attachment'.format(content_id)
+        batches = size_batches([content_length(content) for _, content in named], max_batch_bytes, max_batch_files)
+        results = [None] * len(files)  # type: List[Optional[BulkResult]]
+
+        bodies = [MultipartEncoder([('file', named[i]) for i in batch]) for batch in batches]
+        singles = [MultipartEncoder([('file', f)]) for f in named]
+        lengths = [body.len for body in bodies]
+        total = None if None in lengths else sum(lengths)  # type: ignore
+        progress_total = ProgressTotal(progress, total) if progress is not None else None
+
+        async def upload(batch, body):  # type: (List[int], MultipartEncoder) -> None
+            if progress_total is not None:
+                body.progress = progress_total.callback(id(body))
+
+            try:
+                async with semaphore:
+                    response = await self._post_multipart(path, dict(params), body)
+                uploaded = [Content(r) for r in self._decode(response)['results']]
+            except ConfluenceError as e:
+                if len(batch) > 1 and e.response is not None and e.response.status_code in (400, 413):
+                    logger.warning('Batch of %d attachments rejected on %s, uploading them one at a time',
+                                   len(batch), content_id)
+                    if body.progress is not None:
+                        body.progress(0, None)
+                    await asyncio.gather(*[upload([i], singles[i]) for i in batch])
+                    return
+                for i in batch:
+                    results[i] = BulkResult(files[i], error=e)
+                return
+            except Exception as e:
+                for i in batch:
+                    results[i] = BulkResult(files[i], error=e)
+                return
+
+            for i, attachment in zip(batch, _match_attachments([named[i][0] for i in batch], uploaded)):
+                if attachment is None:
+                    error = ValueError('{} is missing from the response'.format(named[i][0]))
+                    results[i] = BulkResult(files[i], error=error)
+                else:
+                    results[i] = BulkResult(files[i], content=attachment)
+
+        await asyncio.gather(*[upload(batch, body) for batch, body in zip(batches, bodies)])
+
+        self._metrics.increment('attachments.batches', len(batches))
+        self._metrics.increment('attachments.uploaded', sum(1 for r in results if r is not None and r.ok))
+        failed = sum(1 for r in results if r is not None and not r.ok)
+        if failed:
+            self._metrics.increment('attachments.failed', failed)
+        return results  # type: ignore
+
+    async def sync_attachments(self, content_id, files, max_workers=4, algorithm=HASH_ALGORITHM):
+        # type: (int, Iterable[Any], int, str) -> SyncResult
+        semaphore = _semaphore(max_workers)
+        files = list(files)
+        named = _attachment_files(files)
+        expand = ['version', 'metadata.properties.{}'.format(HASH_PROPERTY)]
+        existing = {}  # type: Dict[str, Content]
+        async for attachment in self.get_attachments(content_id, expand=expand):
+            existing[attachment.title] = attachment
+        result = SyncResult()
+        loop = asyncio.get_event_loop()
+
+        # Files are hashed on the default executor to keep the event loop free.
+        digests = await asyncio.gather(*[loop.run_in_executor(None, file_digest, content, algorithm)
+                                         for _, content in named], return_exceptions=True)
+
+        async def update(i, digest):  # type: (int, str) -> None
+            name, content = named[i]
+            try:
+                async with semaphore:
+                    attachment = await self.update_attachment_data(content_id, existing[name].id, content, file_name=name)
+                    value = hash_record(digest, algorithm, attachment.version.number)
+                    await self.modify_content_property(attachment.id, HASH_PROPERTY, lambda _: value)
+            except Exception as e:
+                logger.warning('Failed to update attachment %s on %s: %s', name, content_id, e)
+                result.add_failed(files[i], e)
+                return
+            result.add_updated(attachment)
+
+        async def add(new):  # type: (List[int]) -> None
+            uploads = await self.add_attachments(content_id, [named[i] for i in new], max_workers=max_workers)
+            await asyncio.gather(*[record(i, upload) for i, upload in zip(new, uploads)])
+
+        async def record(i, upload):  # type: (int, BulkResult) -> None
+            if not upload.ok:
+                result.add_failed(files[i], upload.error)  # type: ignore
+                return
+            try:
+                async with semaphore:
+                    value = hash_record(digests[i], algorithm, upload.content.version.number)
+                    await self.create_content_property(upload.content.id, HASH_PROPERTY, value)
+            except Exception as e:
+                logger.warning('Failed to record the hash of attachment %s on %s: %s', named[i][0], content_id, e)
+                result.add_failed(files[i], e)
+                return
+            result.add_added(upload.content)
+
+        new = []  # type: List[int]
+        tasks = []
+        for i, (name, _) in enumerate(named):
+            if isinstance(digests[i], Exception):
+                result.add_failed(files[i], digests[i])
+            elif name not in existing:
+                new.append(i)
+            elif unchanged(existing[name], digests[i], algorithm):
+                result.add_skipped(existing[name])
+            else:
+                tasks.append(update(i, digests[i]))
+        if new:
+            tasks.append(add(new))
+        await asyncio.gather(*tasks)
+
+        self._metrics.increment('sync.skipped', len(result.skipped))
+        self._metrics.increment('sync.uploaded', len(result.added) + len(result.updated))
+        if result.failed:
+            self._metrics.increment('sync.failed', len(result.failed))
+        return result
+
+    async def update_attachment_data(self, page_id, attachment_id, file_path, file_name=None, minor_edit=False,
+                                     expand=None, progress=None):
+        # type: (int, int, Any, Optional[str], Optional[bool], Optional[List[str]], Optional[ProgressCallback]) -> Content
+        body = _attachment_body(file_path, file_name, [('minorEdit', 'true')] if minor_edit else [], progress)
+
+        path = 'content/{}/child/attachment/{}/data'.format(page_id, attachment_id)
+        return Content(self._decode(await self._post_multipart(path, {}, body, expand=expand)))
+
+    async def delete_label(self, content_id, label_name):  # type: (int, str) -> None
+        await self._delete('content/{}/label'.format(content_id), params={'name': label_name})
+
+    async def delete_content_property(self, content_id, property_key):  # type: (int, str) -> None
+        await self._delete('content/{}/property/{}'.format(content_id, property_key), {})
+
+    async def delete_space(self, space_key):  # type: (str) -> None
+        await self._delete('space/{}'.format(space_key), params={})
+
+    async def delete_space_property(self, space_key, property_key):  # type: (str, str) -> None
+        await self._delete('space/{}/property/{}'.format(space_key, property_key), {})
+
+    async def add_content_watch(self, content_id, user_key=None, username=None):
+        # type: (int, Optional[str], Optional[str]) -> None
+        params = Confluence._watch_params(user_key, username)
+        await self._post('user/watch/content/{}'.format(content_id), params=params, data={})
+
+    async def remove_content_watch(self, content_id, user_key=None, username=None):
+        # type: (int, Optional[str], Optional[str]) -> None
+        params = Confluence._watch_params(user_key, username)
+        await self._delete('user/watch/content/{}'.format(content_id), params)
+
+    async def is_user_watching_content(self, content_id, user_key=None, username=None):
+        # type: (int, Optional[str], Optional[str]) -> bool
+        params = Confluence._watch_params(user_key, username)
+        return self._decode(await self._get('user/watch/content/{}'.format(content_id), params, None))['watching']
+
+    async def add_space_watch(self, space_key, user_key=None, username=None):
+        # type: (str, Optional[str], Optional[str]) -> None
+        params = Confluence._watch_params(user_key, username)
+        await self._post('user/watch/space/{}'.format(space_key), params, data={})
+
+    async def remove_space_watch(self, space_key, user_key=None, username=None):
+        # type: (str, Optional[str], Optional[str]) -> None
+        params = Confluence._watch_params(user_key, username)
+        await self._delete('user/watch/space/{}'.format(space_key), params)
+
+    async def is_user_watching_space(self, space_key, user_key=None, username=None):
+        # type: (str, Optional[str], Optional[str]) -> bool
+        params = Confluence._watch_params(user_key, username)
+        return self._decode(await self._get('user/watch/space/{}'.format(space_key), params, None))['watching']
+
+
+async def _aiter(body):  # type: (MultipartEncoder) -> AsyncIterator[bytes]
+    """Lets aiohttp stream a MultipartEncoder, reading from it as it sends."""
+    for chunk in body:
+        yield chunk
+
+
+def _semaphore(max_workers):  # type: (int) -> asyncio.Semaphore
+    """
+    :return: A semaphore limiting concurrent work to max_workers, which
+        would wait forever if it weren't at least 1.
+    """
+    if max_workers < 1:
+        raise ValueError('max_workers must be at least 1')
+    return asyncio.Semaphore(max_workers)
@@ -0,0 +1,111 @@
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from confluence.multipart import UPLOAD_CHUNK_SIZE, path_of
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# The content property, on each attachment, which records the hash of the
+# content last uploaded by sync_attachments.
+HASH_PROPERTY = 'confluence-python-lib-content-hash'
+HASH_ALGORITHM = 'sha256'
+
+
+def file_digest(content, algorithm=HASH_ALGORITHM, chunk_size=UPLOAD_CHUNK_SIZE):  # type: (Any, str, int) -> str
+    """
+    :param content: A path, bytes, bytearray, memoryview or seekable binary
+        file object, which is left at the position it started from so that
+        it can be uploaded afterwards.
+
+    :return: The hex digest of the content.
+    """
+    digest = hashlib.new(algorithm)
+    path = path_of(content)
+
+    if path is not None:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+    elif isinstance(content, (bytes, bytearray, memoryview)):
+        digest.update(content)
+    elif hasattr(content, 'read') and (content.seekable() if hasattr(content, 'seekable') else hasattr(content, 'seek')):
+        start = content.tell()
+        try:
+            for chunk in iter(lambda: content.read(chunk_size), b''):
+                digest.update(chunk)
+        finally:
+            content.seek(start)
+    else:
+        raise ValueError('Only paths, bytes and seekable files can be synced as they must be read twice')
+
+    return digest.hexdigest()
+
+
+def hash_record(digest, algorithm, version):  # type: (str, str, int) -> Dict[str, Any]
+    """
+    :return: The value of the hash property for an attachment at version
+        whose content has the given digest.
+    """
+    return {'algorithm': algorithm, 'hash': digest, 'version': version}
+
+
+def recorded_hash(attachment):  # type: (Any) -> Optional[Dict[str, Any]]
+    """
+    :return: The hash property of an attachment fetched with
+        metadata.properties.<HASH_PROPERTY> expanded, None if it has none.
+    """
+    metadata = getattr(attachment, 'metadata', None) or {}
+    prop = (metadata.get('properties') or {}).get(HASH_PROPERTY)
+    return prop.get('value') if prop else None
+
+
+def unchanged(attachment, digest, algorithm=HASH_ALGORITHM):  # type: (Any, str, str) -> bool
+    """
+    :return: True if the attachment's recorded hash matches digest, and was
+        recorded for its current version, i.e. it hasn't been changed other
+        than by sync_attachments since.
+    """
+    record = recorded_hash(attachment)
+    version = getattr(attachment, 'version', None)
+    return record is not None and version is not None and record == hash_record(digest, algorithm, version.number)
+
+
+class SyncResult:
+    """
+    The outcome of an attachment sync. A failure to upload one file doesn't
+    stop the others being synced.
+    """
+
+    def __init__(self):  # type: () -> None
+        self._lock = threading.Lock()
+        self.added = []  # type: List[Any]
+        self.updated = []  # type: List[Any]
+        self.skipped = []  # type: List[Any]
+        self.failed = []  # type: List[Tuple[Any, BaseException]]
+
+    def add_added(self, attachment):  # type: (Any) -> None
+        with self._lock:
+            self.added.append(attachment)
+
+    def add_updated(self, attachment):  # type: (Any) -> None
+        with self._lock:
+            self.updated.append(attachment)
+
+    def add_skipped(self, attachment):  # type: (Any) -> None
+        with self._lock:
+            self.skipped.append(attachment)
+
+    def add_failed(self, item, error):  # type: (Any, BaseException) -> None
+        """
+        :param item: The file, as given to sync_attachments, which couldn't
+            be synced.
+        """
+        with self._lock:
+            self.failed.append((item, error))
+
+    def __str__(self):
+        return '{} added, {} updated, {} skipped, {} failed'.format(
+            len(self.added), len(self.updated), len(self.skipped), len(self.failed))
@@ -0,0 +1,171 @@
+import logging
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+class PageSpec:
+    """
+    Describes a page to be created or updated by Confluence.publish_pages.
+    """
+
+    def __init__(self, title, space_key, body, parent=None, content_id=None):
+        # type: (str, str, str, Optional[Union[int, PageSpec]], Optional[int]) -> None
+        """
+        :param title: The title of the page.
+        :param space_key: The space the page belongs to.
+        :param body: The storage format body of the page.
+        :param parent: Optionally the id of the parent page, or the PageSpec
+            of another page in the same batch which is then published first.
+        :param content_id: The id of an existing page to update, if not set a
+            new page is created.
+        """
+        self.title = title
+        self.space_key = space_key
+        self.body = body
+        self.parent = parent
+        self.content_id = content_id
+
+    def __str__(self):
+        return self.title
+
+
+class BulkResult:
+    """
+    The outcome of a single item of a bulk operation, e.g. publishing a
+    PageSpec or uploading a file, holding either the resulting content or
+    the exception which stopped it.
+    """
+
+    def __init__(self, spec, content=None, error=None):  # type: (Any, Any, Optional[BaseException]) -> None
+        self.spec = spec
+        self.content = content
+        self.error = error
+
+    @property
+    def ok(self):  # type: () -> bool
+        return self.error is None
+
+    def __str__(self):
+        return '{} - {}'.format(self.spec, 'ok' if self.ok else self.error)
+
+
+def run_in_order(specs, publish, max_workers):
+    # type: (Iterable[PageSpec], Callable[[PageSpec, Optional[int]], Any], int) -> List[BulkResult]
+    """
+    Publish specs concurrently, starting each one only once its parent spec,
+    if it has one in the batch, has been published.
+
+    :param specs: The pages to publish.
+    :param publish: Called with each spec and the id of its parent page, if
+        any, and returns the published content.
+    :param max_workers: The maximum number of specs published at once.
+
+    :return: A result for each spec in the order given. If a spec fails then
+        its descendants fail with the same exception without being
+        published.
+    """
+    if max_workers < 1:
+        raise ValueError('max_workers must be at least 1')
+
+    specs = list(specs)
+    ready, children, results = _plan(specs)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}  # type: Dict[Future, PageSpec]
+
+        def submit(spec, parent_id):  # type: (PageSpec, Optional[int]) -> None
+            pending[executor.submit(publish, spec, parent_id)] = spec
+
+        for spec in ready:
+            submit(spec, spec.parent)  # type: ignore
+
+        while pending:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                spec = pending.pop(future)
+                try:
+                    content = future.result()
+                except Exception as e:
+                    logger.warning('Failed to publish %s: %s', spec, e)
+                    results[id(spec)] = BulkResult(spec, error=e)
+                    _fail_descendants(spec, e, children, results)
+                    continue
+
+                results[id(spec)] = BulkResult(spec, content=content)
+                for child in children.pop(id(spec), []):
+                    submit(child, content.id)
+
+    return _ordered_results(specs, results)
+
+
+def _plan(specs):
+    # type: (List[PageSpec]) -> Tuple[List[PageSpec], Dict[int, List[PageSpec]], Dict[int, BulkResult]]
+    """
+    :return: The specs which can be published straight away, the children
+        of each spec keyed by the id() of the parent and failed results for
+        specs whose parent isn't in the batch.
+    """
+    results = {}  # type: Dict[int, BulkResult]
+    children = {}  # type: Dict[int, List[PageSpec]]
+    ready = []  # type: List[PageSpec]
+    batch = set(id(spec) for spec in specs)
+
+    for spec in specs:
+        if isinstance(spec.parent, PageSpec):
+            if id(spec.parent) not in batch:
+                results[id(spec)] = BulkResult(spec, error=ValueError('The parent of {} is not in the batch'.format(spec)))
+                continue
+            children.setdefault(id(spec.parent), []).append(spec)
+        else:
+            ready.append(spec)
+
+    return ready, children, results
+
+
+def _fail_descendants(spec, error, children, results):
+    # type: (PageSpec, BaseException, Dict[int, List[PageSpec]], Dict[int, BulkResult]) -> None
+    for child in children.pop(id(spec), []):
+        results[id(child)] = BulkResult(child, error=error)
+        _fail_descendants(child, error, children, results)
+
+
+def _ordered_results(specs, results):  # type: (List[PageSpec], Dict[int, BulkResult]) -> List[BulkResult]
+    # Anything without a result is part of a cycle of parents.
+    for spec in specs:
+        if id(spec) not in results:
+            results[id(spec)] = BulkResult(spec, error=ValueError('{} is its own ancestor'.format(spec)))
+
+    return [results[id(spec)] for spec in specs]
+
+
+def size_batches(sizes, max_bytes, max_items):  # type: (List[Optional[int]], int, int) -> List[List[int]]
+    """
+    Group items, in order, into batches of at most max_items whose sizes
+    total at most max_bytes. An item larger than max_bytes, or whose size
+    isn't known, is put in a batch of its own.
+
+    :return: The indexes of the items in each batch.
+    """
+    if max_items < 1:
+        raise ValueError('max_items must be at least 1')
+
+    batches = []  # type: List[List[int]]
+    batch = []  # type: List[int]
+    total = 0
+    for i, size in enumerate(sizes):
+        if size is None or size > max_bytes:
+            batches.append([i])
+            continue
+        if batch and (len(batch) >= max_items or total + size > max_bytes):
+            batches.append(batch)
+            batch = []
+            total = 0
+        batch.append(i)
+        total += size
+
+    if batch:
+        batches.append(batch)
+    return batches
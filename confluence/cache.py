@@ -0,0 +1,262 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+from confluence.retry import clock
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+class LRUCache:
+    """
+    A thread safe mapping holding at most max_entries items, the least
+    recently used item is evicted to make room for a new one.
+    """
+
+    def __init__(self, max_entries):  # type: (int) -> None
+        if max_entries < 1:
+            raise ValueError('max_entries must be at least 1')
+
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # type: OrderedDict
+        self._lock = threading.Lock()
+
+    def get(self, key):  # type: (Hashable) -> Optional[Any]
+        """
+        :return: The value stored against key, None if there isn't one.
+        """
+        with self._lock:
+            value = self._entries.pop(key, None)
+            if value is not None:
+                self._entries[key] = value
+            return value
+
+    def put(self, key, value):  # type: (Hashable, Any) -> None
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):  # type: (Hashable) -> None
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):  # type: () -> None
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):  # type: () -> int
+        return len(self._entries)
+
+
+class _CachedResponse:
+    def __init__(self, etag, last_modified, payload):  # type: (Optional[str], Optional[str], Any) -> None
+        self.etag = etag
+        self.last_modified = last_modified
+        self.payload = payload
+
+    def validators(self):  # type: () -> Dict[str, str]
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class HttpCache:
+    """
+    Stores the decoded bodies of GET responses along with their ETag and
+    Last-Modified validators. Subsequent requests for the same resource are
+    made conditional and a 304 Not Modified response is answered from the
+    cache without transferring or decoding the body again.
+
+    Cached bodies are shared between callers and must not be modified. The
+    same cache can be shared between several clients, entries are kept
+    separate per user.
+
+    The hits, misses and revalidations counters record how many requests
+    were answered from the cache, how many had no usable entry and how many
+    conditional requests were sent, respectively.
+    """
+
+    def __init__(self, max_entries=1024):  # type: (int) -> None
+        """
+        :param max_entries: The maximum number of responses held, the least
+            recently used is evicted first. Defaults to 1024.
+        """
+        self._entries = LRUCache(max_entries)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    def _count(self, counter):  # type: (str) -> None
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def validators(self, key):  # type: (Hashable) -> Dict[str, str]
+        """
+        :return: The conditional request headers to send for key, empty if
+            nothing is cached for it.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self._count('misses')
+            return {}
+
+        self._count('revalidations')
+        return entry.validators()
+
+    def not_modified(self, key):  # type: (Hashable) -> Optional[Any]
+        """
+        Called on a 304 response.
+
+        :return: The cached payload for key, None if it was evicted since the
+            conditional request was sent.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._count('hits')
+            return entry.payload
+        return None
+
+    def store(self, key, headers, payload):  # type: (Hashable, Any, Any) -> None
+        """
+        Cache payload if the response headers carry a validator, otherwise
+        drop any stale entry for key.
+        """
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if etag or last_modified:
+            self._entries.put(key, _CachedResponse(etag, last_modified, payload))
+        else:
+            self._entries.discard(key)
+
+    def clear(self):  # type: () -> None
+        self._entries.clear()
+
+    def stats(self):  # type: () -> Dict[str, int]
+        """
+        :return: A snapshot of the counters and the number of entries held.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'revalidations': self.revalidations,
+                    'entries': len(self._entries)}
+
+
+class ObjectCache:
+    """
+    Holds recently fetched single objects, e.g. pages, spaces, users and
+    groups, in memory for a limited time so repeated lookups don't need a
+    request at all.
+
+    Entries expire after the ttl for their resource type, the first segment
+    of their path (content, space, user, group...), and the least recently
+    used entry is evicted once max_entries is reached. Writes made through a
+    client using the cache invalidate every cached object under the
+    content or space written to, e.g. updating a property of content 123
+    invalidates content/123 with any expansion. Writes made elsewhere are
+    only seen once the entry expires.
+
+    Cached objects are shared between callers and must not be modified.
+    """
+
+    def __init__(self, max_entries=1024, ttl=60.0, ttls=None):
+        # type: (int, float, Optional[Dict[str, float]]) -> None
+        """
+        :param max_entries: The maximum number of objects held. Defaults to
+            1024.
+        :param ttl: The number of seconds an object is kept for unless
+            overridden for its resource type. Defaults to 60.
+        :param ttls: The number of seconds to keep each type of resource for,
+            keyed by the first segment of its path e.g. {'user': 600}. 0
+            disables caching of that type.
+        """
+        self._entries = LRUCache(max_entries)
+        self._ttl = ttl
+        self._ttls = dict(ttls or {})
+        # Each invalidation takes the next generation and records it against
+        # the resource, oldest first. Only the latest max_entries are kept,
+        # anything from before the oldest of those is treated as invalidated
+        # so that the records don't grow with the number of resources written.
+        self._generation = 0
+        self._invalidated = OrderedDict()  # type: OrderedDict[str, int]
+        self._max_invalidated = max_entries
+        self._floor = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _resources(path):  # type: (str) -> List[str]
+        segments = path.strip('/').split('/')
+        resources = ['/'.join(segments[:2])]
+        # Attachments are content in their own right as well as children of
+        # their page.
+        if segments[2:4] == ['child', 'attachment'] and len(segments) > 4:
+            resources.append('content/{}'.format(segments[4]))
+        return resources
+
+    def generation(self, path):  # type: (str) -> int
+        """
+        :return: A token to pass to put, taken before fetching the object at
+            path so that a write made while it was being fetched isn't lost.
+        """
+        with self._lock:
+            return self._generation
+
+    def _current(self, resource, generation):  # type: (str, int) -> bool
+        """True if resource hasn't been invalidated since generation, call with the lock held."""
+        return generation >= self._invalidated.get(resource, self._floor)
+
+    def get(self, key):  # type: (Hashable) -> Optional[Any]
+        """
+        :return: The cached object for key, None if it isn't cached, has
+            expired or has been invalidated.
+        """
+        entry = self._entries.get(key)
+        with self._lock:
+            if entry is not None:
+                expires_at, resource, generation, payload = entry
+                if expires_at > clock() and self._current(resource, generation):
+                    self.hits += 1
+                    return payload
+            self.misses += 1
+
+        if entry is not None:
+            self._entries.discard(key)
+        return None
+
+    def put(self, key, path, payload, generation):  # type: (Hashable, str, Any, int) -> None
+        ttl = self._ttls.get(path.strip('/').split('/')[0], self._ttl)
+        resource = ObjectCache._resources(path)[0]
+        with self._lock:
+            current = self._current(resource, generation)
+        if ttl > 0 and current:
+            self._entries.put(key, (clock() + ttl, resource, generation, payload))
+
+    def invalidate(self, path):  # type: (str) -> None
+        """
+        Invalidate every cached object belonging to the resource at path.
+        """
+        with self._lock:
+            self._generation += 1
+            for resource in ObjectCache._resources(path):
+                self._invalidated.pop(resource, None)
+                self._invalidated[resource] = self._generation
+            while len(self._invalidated) > self._max_invalidated:
+                _, self._floor = self._invalidated.popitem(last=False)
+
+    def clear(self):  # type: () -> None
+        self._entries.clear()
+
+    def stats(self):  # type: () -> Dict[str, int]
+        """
+        :return: A snapshot of the counters and the number of entries held.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
@@ -1,15 +1,33 @@
 import logging
 import os
 import requests
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
 from datetime import date
-from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
-
+from requests.adapters import HTTPAdapter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from confluence.attachmentsync import HASH_ALGORITHM, HASH_PROPERTY, SyncResult, file_digest, hash_record, unchanged
+from confluence.bulk import BulkResult, PageSpec, run_in_order, size_batches
+from confluence.cache import HttpCache, ObjectCache
+from confluence.codec import JsonCodec, default_codec
+from confluence.contentstore import ContentStore
+from confluence.download import RangesNotSupported, join_segments, parse_content_range, partial_path, \
+    partial_size, remove_segments, segment_ranges
 from confluence.exceptions.authenticationerror import ConfluenceAuthenticationError
 from confluence.exceptions.generalerror import ConfluenceError
 from confluence.exceptions.permissionerror import ConfluencePermissionError
 from confluence.exceptions.resourcenotfound import ConfluenceResourceNotFound
+from confluence.exceptions.servererror import ConfluenceServerError
+from confluence.exceptions.sizemismatch import ConfluenceSizeMismatch
+from confluence.exceptions.timeout import ConfluenceTimeout
+from confluence.exceptions.toomanyrequests import ConfluenceTooManyRequests
 from confluence.exceptions.valuetoolong import ConfluenceValueTooLong
 from confluence.exceptions.versionconflict import ConfluenceVersionConflict
+from confluence.export import ExportManifest, ExportResult, attachment_path
 from confluence.models.auditrecord import AuditRecord
 from confluence.models.content import CommentDepth, CommentLocation, Content, ContentStatus, ContentType, \
     ContentProperty
@@ -19,21 +37,64 @@ from confluence.models.label import Label, LabelPrefix
 from confluence.models.longtask import LongTask
 from confluence.models.space import Space, SpaceProperty, SpaceStatus, SpaceType
 from confluence.models.user import User
+from confluence.metrics import Metrics
+from confluence.mirror import LISTING_PAGE_SIZE, OVERLAP_MINUTES, MirrorResult, MirrorRun, MirrorStore
+from confluence.multipart import MultipartEncoder, ProgressCallback, ProgressTotal, content_length, path_of
+from confluence.paging import offset_pages, prefetch
+from confluence.ratelimit import RateLimiter, RequestKind
+from confluence.retry import RetryPolicy, clock
+from confluence.singleflight import SingleFlight
+from confluence.streaming import StreamedPage
+from confluence.timeouts import DEFAULT_TIMEOUT, CallOptions, Timeout
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
+STREAM_CHUNK_SIZE = 64 * 1024
+MAX_BATCH_BYTES = 50 * 1024 * 1024
+MAX_BATCH_FILES = 50
+
+# Limits on the "id in (...)" CQL queries used to fetch content in bulk, the
+# length keeps the URL well within what servers and proxies accept.
+CQL_MAX_IDS = 100
+CQL_MAX_LENGTH = 2000
+
 
 class Confluence:
     """
     External interface into this library, all calls should be made through an instance of this class.
 
-    Note: This class should be used in a context manager. e.g.
+    Note: This class can be used in a context manager. e.g.
     ```with Confluence(...) as c:```
+    in which case the underlying connection pool is closed on exit. When used
+    outside of a with block the pool is created on first use and kept until
+    close() is called.
     """
 
-    def __init__(self, base_url, basic_auth, verify_confluence_certificate=True):
-        # type: (str, Tuple[str, str], Union[bool, str]) -> None
+    def __init__(self,
+                 base_url,  # type: str
+                 basic_auth,  # type: Tuple[str, str]
+                 verify_confluence_certificate=True,  # type: Union[bool, str]
+                 pool_connections=10,  # type: int
+                 pool_maxsize=10,  # type: int
+                 keep_alive=True,  # type: bool
+                 retry_policy=None,  # type: Optional[RetryPolicy]
+                 rate_limiter=None,  # type: Optional[RateLimiter]
+                 prefetch_pages=0,  # type: int
+                 parallel_pages=0,  # type: int
+                 ordered_pages=True,  # type: bool
+                 page_size=None,  # type: Optional[int]
+                 stream_pages=False,  # type: bool
+                 json_codec=None,  # type: Optional[JsonCodec]
+                 timeout=DEFAULT_TIMEOUT,  # type: Timeout
+                 deadline=None,  # type: Optional[float]
+                 http2=False,  # type: bool
+                 http_cache=None,  # type: Optional[HttpCache]
+                 object_cache=None,  # type: Optional[ObjectCache]
+                 content_store=None,  # type: Optional[ContentStore]
+                 coalesce_requests=True,  # type: bool
+                 metrics=None,  # type: Optional[Metrics]
+                 ):  # type: (...) -> None
         """
         :param base_url: The URL where the confluence web app is located.
             e.g. https://mysite.mydomain/confluence.
@@ -46,34 +107,230 @@ class Confluence:
             bundle file.
             c.f. https://2.python-requests.org/en/master/user/advanced/ for
             more details.
-        """
+        :param pool_connections: The number of distinct hosts for which
+            connection pools are cached. Defaults to 10.
+        :param pool_maxsize: The maximum number of connections kept open to a
+            single host. Should be at least the number of threads sharing
+            this client. Defaults to 10.
+        :param keep_alive: Defaults to True. Set to False to close each
+            connection after a single request instead of returning it to the
+            pool.
+        :param retry_policy: Controls how throttled (429), unavailable (5xx)
+            and dropped requests are retried. Defaults to RetryPolicy() which
+            makes up to 4 attempts with jittered exponential backoff and
+            honours Retry-After. Pass RetryPolicy(max_attempts=1) to disable
+            retries.
+        :param rate_limiter: Optionally limit the rate of reads, writes and
+            attachment downloads made by this client. The same limiter can be
+            shared between several clients and threads.
+        :param prefetch_pages: The number of pages of a paged resource to
+            download on a background thread while the caller works through
+            the current page. Defaults to 0 which fetches each page only when
+            the previous one has been consumed. Not used by AsyncConfluence.
+        :param parallel_pages: If greater than 1 then paged resources which
+            report start, limit and size are fetched with up to this many
+            page requests in flight at once, by offset, instead of following
+            the next links one at a time. pool_maxsize should be at least
+            this large. Not used by AsyncConfluence.
+        :param ordered_pages: Only used with parallel_pages. Defaults to True
+            which yields results in the order the server returns them. Set to
+            False to yield each page as soon as it arrives.
+        :param page_size: The default number of results requested per page
+            by paged calls, each of which can override it. Defaults to None
+            which uses the server default (usually 25). The server may cap
+            this at a lower value.
+        :param stream_pages: Defaults to False. Set to True to decode the
+            results of paged calls incrementally as each page is received
+            and return each one as soon as it has been decoded, so that only
+            a single result is held in memory at a time instead of a whole
+            page. Useful with large expansions such as body.storage. Can't be
+            combined with prefetch_pages or parallel_pages. Not used by
+            AsyncConfluence.
+        :param json_codec: The codec used to encode request bodies and decode
+            responses. Defaults to the fastest one installed, see
+            confluence.codec.default_codec.
+        :param timeout: The timeout applied to each individual request,
+            either a number of seconds or a (connect, read) tuple as accepted
+            by the requests library. Defaults to 10s to connect and 300s
+            between bytes received. None waits forever.
+        :param deadline: Optionally the number of seconds which any one call
+            may take in total, including retries and, for paged calls,
+            fetching every page. ConfluenceTimeout is raised when it is
+            exceeded. Both this and timeout can be overridden for a group of
+            calls with call_options.
+        :param http2: Defaults to False. Set to True to send all requests
+            through httpx with HTTP/2 so that concurrent calls are
+            multiplexed over one connection per host instead of each using
+            its own. Requires ``pip install confluence-rest-library[http2]``.
+            Not used by AsyncConfluence.
+        :param http_cache: Optionally cache the responses to GET requests and
+            revalidate them with If-None-Match/If-Modified-Since, so that
+            unchanged resources aren't downloaded or decoded again. Its
+            counters show how effective it is. Not used for streamed pages,
+            not supported by AsyncConfluence.
+        :param object_cache: Optionally keep the results of single object
+            lookups such as get_content_by_id, get_space and get_user in
+            memory for a short time, writes through this client invalidate
+            the affected objects. Not supported by AsyncConfluence.
+        :param content_store: Optionally keep content fetched with the
+            body.storage or body.atlas_doc_format expansions in a persistent
+            store. get_content_by_id and paged calls returning content then
+            fetch just the version of each result first and only request the
+            full content of those which aren't already stored at that
+            version. Rendered bodies, e.g. body.view, can change without a
+            new version so are always fetched. Not used for streamed pages,
+            not supported by AsyncConfluence.
+        :param coalesce_requests: Defaults to True which makes threads
+            requesting the same resource at the same time wait for a single
+            request and share its result. Set to False to always send a
+            request per call. Not supported by AsyncConfluence, where it
+            defaults to False.
+        :param metrics: The counters this client records to, by default a new
+            Metrics instance available through the metrics property. Pass the
+            same instance to several clients to aggregate them.
+        """
+        if stream_pages and (prefetch_pages or parallel_pages):
+            raise ValueError('stream_pages cannot be combined with prefetch_pages or parallel_pages')
+
         self._base_url = base_url
         self._basic_auth = basic_auth
         self._client = None  # type: Optional[requests.Session]
+        self._client_lock = threading.Lock()
         self._verify_confluence_certificate = verify_confluence_certificate
+        self._pool_connections = pool_connections
+        self._pool_maxsize = pool_maxsize
+        self._keep_alive = keep_alive
+        self._retry_policy = retry_policy or RetryPolicy()
+        self._rate_limiter = rate_limiter
+        self._prefetch_pages = prefetch_pages
+        self._parallel_pages = parallel_pages
+        self._ordered_pages = ordered_pages
+        self._page_size = page_size
+        self._stream_pages = stream_pages
+        self._codec = json_codec or default_codec()
+        self._timeout = timeout
+        self._deadline = deadline
+        self._local = threading.local()
+        self._http2 = http2
+        self._http_cache = http_cache
+        self._object_cache = object_cache
+        self._content_store = content_store
+        self._single_flight = SingleFlight() if coalesce_requests else None
+        self._metrics = metrics or Metrics()
 
     def __enter__(self):  # type: () -> Confluence
-        self._client = requests.session()
-        self._client.auth = self._basic_auth
+        _ = self.client
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        if self._client:
-            self._client.close()
-            self._client = None
+        self.close()
+
+    def close(self):  # type: () -> None
+        """
+        Close all pooled connections. The client can still be used after this
+        call, a new pool is created on the next request.
+        """
+        with self._client_lock:
+            if self._client:
+                self._client.close()
+                self._client = None
+
+    @property
+    def metrics(self):  # type: () -> Metrics
+        """
+        :return: The counters recorded by this client.
+        """
+        return self._metrics
+
+    @contextmanager
+    def call_options(self, timeout=None, deadline=None):
+        # type: (Timeout, Optional[float]) -> Iterator[CallOptions]
+        """
+        Override the timeouts for every call made on this thread within a with
+        block. e.g.
+        ```
+        with c.call_options(timeout=5, deadline=60):
+            pages = list(c.search('space = SP'))
+        ```
+        raises ConfluenceTimeout if the search takes longer than 60s in total.
+        Paged results keep the options in force when the call was made even
+        if they are iterated after the block has exited.
+
+        :param timeout: The timeout applied to each individual request, None
+            to keep the client's.
+        :param deadline: The number of seconds which all calls made within the
+            block may take in total. Nested blocks can't extend the deadline
+            of an enclosing one.
+        """
+        outer = getattr(self._local, 'options', None)
+        if outer is not None:
+            options = outer.nested(timeout, deadline)
+        else:
+            options = CallOptions(self._timeout if timeout is None else timeout,
+                                  self._deadline if deadline is None else deadline)
+
+        self._local.options = options
+        try:
+            yield options
+        finally:
+            self._local.options = outer
+
+    def _current_options(self):  # type: () -> CallOptions
+        options = getattr(self._local, 'options', None)
+        if options is None:
+            options = CallOptions(self._timeout, self._deadline)
+        return options
+
+    @contextmanager
+    def _using_options(self, options):  # type: (CallOptions) -> Iterator[None]
+        """
+        Apply options captured on another thread to the calls made on this
+        one within a with block.
+        """
+        outer = getattr(self._local, 'options', None)
+        self._local.options = options
+        try:
+            yield
+        finally:
+            self._local.options = outer
+
+    def _create_session(self):  # type: () -> requests.Session
+        if self._http2:
+            from confluence.transport import Http2Session
+            return Http2Session(self._basic_auth,  # type: ignore
+                                verify=self._verify_confluence_certificate,
+                                max_connections=self._pool_maxsize,
+                                keep_alive=self._keep_alive)
+
+        session = requests.session()
+        session.auth = self._basic_auth
+
+        adapter = HTTPAdapter(pool_connections=self._pool_connections, pool_maxsize=self._pool_maxsize)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+        if not self._keep_alive:
+            session.headers['Connection'] = 'close'
+
+        return session
 
     @property
     def client(self):
-        # type: () -> Union[requests.Session, Any]
+        # type: () -> requests.Session
         """
-        Provides access to an underlying requestsalike object so that the
-        client can be used in or out of a with block.
+        Provides access to the underlying pooled requests.Session so that
+        connections are reused between calls whether or not the client is
+        used in a with block. The session is created lazily on first use.
 
-        :return: An object which behaves like requests.Session
+        :return: The requests.Session used for all calls.
         """
-        # Allow the class to be used without being inside a with block if
-        # required.
-        return self._client if self._client else requests
+        session = self._client
+        if session is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._create_session()
+                session = self._client
+        return session
 
     @staticmethod
     def _handle_response_errors(path, params, response):
@@ -90,6 +347,10 @@ class Confluence:
             raise ConfluenceVersionConflict(path, params, response)
         elif response.status_code == 413:
             raise ConfluenceValueTooLong(path, params, response)
+        elif response.status_code == 429:
+            raise ConfluenceTooManyRequests(path, params, response)
+        elif response.status_code >= 500:
+            raise ConfluenceServerError(path, params, response)
 
     def _make_url(self, path):
         # type: (str) -> str
@@ -99,33 +360,159 @@ class Confluence:
             format_string = '{}/rest/api/{}'
         return format_string.format(self._base_url, path)
 
-    def _get(self, path, params, expand):
-        # type: (str, Dict[str, str], Optional[List[str]]) -> requests.Response
+    def _request(self, method, path, params, kind=None, options=None, **kwargs):
+        # type: (str, str, Dict[str, str], Optional[RequestKind], Optional[CallOptions], **Any) -> requests.Response
+        """
+        Send a single request, retrying according to the retry policy, and
+        raise the matching exception if the final response is an error.
+
+        Every attempt is counted against the rate limiter, kind defaults to
+        READ for GET requests and WRITE for everything else. options defaults
+        to those in force on the calling thread and must be passed explicitly
+        when called from a background thread.
+        """
+        if kind is None:
+            kind = RequestKind.READ if method == 'GET' else RequestKind.WRITE
+        if options is None:
+            options = self._current_options()
+
         url = self._make_url(path)
+        policy = self._retry_policy
+        body = kwargs.get('data')
+        start = clock()
+        attempt = 0
+
+        while True:
+            attempt += 1
+            if attempt > 1 and isinstance(body, MultipartEncoder):
+                body.rewind()
+
+            if self._rate_limiter:
+                # Reserved rather than acquired so that a wait which would
+                # outlast the deadline fails straight away.
+                wait = self._rate_limiter.reserve(kind)
+                remaining = options.remaining()
+                if remaining is not None and wait >= remaining:
+                    raise ConfluenceTimeout(path, params, options.deadline)
+                if wait > 0:
+                    time.sleep(wait)
+
+            if options.expired():
+                raise ConfluenceTimeout(path, params, options.deadline)
+
+            try:
+                response = self.client.request(method, url, params=params, auth=self._basic_auth,
+                                               verify=self._verify_confluence_certificate,
+                                               timeout=options.request_timeout(), **kwargs)
+            except requests.RequestException as e:
+                if isinstance(e, requests.Timeout) and options.expired():
+                    raise ConfluenceTimeout(path, params, options.deadline)
+                delay = policy.delay_after_error(method, e, attempt, clock() - start)
+                if delay is None or not _can_resend(body):
+                    raise
+                logger.warning('%s %s failed (%s), retrying in %.2fs', method, path, e, delay)
+            else:
+                delay = policy.delay_after_response(method, response, attempt, clock() - start)
+                if delay is None or not _can_resend(body):
+                    Confluence._handle_response_errors(path, params, response)
+                    return response
+                logger.warning('%s %s returned %d, retrying in %.2fs', method, path, response.status_code, delay)
+                response.close()
+
+            remaining = options.remaining()
+            if remaining is not None and delay >= remaining:
+                raise ConfluenceTimeout(path, params, options.deadline)
 
+            time.sleep(delay)
+
+    def _decode(self, response):  # type: (requests.Response) -> Any
+        return self._codec.loads(response.content)
+
+    def _get(self, path, params, expand, options=None):
+        # type: (str, Dict[str, str], Optional[List[str]], Optional[CallOptions]) -> requests.Response
         if expand:
             params['expand'] = ','.join(expand)
 
-        response = self.client.get(url, params=params, auth=self._basic_auth,
-                                   verify=self._verify_confluence_certificate)
+        return self._request('GET', path, params, options=options)
 
-        Confluence._handle_response_errors(path, params, response)
+    def _request_key(self, path, params):  # type: (str, Dict[str, str]) -> Tuple[Any, ...]
+        return self._basic_auth[0], self._make_url(path), tuple(sorted(params.items()))
 
-        return response
+    def _get_json(self, path, params, expand, options=None):
+        # type: (str, Dict[str, str], Optional[List[str]], Optional[CallOptions]) -> Any
+        """
+        GET and decode a resource. Identical requests made concurrently from
+        several threads are coalesced into one whose result is shared.
+        """
+        if expand:
+            params['expand'] = ','.join(expand)
 
-    def _get_single_result(self, item_type, path, params, expand):
-        # type: (Callable, str, Dict[str, str], Optional[List[str]]) -> Any
-        return item_type(self._get(path, params, expand).json())
+        if self._single_flight is None:
+            return self._fetch_json(path, params, options)
+
+        # Callers wait for a request in flight no longer than their own
+        # deadline allows and don't share its timeout, which came from the
+        # deadline of whoever sent it.
+        options = options or self._current_options()
+        return self._single_flight.do(self._request_key(path, params),
+                                      lambda: self._fetch_json(path, params, options),
+                                      timeout=options.remaining(),
+                                      shares_error=lambda e: not isinstance(e, ConfluenceTimeout))
+
+    def _fetch_json(self, path, params, options):
+        # type: (str, Dict[str, str], Optional[CallOptions]) -> Any
+        """
+        GET and decode a resource, through the HTTP cache if there is one. A
+        304 response returns the cached body without decoding anything.
+        """
+        cache = self._http_cache
+        if cache is None:
+            return self._decode(self._get(path, params, None, options))
+
+        key = self._request_key(path, params)
+        response = self._request('GET', path, params, options=options, headers=cache.validators(key))
+        if response.status_code == 304:
+            payload = cache.not_modified(key)
+            if payload is not None:
+                return payload
+            # Evicted while the request was in flight.
+            response = self._request('GET', path, params, options=options)
+
+        payload = self._decode(response)
+        cache.store(key, response.headers, payload)
+        return payload
+
+    def _get_cached_json(self, path, params, expand):
+        # type: (str, Dict[str, str], Optional[List[str]]) -> Any
+        """
+        GET and decode a single object, through the object cache if there is
+        one.
+        """
+        cache = self._object_cache
+        if cache is None:
+            return self._get_json(path, params, expand)
 
-    def _get_paged_results(self, item_type, path, params, expand):
-        # type: (Callable, str, Dict[str, str], Optional[List[str]]) -> Iterable[Any]
         if expand:
             params['expand'] = ','.join(expand)
 
+        # Keyed on the full URL, like the HTTP cache, so that a cache shared by
+        # clients of different servers keeps their objects apart.
+        key = (self._basic_auth[0], self._make_url(path), tuple(sorted(params.items())))
+        payload = cache.get(key)
+        if payload is None:
+            generation = cache.generation(path)
+            payload = self._get_json(path, params, None)
+            cache.put(key, path, payload, generation)
+        return payload
+
+    def _get_single_result(self, item_type, path, params, expand):
+        # type: (Callable, str, Dict[str, str], Optional[List[str]]) -> Any
+        return item_type(self._get_cached_json(path, params, expand))
+
+    def _get_pages(self, path, params, options):
+        # type: (str, Dict[str, str], CallOptions) -> Iterable[Dict[str, Any]]
         while path != "":
-            response = self._get(path, params, [])
-            Confluence._handle_response_errors(path, params, response)
-            search_results = response.json()
+            search_results = self._get_json(path, params, [], options)
 
             if 'next' in search_results['_links']:
                 # We have another page of results
@@ -135,64 +522,254 @@ class Confluence:
                 # No more pages of results
                 path = ""
 
-            for result in search_results['results']:
+            yield search_results
+
+    def _get_pages_parallel(self, path, params, options):
+        # type: (str, Dict[str, str], CallOptions) -> Iterable[Dict[str, Any]]
+        base_params = dict(params)
+        first_page = self._get_json(path, params, [], options)
+        yield first_page
+
+        if 'next' not in first_page['_links']:
+            return
+
+        if not all(k in first_page for k in ('start', 'limit', 'size')):
+            # Offsets aren't available on this resource so fall back to
+            # following the next links.
+            for page in self._get_pages(first_page['_links']['next'], {}, options):
+                yield page
+            return
+
+        def fetch_page(start, limit):  # type: (int, int) -> Dict[str, Any]
+            page_params = dict(base_params)
+            page_params['start'] = str(start)
+            page_params['limit'] = str(limit)
+            return self._get_json(path, page_params, [], options)
+
+        # The limit on the response is what the server actually used, which
+        # may be lower than the one requested.
+        limit = first_page['limit']
+        for page in offset_pages(fetch_page, first_page['start'] + limit, limit, self._parallel_pages,
+                                 ordered=self._ordered_pages, total_size=first_page.get('totalSize')):
+            yield page
+
+    def _get_streamed_results(self, path, params, options):
+        # type: (str, Dict[str, str], CallOptions) -> Iterable[Dict[str, Any]]
+        while path != "":
+            with closing(self._request('GET', path, params, options=options, stream=True)) as response:
+                page = StreamedPage(response.iter_content(chunk_size=STREAM_CHUNK_SIZE), loads=self._codec.loads)
+                for result in page:
+                    yield result
+
+            links = page.envelope['_links'] if page.envelope else {}
+            if 'next' in links:
+                path = links['next']
+                params.clear()
+            else:
+                path = ""
+
+    def _get_paged_results(self, item_type, path, params, expand, page_size=None):
+        # type: (Callable, str, Dict[str, str], Optional[List[str]], Optional[int]) -> Iterable[Any]
+        """
+        Walk every page of a paged resource by following the next links.
+
+        Each page is requested through the retry policy so a throttled or
+        failed page is retried on its own and the walk carries on from that
+        page rather than starting again. If prefetch_pages is set then the
+        following pages are downloaded in the background while the results
+        of the current one are being consumed. If parallel_pages is set then
+        the remaining pages are requested concurrently by offset. If
+        stream_pages is set then each result is decoded and returned as it
+        arrives.
+
+        page_size, or the client default, is sent as the limit on the first
+        request. Subsequent requests use the limit the server actually
+        applied so a capped limit is adapted to automatically.
+
+        The call options in force when this is called, rather than when the
+        results are iterated, apply to every page so the deadline covers the
+        whole walk.
+
+        If there is a content store and the results are content with
+        storable expansions then the pages only list the version of each
+        result and the full content is filled in from the store.
+        """
+        options = self._current_options()
+        fill = None
+        if self._content_store is not None and item_type is Content and ContentStore.storable(expand):
+            stored_expand = expand  # type: List[str]
+
+            def fill(results):  # type: (List[Dict[str, Any]]) -> List[Dict[str, Any]]
+                return self._fill_from_store(results, stored_expand, options)
+
+            expand = ['version']
+
+        if expand:
+            params['expand'] = ','.join(expand)
+
+        page_size = page_size or self._page_size
+        if page_size:
+            params['limit'] = str(page_size)
+
+        return self._iter_paged_results(item_type, path, params, options, fill)
+
+    def _iter_paged_results(self, item_type, path, params, options, fill=None):
+        # type: (Callable, str, Dict[str, str], CallOptions, Optional[Callable]) -> Iterable[Any]
+        if self._stream_pages and fill is None:
+            for result in self._get_streamed_results(path, params, options):
                 yield item_type(result)
+            return
 
-    def _post(self, path, params, data, files=None, expand=None):
-        # type: (str, Dict[str, str], Any, Optional[Any], Optional[List[str]]) -> requests.Response
-        url = self._make_url(path)
-        headers = {"X-Atlassian-Token": "nocheck"}
+        if self._parallel_pages > 1:
+            pages = self._get_pages_parallel(path, params, options)
+        else:
+            pages = self._get_pages(path, params, options)
+            if self._prefetch_pages > 0:
+                pages = prefetch(pages, self._prefetch_pages)
+
+        for page in pages:
+            results = page['results'] if fill is None else fill(page['results'])
+            for result in results:
+                yield item_type(result)
+
+    def _fill_from_store(self, listing, expand, options=None):
+        # type: (List[Dict[str, Any]], List[str], Optional[CallOptions]) -> List[Dict[str, Any]]
+        """
+        Replace each item of a listing of content, which need only include
+        the id and version, with the content fetched with expand. Content
+        already in the content store at that version isn't requested again.
+        """
+        store = self._content_store
+        key = ContentStore.expand_key(expand)
+        versions = dict((r['id'], r['version']['number']) for r in listing)
+        statuses = dict((r['id'], r.get('status', 'current')) for r in listing)
+        # Drafts change without their version changing so are never stored.
+        stored = store.get_many(dict((i, v) for i, v in versions.items() if statuses[i] != 'draft'), key)
+
+        fetched = {}  # type: Dict[str, Any]
+        missing = [i for i in versions if i not in stored]
+        searchable = [i for i in missing if statuses[i] == 'current']
+        if len(searchable) > 1:
+            # Fetch everything missing from the page in as few requests as
+            # possible.
+            for batch in _id_batches(searchable, CQL_MAX_IDS, CQL_MAX_LENGTH):
+                params = {'cql': 'id in ({})'.format(','.join(batch)), 'limit': str(len(batch)), 'expand': key}
+                for page in self._get_pages('content/search', params, options):
+                    for result in page['results']:
+                        fetched[result['id']] = result
+        for content_id in missing:
+            # Anything a search won't return e.g. drafts, which are only
+            # found when asked for by status, and historical versions.
+            if content_id not in fetched:
+                params = {}
+                if statuses[content_id] != 'current':
+                    params['status'] = statuses[content_id]
+                if statuses[content_id] == 'historical':
+                    params['version'] = str(versions[content_id])
+                fetched[content_id] = self._get_json('content/{}'.format(content_id), params, [key], options)
+
+        store.put_many([(i, r['version']['number'], self._codec.dumps(r)) for i, r in fetched.items()
+                        if statuses[i] != 'draft'], key)
+
+        return [fetched[r['id']] if r['id'] in fetched else self._codec.loads(stored[r['id']]) for r in listing]
+
+    def _write(self, method, path, params, **kwargs):
+        # type: (str, str, Dict[str, str], **Any) -> requests.Response
+        """
+        Send a request which modifies the resource at path, invalidating any
+        cached copies of it once the request has completed whether or not it
+        succeeded.
+        """
+        try:
+            return self._request(method, path, params, **kwargs)
+        finally:
+            if self._object_cache is not None:
+                self._object_cache.invalidate(path)
+
+    def _compare_and_swap(self, fetch, update, max_attempts):
+        # type: (Callable[[], Any], Callable[[Any], Any], int) -> Any
+        """
+        Fetch the current version of an object and update it, starting again
+        from a fresh copy whenever the update fails with a version conflict.
+        Retries are delayed by the retry policy's backoff and counted in the
+        cas.* metrics.
+        """
+        if max_attempts < 1:
+            raise ValueError('max_attempts must be at least 1')
+
+        options = self._current_options()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result = update(fetch())
+                self._metrics.increment('cas.updates')
+                return result
+            except ConfluenceVersionConflict:
+                self._metrics.increment('cas.conflicts')
+                if attempt >= max_attempts:
+                    self._metrics.increment('cas.failures')
+                    raise
+
+            delay = self._retry_policy.backoff(attempt)
+            remaining = options.remaining()
+            if remaining is not None and delay >= remaining:
+                self._metrics.increment('cas.failures')
+                raise ConfluenceTimeout('compare and swap', {}, options.deadline)
+
+            self._metrics.increment('cas.retries')
+            logger.info('Version conflict on attempt %d, retrying in %.2fs', attempt, delay)
+            time.sleep(delay)
+
+    def _post(self, path, params, data, expand=None):
+        # type: (str, Dict[str, str], Any, Optional[List[str]]) -> requests.Response
+        headers = {"X-Atlassian-Token": "nocheck", 'Content-Type': 'application/json'}
 
         if expand:
             params['expand'] = ','.join(expand)
 
-        response = self.client.post(url, params=params, json=data, headers=headers, files=files, auth=self._basic_auth,
-                                    verify=self._verify_confluence_certificate)
+        return self._write('POST', path, params, data=self._codec.dumps(data), headers=headers)
+
+    def _post_multipart(self, path, params, body, expand=None):
+        # type: (str, Dict[str, str], MultipartEncoder, Optional[List[str]]) -> requests.Response
+        headers = {"X-Atlassian-Token": "nocheck", 'Content-Type': body.content_type}
+        if body.len is not None:
+            headers['Content-Length'] = str(body.len)
 
-        Confluence._handle_response_errors(path, params, response)
+        if expand:
+            params['expand'] = ','.join(expand)
 
-        return response
+        return self._write('POST', path, params, headers=headers, data=body)
 
-    def _post_return_single(self, item_type, path, params, data, files=None, expand=None):
-        # type: (Callable, str, Dict[str, str], Any, Optional[Dict[str, Any]], Optional[List[str]]) -> Any
-        return item_type(self._post(path, params, data, files=files, expand=expand).json())
+    def _post_return_single(self, item_type, path, params, data, expand=None):
+        # type: (Callable, str, Dict[str, str], Any, Optional[List[str]]) -> Any
+        return item_type(self._decode(self._post(path, params, data, expand=expand)))
 
-    def _post_return_multiple(self, item_type, path, params, data, files, expand=None):
-        # type: (Callable, str, Dict[str, str], Any, Dict[str, Any], Optional[List[str]]) -> Any
-        response = self._post(path, params, data, files=files, expand=expand)
+    def _post_return_multiple(self, item_type, path, params, data, expand=None):
+        # type: (Callable, str, Dict[str, str], Any, Optional[List[str]]) -> Any
+        response = self._post(path, params, data, expand=expand)
 
-        return [item_type(r) for r in response.json()['results']]
+        return [item_type(r) for r in self._decode(response)['results']]
 
     def _put(self, path, params, data, expand):
         # type: (str, Dict[str, str], Any, Optional[List[str]]) -> requests.Response
-        url = self._make_url(path)
         headers = {"X-Atlassian-Token": "nocheck"}
 
         if expand:
             params['expand'] = ','.join(expand)
 
-        response = self.client.put(url, json=data, params=params, headers=headers, auth=self._basic_auth,
-                                   verify=self._verify_confluence_certificate)
-
-        Confluence._handle_response_errors(path, params, response)
-
-        return response
+        headers['Content-Type'] = 'application/json'
+        return self._write('PUT', path, params, data=self._codec.dumps(data), headers=headers)
 
     def _put_return_single(self, item_type, path, params, data, expand=None):
         # type: (Callable, str, Dict[str, str], Any, Optional[List[str]]) -> Any
-        return item_type(self._put(path, params, data, expand).json())
+        return item_type(self._decode(self._put(path, params, data, expand)))
 
     def _delete(self, path, params):
         # type: (str, Dict[str, str]) -> requests.Response
-        url = self._make_url(path)
         headers = {"X-Atlassian-Token": "nocheck"}
 
-        response = self.client.delete(url, params=params, headers=headers, auth=self._basic_auth,
-                                      verify=self._verify_confluence_certificate)
-
-        Confluence._handle_response_errors(path, params, response)
-
-        return response
+        return self._write('DELETE', path, params, headers=headers)
 
     def create_content(self, content_type, title, space_key, content, parent_content_id=None, expand=None):
         # type: (ContentType, str, str, str, Optional[int], Optional[List[str]]) -> Content
@@ -303,9 +880,101 @@ class Confluence:
         return self._put_return_single(Content, 'content/{}'.format(content_id), params=params, data=content,
                                        expand=expand)
 
+    def modify_content(self, content_id, transform, max_attempts=5, minor_edit=False, edit_message=None, expand=None):
+        # type: (int, Callable[[Content], Optional[str]], int, bool, Optional[str], Optional[List[str]]) -> Content
+        """
+        Update the body of a piece of content based on its current version,
+        without needing to know that version. If someone else updates the
+        content in the meantime then the latest version is fetched and
+        transform applied to it again.
+
+        :param content_id: The confluence unique ID.
+        :param transform: Called with the latest version of the content, with
+            body.storage expanded, and returns its new storage format body or
+            None to leave it unchanged. May be called several times.
+        :param max_attempts: The number of times to try the update before
+            raising ConfluenceVersionConflict. Defaults to 5.
+        :param minor_edit: Defaults to False. Set to true to make this update
+            a minor edit.
+        :param edit_message: Edit message, optional.
+        :param expand: An optional list of properties to be expanded on the resulting content object.
+
+        :return: The updated content object, or the latest version if
+            transform left it unchanged.
+        """
+        path = 'content/{}'.format(content_id)
+
+        def fetch():  # type: () -> Content
+            # Bypasses the object cache, which may hold an older version.
+            return Content(self._get_json(path, {}, ['body.storage', 'version']))
+
+        def update(current):  # type: (Content) -> Content
+            new_content = transform(current)
+            if new_content is None:
+                return current
+            return self.update_content(content_id, current.type, current.version.number + 1, new_content,
+                                       current.title, minor_edit=minor_edit, edit_message=edit_message,
+                                       expand=expand)
+
+        return self._compare_and_swap(fetch, update, max_attempts)
+
+    def publish_pages(self, specs, max_workers=4, max_attempts=5):
+        # type: (Iterable[PageSpec], int, int) -> List[BulkResult]
+        """
+        Create or update many pages at once, up to max_workers at a time. A
+        page whose parent is another PageSpec in the batch is only published
+        once its parent has been, so whole trees can be published in one
+        call.
+
+        A failure doesn't stop the rest of the batch, the page's descendants
+        in the batch are skipped and every other page is still published.
+
+        :param specs: The pages to publish. A spec with a content_id updates
+            that page, replacing its title and body and, if a parent is
+            given, moving it. Otherwise a new page is created.
+        :param max_workers: The maximum number of pages published at once.
+            pool_maxsize should be at least this large.
+        :param max_attempts: The number of times to try each update before
+            failing it with ConfluenceVersionConflict. Defaults to 5.
+
+        :return: A BulkResult for each spec in the order given, holding
+            either the published content or the exception which stopped it
+            being published.
+        """
+        # The pages are published on worker threads but use the call options
+        # in force on this one.
+        options = self._current_options()
+
+        def publish(spec, parent_id):  # type: (PageSpec, Optional[int]) -> Content
+            with self._using_options(options):
+                if spec.content_id is None:
+                    content = self.create_content(ContentType.PAGE, spec.title, spec.space_key, spec.body,
+                                                  parent_content_id=parent_id)
+                    self._metrics.increment('bulk.created')
+                    return content
+
+                path = 'content/{}'.format(spec.content_id)
+
+                def fetch():  # type: () -> Content
+                    return Content(self._get_json(path, {}, ['version']))
+
+                def update(current):  # type: (Content) -> Content
+                    return self.update_content(spec.content_id, current.type, current.version.number + 1, spec.body,
+                                               spec.title, new_parent=parent_id)
+
+                content = self._compare_and_swap(fetch, update, max_attempts)
+                self._metrics.increment('bulk.updated')
+                return content
+
+        results = run_in_order(specs, publish, max_workers)
+        failed = sum(1 for result in results if not result.ok)
+        if failed:
+            self._metrics.increment('bulk.failed', failed)
+        return results
+
     def get_content(self, content_type=ContentType.PAGE, space_key=None,
-                    title=None, status=None, posting_day=None, expand=None):
-        # type: (ContentType, Optional[str], Optional[str], Optional[str], Optional[date], Optional[List[str]]) -> Iterable[Content]
+                    title=None, status=None, posting_day=None, expand=None, page_size=None):
+        # type: (ContentType, Optional[str], Optional[str], Optional[str], Optional[date], Optional[List[str]], Optional[int]) -> Iterable[Content]
         """
         Matches the REST API call https://docs.atlassian.com/atlassian-confluence/REST/6.6.0/#content-getContent
         which returns an iterable of either pages or blogposts depending on
@@ -330,6 +999,8 @@ class Confluence:
             returning all fields on all requests. This optional parameter allows
             the user to select which fields that they want to expand as a comma
             separated list.
+        :param page_size: The number of results to request per page,
+            overriding the client default. The server may use a lower limit.
 
         :return: An iterable of pages/blogposts which match the parameters.
         """
@@ -349,7 +1020,7 @@ class Confluence:
         if posting_day and content_type == ContentType.BLOG_POST:
             params['postingDay'] = posting_day.strftime('%Y-%m-%d')
 
-        return self._get_paged_results(Content, 'content', params, expand)
+        return self._get_paged_results(Content, 'content', params, expand, page_size=page_size)
 
     def get_content_by_id(self, content_id, expand=None):
         # type: (int, Optional[List[str]]) -> Content
@@ -367,8 +1038,114 @@ class Confluence:
 
         :return: An iterable of pages/blogposts which match the parameters.
         """
+        if self._content_store is not None and ContentStore.storable(expand):
+            listing = self._get_cached_json('content/{}'.format(content_id), {}, ['version'])
+            return Content(self._fill_from_store([listing], expand)[0])
+
         return self._get_single_result(Content, 'content/{}'.format(content_id), {}, expand)
 
+    def get_content_by_ids(self, content_ids, expand=None, max_workers=4):
+        # type: (Iterable[int], Optional[List[str]], int) -> Tuple[Dict[int, Content], List[int]]
+        """
+        Fetch many pieces of content at once. The ids are split into batches
+        which are each fetched with an "id in (...)" CQL search, up to
+        max_workers batches at a time, rather than requesting each piece of
+        content on its own.
+
+        :param content_ids: The ids of the content to fetch, duplicates are
+            ignored.
+        :param expand: The fields to expand on each piece of content, as for
+            get_content_by_id.
+        :param max_workers: The maximum number of batches fetched at once.
+            pool_maxsize should be at least this large.
+
+        :return: A tuple of a dictionary of the content found keyed by id,
+            and a list of the ids which weren't found. Content is only found
+            by a search if it is current and visible to the user.
+        """
+        ids = list(OrderedDict.fromkeys(int(i) for i in content_ids))
+        found = {content.id: content for content in self._get_by_ids(Content, ids, expand, max_workers)}
+        return found, [i for i in ids if i not in found]
+
+    def mirror_space(self, store, space_key, expand=None, detect_deletions=False, overlap_minutes=OVERLAP_MINUTES,
+                     max_workers=4):
+        # type: (MirrorStore, str, Optional[List[str]], bool, int, int) -> MirrorResult
+        """
+        Bring a local copy of the pages and blog posts in a space up to date,
+        fetching only the content which has changed since it was last
+        mirrored.
+
+        The first mirror of a space fetches all of its content. Later ones
+        search for the content modified since the store's checkpoint for the
+        space, which costs a page of results per page_size changes, and
+        fetch only the content whose version differs from the one held.
+        Content is written to the store in batches as it arrives and the
+        checkpoint only moves forward once all of it has been stored, so a
+        mirror which fails part way is picked up again by the next.
+
+        CQL can't find deleted content, so when detect_deletions is set the
+        ids in the space are listed, without expanding anything, and content
+        which is no longer there is removed. This also picks up content
+        which a search by modification time misses, e.g. pages moved into
+        the space or restored from the trash. It costs a request per
+        LISTING_PAGE_SIZE pieces of content in the space so is best done
+        less often than the mirror itself.
+
+        :param store: The MirrorStore holding the local copy.
+        :param space_key: The space to mirror.
+        :param expand: The fields to expand on each piece of content, as for
+            get_content_by_id. Defaults to MIRROR_EXPAND, the version is
+            always included.
+        :param detect_deletions: Set to True to list the ids in the space
+            and remove deleted content from the store. A full mirror always
+            removes it.
+        :param overlap_minutes: How far before the checkpoint to search for
+            changes.
+        :param max_workers: The maximum number of batches of changed content
+            fetched at once. pool_maxsize should be at least this large.
+
+        :return: A MirrorResult listing the content updated and deleted.
+        """
+        run = MirrorRun(store, space_key, expand, overlap_minutes)
+
+        if run.full:
+            for content in self._get_paged_results(dict, 'content/search', {'cql': run.scope}, run.expand):
+                run.add(content)
+        else:
+            listed = {c.id: c.version.number for c in self.search(run.changes, expand=['version'])}
+            current = None
+            if detect_deletions:
+                current = [c.id for c in self.search(run.scope, page_size=LISTING_PAGE_SIZE)]
+            stale = run.plan(listed, current)
+            for i in range(0, len(stale), LISTING_PAGE_SIZE):
+                for content in self._get_by_ids(dict, stale[i:i + LISTING_PAGE_SIZE], run.expand, max_workers):
+                    run.add(content)
+
+        result = run.finish()
+        self._metrics.increment('mirror.updated', len(result.updated))
+        self._metrics.increment('mirror.deleted', len(result.deleted))
+        logger.info('%s', result)
+        return result
+
+    def _get_by_ids(self, item_type, content_ids, expand, max_workers):
+        # type: (Callable, List[int], Optional[List[str]], int) -> List[Any]
+        """
+        Fetch many pieces of content at once, as for get_content_by_ids,
+        returning each as item_type.
+        """
+        # The searches are created on this thread so that they use its call
+        # options, they're iterated on the worker threads.
+        searches = [self._get_paged_results(item_type, 'content/search', {'cql': 'id in ({})'.format(','.join(batch))},
+                                            expand, page_size=len(batch))
+                    for batch in _id_batches(content_ids, CQL_MAX_IDS, CQL_MAX_LENGTH)]
+
+        found = []  # type: List[Any]
+        if searches:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(searches))) as executor:
+                for results in executor.map(list, searches):
+                    found.extend(results)
+        return found
+
     def delete_content(self, content_id, content_status):  # type: (int, ContentStatus) -> None
         """
         Deletes a piece of content according to a set of rules based on it's status.
@@ -397,8 +1174,8 @@ class Confluence:
         """
         return self._get_single_result(ContentHistory, 'content/{}/history'.format(content_id), {}, expand)
 
-    def get_child_pages(self, content_id, parent_version=None, expand=None):
-        # type: (int, Optional[int], Optional[List[str]]) -> Iterable[Content]
+    def get_child_pages(self, content_id, parent_version=None, expand=None, page_size=None):
+        # type: (int, Optional[int], Optional[List[str]], Optional[int]) -> Iterable[Content]
         """
         Get the child pages of a piece of content. Doesn't recurse through
         their children.
@@ -409,6 +1186,8 @@ class Confluence:
         :param expand: The confluence REST API utilised expansion to avoid
             returning all fields on all requests. This optional parameter allows
             the user to select which fields that they want to expand as a list.
+        :param page_size: The number of results to request per page,
+            overriding the client default. The server may use a lower limit.
 
         :return: An iterable containing 0-n pages that are children of this page.
         """
@@ -416,10 +1195,10 @@ class Confluence:
         if parent_version:
             params['parentVersion'] = str(parent_version)
 
-        return self._get_paged_results(Content, 'content/{}/child/page'.format(content_id), params, expand)
+        return self._get_paged_results(Content, 'content/{}/child/page'.format(content_id), params, expand, page_size=page_size)
 
-    def get_comments(self, content_id, depth=None, parent_version=None, location=None, expand=None):
-        # type: (int, Optional[CommentDepth], Optional[int], Optional[List[CommentLocation]], Optional[List[str]]) -> Iterable[Content]
+    def get_comments(self, content_id, depth=None, parent_version=None, location=None, expand=None, page_size=None):
+        # type: (int, Optional[CommentDepth], Optional[int], Optional[List[CommentLocation]], Optional[List[str]], Optional[int]) -> Iterable[Content]
         """
         Retrieve comments on a piece of content.
 
@@ -432,6 +1211,8 @@ class Confluence:
         :param expand: The confluence REST API utilised expansion to avoid
             returning all fields on all requests. This optional parameter allows
             the user to select which fields that they want to expand as a list.
+        :param page_size: The number of results to request per page,
+            overriding the client default. The server may use a lower limit.
 
         :return: A list of 0-n comments from the document.
         """
@@ -450,10 +1231,11 @@ class Confluence:
         return self._get_paged_results(Content,
                                        'content/{}/child/comment'.format(content_id),
                                        params=params,
-                                       expand=expand)
+                                       expand=expand,
+                                       page_size=page_size)
 
-    def get_attachments(self, content_id, filename=None, media_type=None, expand=None):
-        # type: (int, Optional[str], Optional[str], Optional[List[str]]) -> Iterable[Content]
+    def get_attachments(self, content_id, filename=None, media_type=None, expand=None, page_size=None):
+        # type: (int, Optional[str], Optional[str], Optional[List[str]], Optional[int]) -> Iterable[Content]
         """
         Retrieve attachments on a piece of content.
 
@@ -464,6 +1246,8 @@ class Confluence:
         :param expand: The confluence REST API utilised expansion to avoid
             returning all fields on all requests. This optional parameter allows
             the user to select which fields that they want to expand as a list.
+        :param page_size: The number of results to request per page,
+            overriding the client default. The server may use a lower limit.
 
         :return: A list of 0-n attachments from the document.
         """
@@ -478,57 +1262,497 @@ class Confluence:
         return self._get_paged_results(Content,
                                        'content/{}/child/attachment'.format(content_id),
                                        params=params,
-                                       expand=expand)
+                                       expand=expand,
+                                       page_size=page_size)
 
     def download_attachment(self, attachment):
         # type: (Content) -> bytes
         """
         Downloads an attachment. To be used in conjunction with get_attachments.
+        The whole attachment is held in memory, use download_attachment_to or
+        iter_attachment for large attachments.
 
         :param attachment: A content record for the attachment to be downloaded
 
         :return: A byte array for the attachment.
         """
-        if not isinstance(attachment, Content) or attachment.type != ContentType.ATTACHMENT:
-            raise ValueError('Parameter must be an Attachment Content object')
-
-        path = attachment.links['download']
-
-        response = self._get(path, {}, [])
+        path, _ = _attachment_download(attachment)
+
+        return self._request('GET', path, {}, kind=RequestKind.DOWNLOAD).content
+
+    def iter_attachment(self, attachment, chunk_size=STREAM_CHUNK_SIZE, checksum=None):
+        # type: (Content, int, Optional[Any]) -> Iterator[bytes]
+        """
+        Downloads an attachment in chunks, only one of which is held in
+        memory at a time. The request is sent when iteration starts and the
+        connection is released once it finishes or the iterator is closed.
+
+        :param attachment: A content record for the attachment to be
+            downloaded. If it has extensions expanded then the number of bytes
+            received is checked against its fileSize, raising
+            ConfluenceSizeMismatch if they differ.
+        :param chunk_size: The maximum number of bytes in each chunk.
+        :param checksum: Optionally a hashlib object, e.g. hashlib.sha256(),
+            which is updated with each chunk as it's received.
+
+        :return: An iterator over the chunks of the attachment.
+        """
+        path, expected_size = _attachment_download(attachment)
+        return self._iter_attachment(path, expected_size, chunk_size, checksum, self._current_options())
+
+    def _iter_attachment(self, path, expected_size, chunk_size, checksum, options):
+        # type: (str, Optional[int], int, Optional[Any], CallOptions) -> Iterator[bytes]
+        size = 0
+        with closing(self._request('GET', path, {}, kind=RequestKind.DOWNLOAD, options=options, stream=True)) as response:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                size = _count_chunk(path, chunk, size, expected_size, checksum)
+                yield chunk
+        _check_size(path, size, expected_size)
+
+    def download_attachment_to(self, attachment, destination, chunk_size=STREAM_CHUNK_SIZE, checksum=None):
+        # type: (Content, Any, int, Optional[Any]) -> int
+        """
+        Downloads an attachment to a file in chunks without holding the whole
+        attachment in memory.
+
+        :param attachment: A content record for the attachment to be
+            downloaded, see iter_attachment.
+        :param destination: Either the path of a file to create, which is
+            deleted again if the download fails, or a binary file object to
+            write to.
+        :param chunk_size: The maximum number of bytes written at a time.
+        :param checksum: Optionally a hashlib object which is updated with
+            the attachment as it's written.
+
+        :return: The number of bytes written.
+        """
+        with _open_destination(destination) as f:
+            size = 0
+            for chunk in self.iter_attachment(attachment, chunk_size=chunk_size, checksum=checksum):
+                f.write(chunk)
+                size += len(chunk)
+            return size
+
+    def download_attachment_resumable(self, attachment, path, segments=1, max_resumes=5, chunk_size=STREAM_CHUNK_SIZE,
+                                      checksum=None):
+        # type: (Content, str, int, int, int, Optional[Any]) -> int
+        """
+        Downloads an attachment to a file, surviving interruptions. The
+        attachment is written to path.part, which is renamed to path once it
+        is complete. If the connection drops part way through then the rest
+        is requested with a Range header, as is the rest of a partial file
+        left by an earlier call.
+
+        :param attachment: A content record for the attachment to be
+            downloaded. If it has extensions expanded then the final size is
+            checked against its fileSize, raising ConfluenceSizeMismatch if
+            they differ.
+        :param path: The file to create.
+        :param segments: Split attachments of at least MIN_SEGMENT_SIZE bytes
+            into this many ranges which are downloaded in parallel, each into
+            its own partial file. Needs the attachment's fileSize, and falls
+            back to a single download if the server doesn't support ranges.
+            pool_maxsize should be at least this large.
+        :param max_resumes: The number of times each range is resumed after
+            an interruption before giving up. Defaults to 5.
+        :param chunk_size: The maximum number of bytes written at a time.
+        :param checksum: Optionally a hashlib object which is updated with
+            the completed file.
+
+        :return: The size of the attachment.
+        """
+        source, expected_size = _attachment_download(attachment)
+        options = self._current_options()
+        ranges = segment_ranges(expected_size or 0, segments) if segments > 1 else []
+
+        total = None  # type: Optional[int]
+        if len(ranges) > 1:
+            def fetch(segment):  # type: (Tuple[int, int]) -> Optional[int]
+                start, end = segment
+                return self._download_range(source, partial_path(path, start), start, end, max_resumes, chunk_size,
+                                            options)
+
+            try:
+                with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+                    list(executor.map(fetch, ranges))
+                join_segments(path, ranges)
+            except RangesNotSupported:
+                logger.info('%s does not support range requests, downloading it in one piece', source)
+                remove_segments(path, ranges)
+                ranges = []
+
+        if len(ranges) <= 1:
+            total = self._download_range(source, partial_path(path, 0), 0, None, max_resumes, chunk_size, options)
+
+        return _finish_download(source, path, expected_size if expected_size is not None else total, chunk_size,
+                                checksum)
+
+    def _download_range(self, source, part, start, end, max_resumes, chunk_size, options):
+        # type: (str, str, int, Optional[int], int, int, CallOptions) -> Optional[int]
+        """
+        Download the inclusive range start to end of source into the partial
+        file part, or everything from start if end is None, continuing from
+        whatever part already holds.
+
+        :return: The total size of source if the server gave it.
+        """
+        total = None  # type: Optional[int]
+        resumes = 0
+        while True:
+            offset = start + partial_size(part)
+            if not _range_wanted(part, offset, end, total):
+                return total
+
+            with closing(self._request('GET', source, {}, kind=RequestKind.DOWNLOAD, options=options, stream=True,
+                                       headers=_range_headers(offset, end))) as response:
+                mode, total = _range_response(source, response, offset, start, end)
+                if mode is None:
+                    continue
+
+                try:
+                    with open(part, mode) as f:
+                        for chunk in response.iter_content(chunk_size=chunk_size):
+                            f.write(chunk)
+                    error = _range_shortfall(source, part, start, end, total)
+                except requests.RequestException as e:
+                    error = e
+
+            if error is None:
+                if _last_byte(end, total) is None:
+                    # Without a length a clean finish is all there is to go on.
+                    return total
+                continue
+
+            resumes += 1
+            if resumes > max_resumes:
+                raise error
+
+            delay = self._retry_policy.backoff(resumes)
+            remaining = options.remaining()
+            if remaining is not None and delay >= remaining:
+                raise ConfluenceTimeout(source, {}, options.deadline)
+
+            self._metrics.increment('download.resumes')
+            logger.warning('Download of %s interrupted at byte %d (%s), resuming in %.2fs',
+                           source, start + partial_size(part), error, delay)
+            time.sleep(delay)
+
+    def export_attachments(self, directory, space_key=None, root_page_id=None, max_workers=4, max_resumes=5):
+        # type: (str, Optional[str], Optional[int], int, int) -> ExportResult
+        """
+        Download every attachment in a space, or in a page and its
+        descendants, into directory. Pages have their attachments listed and
+        attachments are downloaded up to max_workers at a time each, every
+        attachment is streamed to <directory>/<page id>/<title>.
+
+        Each attachment downloaded is recorded in an ExportManifest in the
+        directory as soon as it's complete. Attachments which the manifest
+        shows were already exported at the same version, and whose file
+        still has the same size, are skipped so repeating an export only
+        downloads what has changed.
+
+        :param directory: The directory to export to, created if needed.
+        :param space_key: The space to export the pages and blog posts of.
+        :param root_page_id: Alternatively the page to export along with
+            every page beneath it.
+        :param max_workers: The maximum number of pages listed, and of
+            attachments downloaded, at once. pool_maxsize should be at least
+            twice this.
+        :param max_resumes: The number of times each download is resumed
+            after an interruption, see download_attachment_resumable.
+
+        :return: An ExportResult listing the attachments downloaded, skipped
+            and failed.
+        """
+        options = self._current_options()
+        pages = self._export_pages(space_key, root_page_id)
+        result = ExportResult()
+
+        with ExportManifest(directory) as manifest:
+            def download(page_id, attachment):  # type: (int, Content) -> None
+                try:
+                    with self._using_options(options):
+                        self._export_attachment(manifest, result, page_id, attachment, max_resumes)
+                except Exception as e:
+                    logger.warning('Failed to export attachment %s of page %s: %s', attachment, page_id, e)
+                    self._metrics.increment('export.failed')
+                    result.add_failed(attachment, e)
+
+            def list_attachments(page_id, attachments):  # type: (int, Iterable[Content]) -> None
+                try:
+                    for attachment in attachments:
+                        downloaders.submit(download, page_id, attachment)
+                except Exception as e:
+                    logger.warning('Failed to list the attachments of page %s: %s', page_id, e)
+                    self._metrics.increment('export.failed')
+                    result.add_failed(page_id, e)
+
+            # The listers are shut down first as they submit to the
+            # downloaders.
+            with ThreadPoolExecutor(max_workers=max_workers) as downloaders:
+                with ThreadPoolExecutor(max_workers=max_workers) as listers:
+                    for page_id in pages:
+                        listers.submit(list_attachments, page_id, self.get_attachments(page_id, expand=['version']))
+
+        logger.info('Exported attachments to %s: %s', directory, result)
+        return result
+
+    def _export_pages(self, space_key, root_page_id):  # type: (Optional[str], Optional[int]) -> Iterator[int]
+        if (space_key is None) == (root_page_id is None):
+            raise ValueError('Exactly one of space_key and root_page_id must be given')
+
+        if space_key is not None:
+            for content_type in (ContentType.PAGE, ContentType.BLOG_POST):
+                for content in self.get_space_content_with_type(space_key, content_type):
+                    yield content.id
+        else:
+            yield root_page_id  # type: ignore
+            for content in self.search('ancestor = {} and type = page'.format(root_page_id)):
+                yield content.id
+
+    def _export_attachment(self, manifest, result, page_id, attachment, max_resumes):
+        # type: (ExportManifest, ExportResult, int, Content, int) -> None
+        _, size = _attachment_download(attachment)
+        if manifest.unchanged(attachment.id, attachment.version.number, size):
+            self._metrics.increment('export.skipped')
+            result.add_skipped(attachment)
+            return
+
+        path = attachment_path(manifest.directory, page_id, attachment.title)
+        _make_dirs(os.path.dirname(path))
+        written = self.download_attachment_resumable(attachment, path, max_resumes=max_resumes)
+        manifest.record(attachment.id, page_id, attachment.title, attachment.version.number, written, path)
+        self._metrics.increment('export.downloaded')
+        result.add_downloaded(attachment, written)
 
-        Confluence._handle_response_errors(path, {}, response)
-        return response.content
+    @staticmethod
+    def _new_attachment_params(status):  # type: (Optional[ContentStatus]) -> Dict[str, str]
+        params = {}
+        if status:
+            if status in (ContentStatus.HISTORICAL, ContentStatus.TRASHED):
+                raise ValueError('Only draft or current are valid states for a new attachment')
+            params['status'] = status.value
+        return params
 
-    def add_attachment(self, content_id, file_path, file_name=None, status=None):
-        # type: (int, str, Optional[str], Optional[ContentStatus]) -> Iterable[Content]
+    def add_attachment(self, content_id, file_path, file_name=None, status=None, progress=None):
+        # type: (int, Any, Optional[str], Optional[ContentStatus], Optional[ProgressCallback]) -> Iterable[Content]
         """
-        Add a single attachment to an existing piece of content.
+        Add a single attachment to an existing piece of content. The file is
+        streamed as it's uploaded rather than read into memory first.
 
         :param content_id: the confluence content to add the attachment to.
         :param file_path: The full location of the file on the local system.
+            Alternatively the content of the file as a binary file object,
+            bytes, bytearray, memoryview or an iterable of byte chunks. The
+            request is only retried if the content can be read again, i.e.
+            it isn't an iterable or an unseekable file.
         :param file_name: Optionally the name to give the attachment in
-            confluence.
+            confluence. Required unless file_path is a path or a file object
+            with a name.
         :param status: Optionally the status of the attachment after upload.
             Must be one of current or draft, defaults to current.
+        :param progress: Optionally called as the upload progresses with the
+            number of bytes sent so far and the total, None if unknown, see
+            MultipartEncoder.
 
         :return: A list containing 0-1 attachments depending on whether this
             succeeded or not.
         """
-        params = {}
-        if status:
-            if status in (ContentStatus.HISTORICAL, ContentStatus.TRASHED):
-                raise ValueError('Only draft or current are valid states for a new attachment')
-            params['status'] = status.value
-
-        if not file_name:
-            file_name = os.path.basename(file_path)
-
-        with open(file_path, 'rb') as f:
-            return self._post_return_multiple(Content,
-                                              'content/{}/child/attachment'.format(content_id),
-                                              params=params,
-                                              files={'file': (file_name, f)},
-                                              data={})
+        params = Confluence._new_attachment_params(status)
+        body = _attachment_body(file_path, file_name, [], progress)
+
+        response = self._post_multipart('content/{}/child/attachment'.format(content_id), params, body)
+        return [Content(r) for r in self._decode(response)['results']]
+
+    def add_attachments(self, content_id, files, status=None, max_batch_bytes=MAX_BATCH_BYTES,
+                        max_batch_files=MAX_BATCH_FILES, max_workers=4, progress=None):
+        # type: (int, Iterable[Any], Optional[ContentStatus], int, int, int, Optional[ProgressCallback]) -> List[BulkResult]
+        """
+        Add many attachments to an existing piece of content. The files are
+        packed into batches, each uploaded in a single multipart request,
+        and up to max_workers batches are uploaded at once.
+
+        If a batch is rejected, e.g. because one of its files has the same
+        name as an existing attachment, its files are uploaded again one at
+        a time so that only the files at fault fail.
+
+        :param content_id: the confluence content to add the attachments to.
+        :param files: The files to attach, each either a path or a file
+            object with a name, or a (file name, content) tuple where content
+            is anything accepted by add_attachment. File names must be
+            unique. A file whose size can't be known in advance, e.g. an
+            iterable of byte chunks, is uploaded in a batch of its own.
+        :param status: Optionally the status of the attachments after
+            upload. Must be one of current or draft, defaults to current.
+        :param max_batch_bytes: The maximum total size of the files in a
+            batch, larger files are uploaded on their own.
+        :param max_batch_files: The maximum number of files in a batch.
+        :param max_workers: The maximum number of batches uploaded at once.
+            pool_maxsize should be at least this large.
+        :param progress: Optionally called as the upload progresses with the
+            number of bytes sent across all batches so far and the total,
+            None if unknown.
+
+        :return: A BulkResult for each file in the order given, holding
+            either the attachment created or the exception which stopped it
+            being uploaded.
+        """
+        files = list(files)
+        named = _attachment_files(files)
+        params = Confluence._new_attachment_params(status)
+        path = 'content/{}/child/attachment'.format(content_id)
+        batches = size_batches([content_length(content) for _, content in named], max_batch_bytes, max_batch_files)
+        results = [None] * len(files)  # type: List[Optional[BulkResult]]
+
+        # The single file bodies are only sent if a batch is rejected, but are
+        # built up front so that they start from where each file object was.
+        bodies = [MultipartEncoder([('file', named[i]) for i in batch]) for batch in batches]
+        singles = [MultipartEncoder([('file', f)]) for f in named]
+        lengths = [body.len for body in bodies]
+        total = None if None in lengths else sum(lengths)  # type: ignore
+        progress_total = ProgressTotal(progress, total) if progress is not None else None
+        options = self._current_options()
+
+        def upload(batch, body):  # type: (List[int], MultipartEncoder) -> None
+            if progress_total is not None:
+                body.progress = progress_total.callback(id(body))
+
+            try:
+                uploaded = [Content(r) for r in self._decode(self._post_multipart(path, dict(params), body))['results']]
+            except ConfluenceError as e:
+                if len(batch) > 1 and e.response is not None and e.response.status_code in (400, 413):
+                    logger.warning('Batch of %d attachments rejected on %s, uploading them one at a time',
+                                   len(batch), content_id)
+                    if body.progress is not None:
+                        body.progress(0, None)
+                    for i in batch:
+                        upload([i], singles[i])
+                    return
+                for i in batch:
+                    results[i] = BulkResult(files[i], error=e)
+                return
+            except Exception as e:
+                for i in batch:
+                    results[i] = BulkResult(files[i], error=e)
+                return
+
+            for i, attachment in zip(batch, _match_attachments([named[i][0] for i in batch], uploaded)):
+                if attachment is None:
+                    error = ValueError('{} is missing from the response'.format(named[i][0]))
+                    results[i] = BulkResult(files[i], error=error)
+                else:
+                    results[i] = BulkResult(files[i], content=attachment)
+
+        def upload_batch(batch, body):  # type: (List[int], MultipartEncoder) -> None
+            with self._using_options(options):
+                upload(batch, body)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for future in [executor.submit(upload_batch, batch, body) for batch, body in zip(batches, bodies)]:
+                future.result()
+
+        self._metrics.increment('attachments.batches', len(batches))
+        self._metrics.increment('attachments.uploaded', sum(1 for r in results if r is not None and r.ok))
+        failed = sum(1 for r in results if r is not None and not r.ok)
+        if failed:
+            self._metrics.increment('attachments.failed', failed)
+        return results  # type: ignore
+
+    def sync_attachments(self, content_id, files, max_workers=4, algorithm=HASH_ALGORITHM):
+        # type: (int, Iterable[Any], int, str) -> SyncResult
+        """
+        Make the attachments on a piece of content match a set of local
+        files, uploading only the files which are new or have changed.
+
+        The hash of each file uploaded is recorded in a content property,
+        HASH_PROPERTY, on its attachment. Files whose hash matches the one
+        recorded for the current version of the attachment with the same
+        name are skipped without being uploaded. An attachment with no
+        recorded hash, or which has been updated other than through
+        sync_attachments since, is always uploaded again. Attachments which
+        don't match any of the files are left alone.
+
+        :param content_id: the confluence content holding the attachments.
+        :param files: The files to sync, as for add_attachments, except that
+            content must be a path, bytes or a seekable file object as it's
+            read once to hash it and again to upload it.
+        :param max_workers: The maximum number of files hashed or uploaded
+            at once. pool_maxsize should be at least this large.
+        :param algorithm: The hashlib algorithm used to hash the files.
+
+        :return: A SyncResult holding the attachments added, updated and
+            skipped and the files which failed.
+        """
+        files = list(files)
+        named = _attachment_files(files)
+        expand = ['version', 'metadata.properties.{}'.format(HASH_PROPERTY)]
+        existing = {attachment.title: attachment for attachment in self.get_attachments(content_id, expand=expand)}
+        result = SyncResult()
+        options = self._current_options()
+
+        def digest(f):  # type: (Tuple[str, Any]) -> Any
+            try:
+                return file_digest(f[1], algorithm)
+            except Exception as e:
+                return e
+
+        def update(i, digest):  # type: (int, str) -> None
+            name, content = named[i]
+            with self._using_options(options):
+                try:
+                    attachment = self.update_attachment_data(content_id, existing[name].id, content, file_name=name)
+                    value = hash_record(digest, algorithm, attachment.version.number)
+                    self.modify_content_property(attachment.id, HASH_PROPERTY, lambda _: value)
+                except Exception as e:
+                    logger.warning('Failed to update attachment %s on %s: %s', name, content_id, e)
+                    result.add_failed(files[i], e)
+                    return
+            result.add_updated(attachment)
+
+        def record(i, attachment, digest):  # type: (int, Content, str) -> None
+            with self._using_options(options):
+                try:
+                    value = hash_record(digest, algorithm, attachment.version.number)
+                    self.create_content_property(attachment.id, HASH_PROPERTY, value)
+                except Exception as e:
+                    logger.warning('Failed to record the hash of attachment %s on %s: %s', named[i][0], content_id, e)
+                    result.add_failed(files[i], e)
+                    return
+            result.add_added(attachment)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            digests = list(executor.map(digest, named))
+
+            new = []  # type: List[int]
+            futures = []
+            for i, (name, _) in enumerate(named):
+                if isinstance(digests[i], Exception):
+                    result.add_failed(files[i], digests[i])
+                elif name not in existing:
+                    new.append(i)
+                elif unchanged(existing[name], digests[i], algorithm):
+                    result.add_skipped(existing[name])
+                else:
+                    futures.append(executor.submit(update, i, digests[i]))
+
+            # New files are uploaded in batches by add_attachments, on a pool
+            # of its own, while the changed files are updated on this one.
+            if new:
+                uploads = self.add_attachments(content_id, [named[i] for i in new], max_workers=max_workers)
+                for i, upload in zip(new, uploads):
+                    if upload.ok:
+                        futures.append(executor.submit(record, i, upload.content, digests[i]))
+                    else:
+                        result.add_failed(files[i], upload.error)  # type: ignore
+
+            for future in futures:
+                future.result()
+
+        self._metrics.increment('sync.skipped', len(result.skipped))
+        self._metrics.increment('sync.uploaded', len(result.added) + len(result.updated))
+        if result.failed:
+            self._metrics.increment('sync.failed', len(result.failed))
+        return result
 
     def update_attachment(self,
                           page_id,  # type: int
@@ -590,48 +1814,44 @@ class Confluence:
     def update_attachment_data(self,
                                page_id,  # type; int
                                attachment_id,  # type: int
-                               file_path,  # type: str
+                               file_path,  # type: Any
                                file_name=None,  # type: Optional[str]
                                minor_edit=False,  # type: Optional[bool]
-                               expand=None  # type: Optional[List[str]]
+                               expand=None,  # type: Optional[List[str]]
+                               progress=None,  # type: Optional[ProgressCallback]
                                ):  # type: (...) -> Content
         """
-        Updates an attachments contents to a new file.
+        Updates an attachments contents to a new file. The file is streamed
+        as it's uploaded rather than read into memory first.
 
         :param page_id: The parent page of the attachment.
         :param attachment_id: the confluence content to add the attachment to.
-        :param file_path: The full location of the file on the local system.
-        :param file_name: Optionally the name to give the attachment in confluence.
+        :param file_path: The full location of the file on the local system,
+            or its content as for add_attachment.
+        :param file_name: Optionally the name to give the attachment in
+            confluence. Required unless file_path is a path or a file object
+            with a name.
         :param minor_edit: Defaults to False. Set to true to make this update
             a minor edit.
         :param expand: An optional list of properties to be expanded on the resulting attachment object.
+        :param progress: Optionally called as the upload progresses, see
+            add_attachment.
 
         :return: A Content object containing details of the attachment.
         """
-        if not file_name:
-            file_name = os.path.basename(file_path)
-
-        files = {}  # type: Dict[str, Any]
-
-        if minor_edit:
-            files['minorEdit'] = 'true'
-
-        with open(file_path, 'rb') as f:
-            files['file'] = (file_name, f)
+        body = _attachment_body(file_path, file_name, [('minorEdit', 'true')] if minor_edit else [], progress)
 
-            return self._post_return_single(Content,
-                                            'content/{}/child/attachment/{}/data'.format(page_id, attachment_id),
-                                            params={},
-                                            data={},
-                                            files=files,
-                                            expand=expand)
+        path = 'content/{}/child/attachment/{}/data'.format(page_id, attachment_id)
+        return Content(self._decode(self._post_multipart(path, {}, body, expand=expand)))
 
-    def get_labels(self, content_id, prefix=None):  # type: (int, Optional[LabelPrefix]) -> Iterable[Label]
+    def get_labels(self, content_id, prefix=None, page_size=None):  # type: (int, Optional[LabelPrefix], Optional[int]) -> Iterable[Label]
         """
         Retrieve the set of labels on a piece of content.
 
         :param content_id: The confluence unique id for this content.
         :param prefix: Optionally specify the label prefix.
+        :param page_size: The number of results to request per page,
+            overriding the client default. The server may use a lower limit.
 
         :return: A list of the labels on that document.
         """
@@ -640,7 +1860,7 @@ class Confluence:
         if prefix:
             params['prefix'] = prefix.value
 
-        return self._get_paged_results(Label, 'content/{}/label'.format(content_id), params, None)
+        return self._get_paged_results(Label, 'content/{}/label'.format(content_id), params, None, page_size=page_size)
 
     def create_labels(self, content_id, new_labels):
         # type: (int, Iterable[Tuple[LabelPrefix, str]]) -> Iterable[Label]
@@ -659,7 +1879,7 @@ class Confluence:
         } for label in new_labels]
 
         return self._post_return_multiple(Label, 'content/{}/label'.format(content_id),
-                                          files={}, data=data, params={})
+                                          data=data, params={})
 
     def delete_label(self, content_id, label_name):  # type: (int, str) -> None
         """
@@ -673,8 +1893,8 @@ class Confluence:
         """
         self._delete('content/{}/label'.format(content_id), params={'name': label_name})
 
-    def get_content_properties(self, content_id, expand=None):
-        # type: (int, Optional[List[str]]) -> Iterable[ContentProperty]
+    def get_content_properties(self, content_id, expand=None, page_size=None):
+        # type: (int, Optional[List[str]], Optional[int]) -> Iterable[ContentProperty]
         """
 
         :param content_id: Required to identify which piece of content we want
@@ -683,10 +1903,12 @@ class Confluence:
             returning all fields on all requests. This optional parameter allows
             the user to select which fields that they want to expand as a comma
             separated list.
+        :param page_size: The number of results to request per page,
+            overriding the client default. The server may use a lower limit.
 
         :return: The full list of properties defined on that piece of content.
         """
-        return self._get_paged_results(ContentProperty, 'content/{}/property'.format(content_id), {}, expand)
+        return self._get_paged_results(ContentProperty, 'content/{}/property'.format(content_id), {}, expand, page_size=page_size)
 
     def create_content_property(self, content_id, property_key, property_value):
         # type: (int, str, Dict[str, Any]) -> ContentProperty
@@ -760,6 +1982,42 @@ class Confluence:
         return self._put_return_single(ContentProperty, 'content/{}/property/{}'.format(content_id, property_key),
                                        {}, data)
 
+    def modify_content_property(self, content_id, property_key, transform, max_attempts=5):
+        # type: (int, str, Callable[[Optional[Any]], Optional[Any]], int) -> Optional[ContentProperty]
+        """
+        Update the value of a property on a piece of content based on its
+        current value, creating it if it doesn't exist. If someone else
+        updates the property in the meantime then the latest value is
+        fetched and transform applied to it again.
+
+        :param content_id: Required to identify the piece of content.
+        :param property_key: The property to update.
+        :param transform: Called with the current value, None if the property
+            doesn't exist yet, and returns the new value or None to leave it
+            unchanged. May be called several times.
+        :param max_attempts: The number of times to try the update before
+            raising ConfluenceVersionConflict. Defaults to 5.
+
+        :return: The new ContentProperty object, or the current one (None if
+            it doesn't exist) if transform left it unchanged.
+        """
+        path = 'content/{}/property/{}'.format(content_id, property_key)
+
+        def fetch():  # type: () -> Optional[ContentProperty]
+            try:
+                return ContentProperty(self._get_json(path, {}, ['version']))
+            except ConfluenceResourceNotFound:
+                return None
+
+        def update(current):  # type: (Optional[ContentProperty]) -> Optional[ContentProperty]
+            new_value = transform(current.value if current else None)
+            if new_value is None:
+                return current
+            new_version = current.version.number + 1 if current else 1
+            return self.update_content_property(content_id, property_key, new_value, new_version)
+
+        return self._compare_and_swap(fetch, update, max_attempts)
+
     def delete_content_property(self, content_id, property_key):
         # type: (int, str) -> None
         """
@@ -770,8 +2028,8 @@ class Confluence:
         """
         self._delete('content/{}/property/{}'.format(content_id, property_key), {})
 
-    def search(self, cql, cql_context=None, expand=None):
-        # type: (str, Optional[str], Optional[List[str]]) -> Iterable[Content]
+    def search(self, cql, cql_context=None, expand=None, page_size=None):
+        # type: (str, Optional[str], Optional[List[str]], Optional[int]) -> Iterable[Content]
         """
         Perform a CQL search on the confluence instance and return an iterable
         of the pages which match the query.
@@ -784,6 +2042,8 @@ class Confluence:
             returning all fields on all requests. This optional parameter allows
             the user to select which fields that they want to expand as a comma
             separated list.
+        :param page_size: The number of results to request per page,
+            overriding the client default. The server may use a lower limit.
 
         :return: An iterable of pages which match the parameters.
         """
@@ -791,10 +2051,17 @@ class Confluence:
         if cql_context:
             params['cqlcontext'] = cql_context
 
-        return self._get_paged_results(Content, 'content/search', params, expand)
+        return self._get_paged_results(Content, 'content/search', params, expand, page_size=page_size)
 
-    def get_spaces(self, space_keys=None, space_type=None, status=None, label=None, favourite=None, expand=None):
-        # type: (Optional[List[str]], Optional[SpaceType], Optional[SpaceStatus], Optional[str], Optional[bool], Optional[List[str]]) -> Iterable[Space]
+    def get_spaces(self,
+                   space_keys=None,  # type: Optional[List[str]]
+                   space_type=None,  # type: Optional[SpaceType]
+                   status=None,  # type: Optional[SpaceStatus]
+                   label=None,  # type: Optional[str]
+                   favourite=None,  # type: Optional[bool]
+                   expand=None,  # type: Optional[List[str]]
+                   page_size=None,  # type: Optional[int]
+                   ):  # type: (...) -> Iterable[Space]
         """
         Queries the list of spaces, providing several ways to further filter
         that query.
@@ -810,6 +2077,8 @@ class Confluence:
             user running the query. Ignored by default.
         :param expand: Optional list of things to expand. Some of icon,
             description, metadata & homepage.
+        :param page_size: The number of results to request per page,
+            overriding the client default. The server may use a lower limit.
         :return:
         """
         params = {}
@@ -826,7 +2095,7 @@ class Confluence:
             # queries re: favourite seem to make any difference
             params['favourite'] = str(favourite)
 
-        return self._get_paged_results(Space, 'space', params, expand)
+        return self._get_paged_results(Space, 'space', params, expand, page_size=page_size)
 
     def create_space(self, space_key, space_name, space_description=None, is_private=False):
         # type: (str, str, Optional[str], bool) -> Space
@@ -906,14 +2175,16 @@ class Confluence:
         """
         self._delete('space/{}'.format(space_key), params={})
 
-    def get_space_content(self, space_key, just_root=False, expand=None):
-        # type: (str, bool, Optional[List[str]]) -> Iterable[Content]
+    def get_space_content(self, space_key, just_root=False, expand=None, page_size=None):
+        # type: (str, bool, Optional[List[str]], Optional[int]) -> Iterable[Content]
         """
         Get all of the content underneath a particular space.
 
         :param space_key: The unique identifier for the space.
         :param just_root: Set to true if you only want the top level pages.
         :param expand: A list of page properties which can be expanded.
+        :param page_size: The number of results to request per page,
+            overriding the client default. The server may use a lower limit.
 
         :return: A generator containing all pages matching the search criteria.
         """
@@ -922,10 +2193,10 @@ class Confluence:
         if just_root:
             params['depth'] = 'root'
 
-        return self._get_paged_results(Content, 'space/{}/content'.format(space_key), params, expand)
+        return self._get_paged_results(Content, 'space/{}/content'.format(space_key), params, expand, page_size=page_size)
 
-    def get_space_content_with_type(self, space_key, content_type, just_root=False, expand=None):
-        # type: (str, ContentType, bool, Optional[List[str]]) -> Iterable[Content]
+    def get_space_content_with_type(self, space_key, content_type, just_root=False, expand=None, page_size=None):
+        # type: (str, ContentType, bool, Optional[List[str]], Optional[int]) -> Iterable[Content]
         """
         Get all of the content underneath a particular space of a given type
 
@@ -933,6 +2204,8 @@ class Confluence:
         :param content_type: What sort of content to return. Blogs or pages.
         :param just_root: Set to true if you only want the top level pages.
         :param expand: A list of page properties which can be expanded.
+        :param page_size: The number of results to request per page,
+            overriding the client default. The server may use a lower limit.
 
         :return: A generator containing all pages matching the search criteria.
         """
@@ -942,20 +2215,22 @@ class Confluence:
         if just_root:
             params['depth'] = 'root'
 
-        return self._get_paged_results(Content, path, params, expand)
+        return self._get_paged_results(Content, path, params, expand, page_size=page_size)
 
-    def get_space_properties(self, space_key, expand=None):
-        # type: (str, Optional[List[str]]) -> Iterable[SpaceProperty]
+    def get_space_properties(self, space_key, expand=None, page_size=None):
+        # type: (str, Optional[List[str]], Optional[int]) -> Iterable[SpaceProperty]
         """
         Get all of the properties attached to a given space.
 
         :param space_key: The key of the space.
         :param expand: A list of properties which can be expanded.
+        :param page_size: The number of results to request per page,
+            overriding the client default. The server may use a lower limit.
 
         :return: A generator containing all of the properties attached to the
             space.
         """
-        return self._get_paged_results(SpaceProperty, 'space/{}/property'.format(space_key), {}, expand)
+        return self._get_paged_results(SpaceProperty, 'space/{}/property'.format(space_key), {}, expand, page_size=page_size)
 
     def create_space_property(self, space_key, property_key, property_value):
         # type: (str, str, Dict[str, Any]) -> SpaceProperty
@@ -985,12 +2260,13 @@ class Confluence:
         :param property_key: The key of the property.
         :param expand: A list of properties which can be expanded.
 
-        :return: A generator containing all of the properties attached to the
-            space.
+        :return: A list containing the property, property keys are unique
+            within a space.
         """
         path = 'space/{}/property/{}'.format(space_key, property_key)
 
-        return self._get_paged_results(SpaceProperty, path, {}, expand)
+        # The resource is the property itself rather than a page of results.
+        return [self._get_single_result(SpaceProperty, path, {}, expand)]
 
     def update_space_property(self, space_key, property_key, property_value, new_version,
                               minor_edit=False, hidden_version=False):
@@ -1023,6 +2299,42 @@ class Confluence:
         }
         return self._put_return_single(SpaceProperty, path, params={}, data=data)
 
+    def modify_space_property(self, space_key, property_key, transform, max_attempts=5):
+        # type: (str, str, Callable[[Optional[Any]], Optional[Any]], int) -> Optional[SpaceProperty]
+        """
+        Update the value of a space property based on its current value,
+        creating it if it doesn't exist. If someone else updates the property
+        in the meantime then the latest value is fetched and transform
+        applied to it again.
+
+        :param space_key: The space the property belongs to.
+        :param property_key: The property to update.
+        :param transform: Called with the current value, None if the property
+            doesn't exist yet, and returns the new value or None to leave it
+            unchanged. May be called several times.
+        :param max_attempts: The number of times to try the update before
+            raising ConfluenceVersionConflict. Defaults to 5.
+
+        :return: The new SpaceProperty object, or the current one (None if it
+            doesn't exist) if transform left it unchanged.
+        """
+        path = 'space/{}/property/{}'.format(space_key, property_key)
+
+        def fetch():  # type: () -> Optional[SpaceProperty]
+            try:
+                return SpaceProperty(self._get_json(path, {}, ['version']))
+            except ConfluenceResourceNotFound:
+                return None
+
+        def update(current):  # type: (Optional[SpaceProperty]) -> Optional[SpaceProperty]
+            new_value = transform(current.value if current else None)
+            if new_value is None:
+                return current
+            new_version = current.version.number + 1 if current else 1
+            return self.update_space_property(space_key, property_key, new_value, new_version)
+
+        return self._compare_and_swap(fetch, update, max_attempts)
+
     def delete_space_property(self, space_key, property_key):
         # type: (str, str) -> None
         """
@@ -1074,8 +2386,8 @@ class Confluence:
         """
         return self._get_single_result(User, 'user/current', {}, None)
 
-    def get_user_groups(self, username=None, user_key=None, expand=None):
-        # type: (Optional[str], Optional[str], Optional[List[str]]) -> Iterable[Group]
+    def get_user_groups(self, username=None, user_key=None, expand=None, page_size=None):
+        # type: (Optional[str], Optional[str], Optional[List[str]], Optional[int]) -> Iterable[Group]
         """
         Get a list of the groups that a user is a member of. Either the
         username or key must be set and not both.
@@ -1084,6 +2396,8 @@ class Confluence:
         :param user_key: The users unique key in confluence.
         :param expand: An optional list of fields to expand on the returned
             group objects. None currently known.
+        :param page_size: The number of results to request per page,
+            overriding the client default. The server may use a lower limit.
 
         :return: The list of groups as an iterator.
         """
@@ -1097,19 +2411,21 @@ class Confluence:
         if user_key:
             params['key'] = user_key
 
-        return self._get_paged_results(Group, 'user/memberof', params, expand)
+        return self._get_paged_results(Group, 'user/memberof', params, expand, page_size=page_size)
 
-    def get_groups(self, expand):
-        # type: (Optional[List[str]]) -> Iterable[Group]
+    def get_groups(self, expand, page_size=None):
+        # type: (Optional[List[str]], Optional[int]) -> Iterable[Group]
         """
         Get the entire collection of groups on this instance.
 
         :param expand: An optional list of fields to expand on the returned
             group objects. None currently known.
+        :param page_size: The number of results to request per page,
+            overriding the client default. The server may use a lower limit.
 
         :return: The list of groups as an iterator.
         """
-        return self._get_paged_results(Group, 'group', {}, expand)
+        return self._get_paged_results(Group, 'group', {}, expand, page_size=page_size)
 
     def get_group(self, name, expand):
         # type: (str, Optional[List[str]]) -> Group
@@ -1124,31 +2440,35 @@ class Confluence:
         """
         return self._get_single_result(Group, 'group/{}'.format(name), {}, expand)
 
-    def get_group_members(self, name, expand):
-        # type: (str, Optional[List[str]]) -> Iterable[User]
+    def get_group_members(self, name, expand, page_size=None):
+        # type: (str, Optional[List[str]], Optional[int]) -> Iterable[User]
         """
         Get the entire collection of users in this group.
 
         :param name: The name of the group to search for.
         :param expand: An optional list of fields to expand on the returned
             user objects. None currently known.
+        :param page_size: The number of results to request per page,
+            overriding the client default. The server may use a lower limit.
 
         :return: The list of groups as an iterator.
         """
-        return self._get_paged_results(User, 'group/{}/member'.format(name), {}, expand)
+        return self._get_paged_results(User, 'group/{}/member'.format(name), {}, expand, page_size=page_size)
 
-    def get_long_tasks(self, expand):
-        # type: (Optional[List[str]]) -> Iterable[LongTask]
+    def get_long_tasks(self, expand, page_size=None):
+        # type: (Optional[List[str]], Optional[int]) -> Iterable[LongTask]
         """
         Get the full list of long running tasks from the confluence instance.
 
         :param expand: An optional list of fields to expand on the returned
             user objects. None currently known.
+        :param page_size: The number of results to request per page,
+            overriding the client default. The server may use a lower limit.
 
         :return: The list of long running tasks including recently completed
             ones.
         """
-        return self._get_paged_results(LongTask, 'longtask', {}, expand)
+        return self._get_paged_results(LongTask, 'longtask', {}, expand, page_size=page_size)
 
     def get_long_task(self, task_id, expand):
         # type: (str, Optional[List[str]]) -> Iterable[LongTask]
@@ -1163,8 +2483,8 @@ class Confluence:
         """
         return self._get_paged_results(LongTask, 'longtask/{}'.format(task_id), {}, expand)
 
-    def get_audit_records(self, start_date, end_date, search_string):
-        # type: (Optional[date], Optional[date], Optional[str]) -> Iterable[AuditRecord]
+    def get_audit_records(self, start_date, end_date, search_string, page_size=None):
+        # type: (Optional[date], Optional[date], Optional[str], Optional[int]) -> Iterable[AuditRecord]
         """
         Retrieve audit records between two dates with the given search parameters.
 
@@ -1172,6 +2492,8 @@ class Confluence:
         :param end_date: Optional date to end searching.
         :param search_string: Optional string which will be included in all
             returned audit records.
+        :param page_size: The number of results to request per page,
+            overriding the client default. The server may use a lower limit.
 
         :return: A list of all audit records matching the given criteria.
         """
@@ -1185,7 +2507,21 @@ class Confluence:
         if search_string:
             params['searchString'] = search_string
 
-        return self._get_paged_results(AuditRecord, 'audit', params, None)
+        return self._get_paged_results(AuditRecord, 'audit', params, None, page_size=page_size)
+
+    @staticmethod
+    def _watch_params(user_key, username):  # type: (Optional[str], Optional[str]) -> Dict[str, str]
+        if username and user_key:
+            raise ValueError('Only one of username or user_key may be set')
+
+        params = {}
+
+        if username:
+            params['username'] = username
+        if user_key:
+            params['key'] = user_key
+
+        return params
 
     def add_content_watch(self, content_id, user_key=None, username=None):
         # type: (int, Optional[str], Optional[str]) -> None
@@ -1203,15 +2539,7 @@ class Confluence:
         :param username: The username to check for watches. If this is set
             then user_key must not be.
         """
-        if username and user_key:
-            raise ValueError('Only one of username or user_key may be set')
-
-        params = {}
-
-        if username:
-            params['username'] = username
-        if user_key:
-            params['key'] = user_key
+        params = Confluence._watch_params(user_key, username)
 
         self._post('user/watch/content/{}'.format(content_id), params=params, data={})
 
@@ -1231,15 +2559,7 @@ class Confluence:
         :param username: The username to check for watches. If this is set
             then user_key must not be.
         """
-        if username and user_key:
-            raise ValueError('Only one of username or user_key may be set')
-
-        params = {}
-
-        if username:
-            params['username'] = username
-        if user_key:
-            params['key'] = user_key
+        params = Confluence._watch_params(user_key, username)
 
         self._delete('user/watch/content/{}'.format(content_id), params)
 
@@ -1262,17 +2582,9 @@ class Confluence:
         :return: True/False depending on whether the user is watching the
             specified content.
         """
-        if username and user_key:
-            raise ValueError('Only one of username or user_key may be set')
-
-        params = {}
-
-        if username:
-            params['username'] = username
-        if user_key:
-            params['key'] = user_key
+        params = Confluence._watch_params(user_key, username)
 
-        return self._get('user/watch/content/{}'.format(content_id), params, None).json()['watching']
+        return self._get_json('user/watch/content/{}'.format(content_id), params, None)['watching']
 
     def add_space_watch(self, space_key, user_key=None, username=None):
         # type: (str, Optional[str], Optional[str]) -> None
@@ -1290,15 +2602,7 @@ class Confluence:
         :param username: The username to check for watches. If this is set
             then user_key must not be.
         """
-        if username and user_key:
-            raise ValueError('Only one of username or user_key may be set')
-
-        params = {}
-
-        if username:
-            params['username'] = username
-        if user_key:
-            params['key'] = user_key
+        params = Confluence._watch_params(user_key, username)
 
         self._post('user/watch/space/{}'.format(space_key), params, data={})
 
@@ -1318,15 +2622,7 @@ class Confluence:
         :param username: The username to check for watches. If this is set
             then user_key must not be.
         """
-        if username and user_key:
-            raise ValueError('Only one of username or user_key may be set')
-
-        params = {}
-
-        if username:
-            params['username'] = username
-        if user_key:
-            params['key'] = user_key
+        params = Confluence._watch_params(user_key, username)
 
         self._delete('user/watch/space/{}'.format(space_key), params)
 
@@ -1349,17 +2645,230 @@ class Confluence:
         :return: True/False depending on whether the user is watching the
             specified space.
         """
-        if username and user_key:
-            raise ValueError('Only one of username or user_key may be set')
+        params = Confluence._watch_params(user_key, username)
 
-        params = {}
-
-        if username:
-            params['username'] = username
-        if user_key:
-            params['key'] = user_key
-
-        return self._get('user/watch/space/{}'.format(space_key), params, None).json()['watching']
+        return self._get_json('user/watch/space/{}'.format(space_key), params, None)['watching']
 
     def __str__(self):
         return self._base_url
+
+
+def _attachment_download(attachment):  # type: (Content) -> Tuple[str, Optional[int]]
+    """The download path of an attachment and its size in bytes, if known."""
+    if not isinstance(attachment, Content) or attachment.type != ContentType.ATTACHMENT:
+        raise ValueError('Parameter must be an Attachment Content object')
+
+    size = getattr(attachment, 'extensions', {}).get('fileSize')
+    return attachment.links['download'], int(size) if size is not None else None
+
+
+def _count_chunk(path, chunk, size, expected_size, checksum):
+    # type: (str, bytes, int, Optional[int], Optional[Any]) -> int
+    """
+    Add a downloaded chunk to the running size and checksum, failing as soon
+    as more bytes than expected have been received.
+    """
+    size += len(chunk)
+    if expected_size is not None and size > expected_size:
+        raise ConfluenceSizeMismatch(path, {}, expected_size, size)
+    if checksum is not None:
+        checksum.update(chunk)
+    return size
+
+
+def _check_size(path, size, expected_size):  # type: (str, int, Optional[int]) -> None
+    if expected_size is not None and size != expected_size:
+        raise ConfluenceSizeMismatch(path, {}, expected_size, size)
+
+
+def _range_headers(offset, end):  # type: (int, Optional[int]) -> Dict[str, str]
+    # Ranges apply to the encoded body so ask for it unencoded.
+    headers = {'Accept-Encoding': 'identity'}
+    if offset > 0 or end is not None:
+        headers['Range'] = 'bytes={}-{}'.format(offset, '' if end is None else end)
+    return headers
+
+
+def _last_byte(end, total):  # type: (Optional[int], Optional[int]) -> Optional[int]
+    if end is not None:
+        return end
+    return total - 1 if total is not None else None
+
+
+def _range_wanted(part, offset, end, total):  # type: (str, int, Optional[int], Optional[int]) -> bool
+    """
+    :return: False if the partial file already holds the whole range. A
+        partial file holding more than the range is deleted.
+    """
+    last = _last_byte(end, total)
+    if last is None or offset <= last:
+        return True
+    if offset == last + 1:
+        return False
+
+    logger.warning('%s is larger than expected, downloading it again', part)
+    os.remove(part)
+    return True
+
+
+def _range_response(source, response, offset, start, end):
+    # type: (str, requests.Response, int, int, Optional[int]) -> Tuple[Optional[str], Optional[int]]
+    """
+    Check the response to a range request for the bytes from offset.
+
+    :return: The mode to open the partial file with, None if there's
+        nothing to write, and the total size of source if given.
+    """
+    content_range = parse_content_range(response.headers.get('Content-Range'))
+    if response.status_code == 416:
+        # The partial file already reaches the end of source.
+        total = content_range[2] if content_range else None
+        if total is None or offset < total:
+            raise ConfluenceError(source, {}, response)
+        return None, total
+
+    if response.status_code == 206:
+        if content_range is None or content_range[0] != offset:
+            raise ConfluenceError(source, {}, response, 'Unexpected Content-Range {} from path {}'.format(
+                response.headers.get('Content-Range'), source))
+        return 'ab', content_range[2]
+
+    if start > 0 or end is not None:
+        raise RangesNotSupported(source)
+
+    # The server ignored the range and is sending the whole of source.
+    length = response.headers.get('Content-Length')
+    return 'wb', int(length) if length is not None else None
+
+
+def _range_shortfall(source, part, start, end, total):
+    # type: (str, str, int, Optional[int], Optional[int]) -> Optional[ConfluenceSizeMismatch]
+    """
+    :return: An error if a response ended cleanly before the end of the
+        range, None if the range is complete or its end is unknown.
+    """
+    last = _last_byte(end, total)
+    received = start + partial_size(part)
+    if last is None or received > last:
+        return None
+    return ConfluenceSizeMismatch(source, {}, last + 1 - start, received - start)
+
+
+def _finish_download(source, path, expected_size, chunk_size, checksum):
+    # type: (str, str, Optional[int], int, Optional[Any]) -> int
+    """
+    Check the size of the completed partial file for path, update checksum
+    from it and rename it to path.
+
+    :return: The size of the file.
+    """
+    part = partial_path(path, 0)
+    size = partial_size(part)
+    try:
+        _check_size(source, size, expected_size)
+    except ConfluenceSizeMismatch:
+        os.remove(part)
+        raise
+
+    if checksum is not None:
+        with open(part, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                checksum.update(chunk)
+
+    if os.path.exists(path):
+        os.remove(path)
+    os.rename(part, path)
+    return size
+
+
+def _can_resend(body):  # type: (Any) -> bool
+    return not isinstance(body, MultipartEncoder) or body.rewindable
+
+
+def _attachment_name(content, file_name):  # type: (Any, Optional[str]) -> str
+    if file_name:
+        return file_name
+
+    name = path_of(content) or getattr(content, 'name', None)
+    if not isinstance(name, (str, type(u''))):
+        raise ValueError('file_name must be given unless uploading a path or a named file')
+    return os.path.basename(name)
+
+
+def _attachment_body(content, file_name, fields, progress):
+    # type: (Any, Optional[str], List[Tuple[str, Any]], Optional[ProgressCallback]) -> MultipartEncoder
+    return MultipartEncoder(fields + [('file', (_attachment_name(content, file_name), content))], progress=progress)
+
+
+def _attachment_files(files):  # type: (Iterable[Any]) -> List[Tuple[str, Any]]
+    """
+    :return: A (file name, content) pair for each file given to
+        add_attachments, checking that no two have the same name.
+    """
+    named = []  # type: List[Tuple[str, Any]]
+    seen = set()
+    for f in files:
+        name = _attachment_name(f[1], f[0]) if isinstance(f, tuple) else _attachment_name(f, None)
+        if name in seen:
+            raise ValueError('More than one file is named {}'.format(name))
+        seen.add(name)
+        named.append((name, f[1] if isinstance(f, tuple) else f))
+    return named
+
+
+def _match_attachments(names, uploaded):  # type: (List[str], List[Content]) -> List[Optional[Content]]
+    """
+    :return: The attachment created for each file name in a batch, matched
+        by title, or None for any file missing from the response.
+    """
+    by_title = {attachment.title: attachment for attachment in uploaded}
+    return [by_title.get(name) for name in names]
+
+
+def _make_dirs(directory):  # type: (str) -> None
+    # Several threads may create the same directory at once.
+    try:
+        os.makedirs(directory)
+    except OSError:
+        if not os.path.isdir(directory):
+            raise
+
+
+@contextmanager
+def _open_destination(destination):  # type: (Any) -> Iterator[Any]
+    """
+    Yield destination if it's a file object, otherwise open it as a path,
+    deleting the file again if the with block raises.
+    """
+    if hasattr(destination, 'write'):
+        yield destination
+        return
+
+    try:
+        with open(destination, 'wb') as f:
+            yield f
+    except BaseException:
+        if os.path.exists(destination):
+            os.remove(destination)
+        raise
+
+
+def _id_batches(ids, max_ids, max_length):  # type: (Iterable[Any], int, int) -> Iterator[List[str]]
+    """
+    Split content ids into batches for "id in (...)" CQL queries, limiting
+    both the number of ids in each and the length of the URL encoded list.
+    """
+    batch = []  # type: List[str]
+    length = 0
+    for content_id in ids:
+        content_id = str(content_id)
+        # Each id is followed by an encoded comma (%2C).
+        cost = len(content_id) + 3
+        if batch and (len(batch) >= max_ids or length + cost > max_length):
+            yield batch
+            batch = []
+            length = 0
+        batch.append(content_id)
+        length += cost
+    if batch:
+        yield batch
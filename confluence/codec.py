@@ -0,0 +1,92 @@
+import json
+import logging
+from typing import Any, Union
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+class JsonCodec:
+    """
+    Encodes request bodies and decodes response bodies.
+
+    This implementation uses the standard library json module, subclasses use
+    faster third party libraries when they are installed.
+    """
+
+    name = 'json'
+
+    def loads(self, data):  # type: (Union[bytes, str]) -> Any
+        """
+        :param data: A JSON document as UTF-8 bytes or text.
+
+        :return: The decoded document.
+        """
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        return json.loads(data)
+
+    def dumps(self, obj):  # type: (Any) -> bytes
+        """
+        :param obj: Any JSON serializable object.
+
+        :return: The encoded document as UTF-8 bytes.
+        """
+        return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+    def __str__(self):
+        return self.name
+
+
+class OrjsonCodec(JsonCodec):
+    """Codec backed by orjson, c.f. https://github.com/ijl/orjson."""
+
+    name = 'orjson'
+
+    def __init__(self):  # type: () -> None
+        import orjson
+        self._orjson = orjson
+
+    def loads(self, data):  # type: (Union[bytes, str]) -> Any
+        return self._orjson.loads(data)
+
+    def dumps(self, obj):  # type: (Any) -> bytes
+        try:
+            return self._orjson.dumps(obj, option=self._orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # orjson is stricter than the standard library, e.g. about
+            # integers over 64 bits, so the result mustn't depend on which
+            # codec is installed.
+            return super(OrjsonCodec, self).dumps(obj)
+
+
+class UjsonCodec(JsonCodec):
+    """Codec backed by ujson, c.f. https://github.com/ultrajson/ultrajson."""
+
+    name = 'ujson'
+
+    def __init__(self):  # type: () -> None
+        import ujson
+        self._ujson = ujson
+
+    def loads(self, data):  # type: (Union[bytes, str]) -> Any
+        return self._ujson.loads(data)
+
+    def dumps(self, obj):  # type: (Any) -> bytes
+        return self._ujson.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+def default_codec():  # type: () -> JsonCodec
+    """
+    The fastest codec available in this environment. orjson is preferred
+    over ujson, falling back to the standard library if neither is
+    installed.
+
+    :return: A codec instance.
+    """
+    for codec_type in (OrjsonCodec, UjsonCodec):
+        try:
+            return codec_type()
+        except ImportError:
+            pass
+    return JsonCodec()
@@ -0,0 +1,132 @@
+import logging
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# Expansions which can't change without the version of the content changing,
+# anything else (e.g. children or labels) bypasses the store. Rendered bodies
+# such as body.view change with macros, includes and permissions so only the
+# stored formats are included.
+_IMMUTABLE_EXPANSIONS = frozenset(['body.storage', 'body.atlas_doc_format', 'version'])
+
+
+class ContentStore:
+    """
+    A persistent cache of content bodies in a SQLite database, keyed by the
+    content id, its version number and the expansions requested.
+
+    A version of a piece of content never changes so entries never need to
+    be invalidated, only evicted. When the total size of the stored content
+    exceeds max_bytes the least recently used entries are deleted.
+
+    The store can be shared between threads and, through the database file,
+    between processes run one after another.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):  # type: (str, int) -> None
+        """
+        :param path: The SQLite database file, created if it doesn't exist.
+        :param max_bytes: The maximum total size of the stored content.
+            Defaults to 256MB.
+        """
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS content ('
+                         'id TEXT NOT NULL, version INTEGER NOT NULL, expand TEXT NOT NULL, '
+                         'data BLOB NOT NULL, size INTEGER NOT NULL, last_used INTEGER NOT NULL, '
+                         'PRIMARY KEY (id, version, expand))')
+        self._db.execute('CREATE INDEX IF NOT EXISTS content_last_used ON content (last_used)')
+        self._db.commit()
+        self._size, self._tick = self._db.execute('SELECT COALESCE(SUM(size), 0), COALESCE(MAX(last_used), 0) '
+                                                  'FROM content').fetchone()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def storable(expand):  # type: (Optional[Iterable[str]]) -> bool
+        """
+        :return: True if content fetched with these expansions can be stored,
+            i.e. they include something other than the version and are all
+            fixed for a given version.
+        """
+        expand = [e for e in (expand or []) if e != 'version']
+        return bool(expand) and all(e in _IMMUTABLE_EXPANSIONS for e in expand)
+
+    @staticmethod
+    def expand_key(expand):  # type: (Iterable[str]) -> str
+        return ','.join(sorted(set(expand) | {'version'}))
+
+    def get_many(self, versions, expand):  # type: (Dict[str, int], str) -> Dict[str, bytes]
+        """
+        :param versions: The current version number of each content id.
+        :param expand: The key returned by expand_key.
+
+        :return: The stored data for each of the ids which is held at the
+            given version.
+        """
+        found = {}  # type: Dict[str, bytes]
+        with self._lock:
+            for content_id, version in versions.items():
+                row = self._db.execute('SELECT data FROM content WHERE id = ? AND version = ? AND expand = ?',
+                                       (str(content_id), version, expand)).fetchone()
+                if row:
+                    found[str(content_id)] = bytes(row[0])
+            if found:
+                # Recency is recorded as an increasing counter rather than a
+                # time so that it survives restarts and never ties.
+                self._tick += 1
+                self._db.executemany('UPDATE content SET last_used = ? WHERE id = ? AND version = ? AND expand = ?',
+                                     [(self._tick, i, versions[i], expand) for i in found])
+                self._db.commit()
+            self.hits += len(found)
+            self.misses += len(versions) - len(found)
+        return found
+
+    def put_many(self, items, expand):  # type: (List[tuple], str) -> None
+        """
+        :param items: (content id, version, data) tuples to store.
+        :param expand: The key returned by expand_key.
+        """
+        if not items:
+            return
+
+        with self._lock:
+            self._tick += 1
+            for content_id, version, data in items:
+                row = self._db.execute('SELECT size FROM content WHERE id = ? AND version = ? AND expand = ?',
+                                       (str(content_id), version, expand)).fetchone()
+                self._size -= row[0] if row else 0
+                self._db.execute('INSERT OR REPLACE INTO content VALUES (?, ?, ?, ?, ?, ?)',
+                                 (str(content_id), version, expand, sqlite3.Binary(data), len(data), self._tick))
+                self._size += len(data)
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):  # type: () -> None
+        while self._size > self.max_bytes:
+            rows = self._db.execute('SELECT id, version, expand, size FROM content ORDER BY last_used LIMIT 100').fetchall()
+            if not rows:
+                self._size = 0
+                return
+            for content_id, version, expand, size in rows:
+                self._db.execute('DELETE FROM content WHERE id = ? AND version = ? AND expand = ?',
+                                 (content_id, version, expand))
+                self._size -= size
+                if self._size <= self.max_bytes:
+                    return
+
+    def close(self):  # type: () -> None
+        with self._lock:
+            self._db.close()
+
+    def stats(self):  # type: () -> Dict[str, int]
+        """
+        :return: A snapshot of the hit and miss counters and the total size
+            of the stored content.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'bytes': self._size}
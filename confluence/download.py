@@ -0,0 +1,83 @@
+import logging
+import os
+import re
+import shutil
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+PARTIAL_SUFFIX = '.part'
+
+# Attachments smaller than this are never split into parallel segments.
+MIN_SEGMENT_SIZE = 8 * 1024 * 1024
+
+_CONTENT_RANGE = re.compile(r'bytes\s+(?:(\d+)-(\d+)|\*)/(\d+|\*)')
+
+
+class RangesNotSupported(Exception):
+    """Raised when the server ignores a Range header on a segment which doesn't start at 0."""
+
+
+def partial_path(path, start):  # type: (str, int) -> str
+    """
+    :return: The file holding the bytes downloaded so far of the segment
+        starting at start. The first segment is downloaded straight into
+        path.part so that it can be resumed without segments.
+    """
+    if start == 0:
+        return path + PARTIAL_SUFFIX
+    return '{}{}.{}'.format(path, PARTIAL_SUFFIX, start)
+
+
+def partial_size(path):  # type: (str) -> int
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def segment_ranges(size, segments, min_segment_size=MIN_SEGMENT_SIZE):
+    # type: (int, int, int) -> List[Tuple[int, int]]
+    """
+    Split size bytes into at most segments inclusive (start, end) ranges,
+    none smaller than min_segment_size unless the whole file is.
+    """
+    if size <= 0:
+        return []
+
+    segments = max(1, min(segments, size // max(1, min_segment_size)))
+    step = -(-size // segments)
+    return [(start, min(start + step, size) - 1) for start in range(0, size, step)]
+
+
+def parse_content_range(header):  # type: (Optional[str]) -> Optional[Tuple[Optional[int], Optional[int], Optional[int]]]
+    """
+    :return: The (start, end, total) of a Content-Range header, each None if
+        not given, or None if the header is missing or can't be parsed.
+    """
+    match = _CONTENT_RANGE.match(header or '')
+    if not match:
+        return None
+
+    start, end, total = match.groups()
+    return (int(start) if start else None,
+            int(end) if end else None,
+            int(total) if total != '*' else None)
+
+
+def join_segments(path, ranges):  # type: (str, List[Tuple[int, int]]) -> None
+    """
+    Append the partial file of every segment after the first to path.part,
+    deleting each once it has been copied.
+    """
+    with open(partial_path(path, 0), 'ab') as f:
+        for start, _ in ranges[1:]:
+            segment = partial_path(path, start)
+            with open(segment, 'rb') as s:
+                shutil.copyfileobj(s, f)
+            os.remove(segment)
+
+
+def remove_segments(path, ranges):  # type: (str, List[Tuple[int, int]]) -> None
+    for start, _ in ranges[1:]:
+        segment = partial_path(path, start)
+        if os.path.exists(segment):
+            os.remove(segment)
@@ -11,7 +11,7 @@ class ConfluenceError(Exception):
     """Corresponds to 400 errors on the REST API."""
 
     def __init__(self, path, params, response, msg=None):
-        # type: (str, Dict[str, str], requests.Response, Optional[str]) -> None
+        # type: (str, Dict[str, str], Optional[requests.Response], Optional[str]) -> None
         if not msg:
             msg = 'General resource error accessing path {}'.format(path)
         self.path = path
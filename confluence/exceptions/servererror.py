@@ -0,0 +1,17 @@
+import logging
+import requests
+from typing import Dict
+
+from confluence.exceptions.generalerror import ConfluenceError
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+class ConfluenceServerError(ConfluenceError):
+    """Corresponds to 5xx errors on the REST API."""
+
+    def __init__(self, path, params, response):
+        # type: (str, Dict[str, str], requests.Response) -> None
+        msg = 'The server failed with status {} processing the request to path {}'.format(response.status_code, path)
+        super(ConfluenceServerError, self).__init__(path, params, response, msg)
@@ -0,0 +1,18 @@
+import logging
+from typing import Dict
+
+from confluence.exceptions.generalerror import ConfluenceError
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+class ConfluenceSizeMismatch(ConfluenceError):
+    """Raised when a download doesn't match the size Confluence recorded for it."""
+
+    def __init__(self, path, params, expected, actual):
+        # type: (str, Dict[str, str], int, int) -> None
+        msg = 'Expected {} bytes from path {} but received {}'.format(expected, path, actual)
+        self.expected = expected
+        self.actual = actual
+        super(ConfluenceSizeMismatch, self).__init__(path, params, None, msg)
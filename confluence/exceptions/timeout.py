@@ -0,0 +1,16 @@
+import logging
+from typing import Dict
+
+from confluence.exceptions.generalerror import ConfluenceError
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+class ConfluenceTimeout(ConfluenceError):
+    """Raised when a call doesn't complete within its deadline."""
+
+    def __init__(self, path, params, deadline):
+        # type: (str, Dict[str, str], float) -> None
+        msg = 'The deadline of {}s was exceeded while requesting path {}'.format(deadline, path)
+        super(ConfluenceTimeout, self).__init__(path, params, None, msg)
@@ -0,0 +1,17 @@
+import logging
+import requests
+from typing import Dict
+
+from confluence.exceptions.generalerror import ConfluenceError
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+class ConfluenceTooManyRequests(ConfluenceError):
+    """Corresponds to 429 errors on the REST API."""
+
+    def __init__(self, path, params, response):
+        # type: (str, Dict[str, str], requests.Response) -> None
+        msg = 'The server is rate limiting requests, the request to path {} was rejected'.format(path)
+        super(ConfluenceTooManyRequests, self).__init__(path, params, response, msg)
@@ -0,0 +1,153 @@
+import json
+import logging
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+MANIFEST_NAME = 'manifest.jsonl'
+
+_UNSAFE_CHARACTERS = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+
+def safe_filename(title):  # type: (str) -> str
+    """
+    :return: The attachment title with characters which aren't allowed in
+        file names, or would escape the directory, replaced.
+    """
+    name = _UNSAFE_CHARACTERS.sub('_', title).strip()
+    if name in ('', '.', '..'):
+        name = '_' + name
+    return name
+
+
+def attachment_path(directory, page_id, title):  # type: (str, int, str) -> str
+    """
+    :return: Where an attachment is exported to, attachments are grouped in
+        a directory per page as titles are only unique within a page.
+    """
+    return os.path.join(directory, str(page_id), safe_filename(title))
+
+
+class ExportManifest:
+    """
+    Records each exported attachment as a line of JSON in a file in the
+    export directory. Lines are appended and flushed as each attachment is
+    written so that the manifest is accurate even if the export is
+    interrupted, and is read back so that the next export can skip
+    attachments which haven't changed.
+
+    Each line holds the attachment's id, page_id, title, version, size and
+    path relative to the export directory. Later lines for an id supersede
+    earlier ones.
+    """
+
+    def __init__(self, directory, name=MANIFEST_NAME):  # type: (str, str) -> None
+        """
+        :param directory: The export directory, created if it doesn't exist.
+        :param name: The name of the manifest file within directory.
+        """
+        self.directory = directory
+        self.path = os.path.join(directory, name)
+        self._lock = threading.Lock()
+        self._entries = {}  # type: Dict[int, Dict[str, Any]]
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut short by an interrupted export.
+                        logger.warning('Ignoring malformed manifest line in %s', self.path)
+                        continue
+                    self._entries[entry['id']] = entry
+
+        self._file = open(self.path, 'a')
+
+    def get(self, attachment_id):  # type: (int) -> Optional[Dict[str, Any]]
+        with self._lock:
+            return self._entries.get(attachment_id)
+
+    def unchanged(self, attachment_id, version, size):  # type: (int, int, Optional[int]) -> bool
+        """
+        :return: True if the attachment was exported at this version and the
+            exported file still has the expected size.
+        """
+        entry = self.get(attachment_id)
+        if entry is None or entry['version'] != version:
+            return False
+
+        path = os.path.join(self.directory, entry['path'])
+        expected = size if size is not None else entry['size']
+        return os.path.exists(path) and os.path.getsize(path) == expected
+
+    def record(self, attachment_id, page_id, title, version, size, path):
+        # type: (int, int, str, int, int, str) -> None
+        entry = {
+            'id': attachment_id,
+            'page_id': page_id,
+            'title': title,
+            'version': version,
+            'size': size,
+            'path': os.path.relpath(path, self.directory),
+        }
+        with self._lock:
+            self._entries[attachment_id] = entry
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+
+    def entries(self):  # type: () -> List[Dict[str, Any]]
+        with self._lock:
+            return list(self._entries.values())
+
+    def close(self):  # type: () -> None
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):  # type: () -> ExportManifest
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ExportResult:
+    """
+    The outcome of an attachment export. A failure to list or download one
+    attachment doesn't stop the others being exported.
+    """
+
+    def __init__(self):  # type: () -> None
+        self._lock = threading.Lock()
+        self.downloaded = []  # type: List[Any]
+        self.skipped = []  # type: List[Any]
+        self.failed = []  # type: List[Tuple[Any, BaseException]]
+        self.bytes = 0
+
+    def add_downloaded(self, attachment, size):  # type: (Any, int) -> None
+        with self._lock:
+            self.downloaded.append(attachment)
+            self.bytes += size
+
+    def add_skipped(self, attachment):  # type: (Any) -> None
+        with self._lock:
+            self.skipped.append(attachment)
+
+    def add_failed(self, item, error):  # type: (Any, BaseException) -> None
+        """
+        :param item: The attachment which couldn't be downloaded, or the page
+            whose attachments couldn't be listed.
+        """
+        with self._lock:
+            self.failed.append((item, error))
+
+    def __str__(self):
+        return '{} downloaded ({} bytes), {} skipped, {} failed'.format(
+            len(self.downloaded), self.bytes, len(self.skipped), len(self.failed))
@@ -0,0 +1,43 @@
+import logging
+import threading
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+class Metrics:
+    """
+    Thread safe named counters recording what a client has done, e.g.
+    cas.conflicts counts the version conflicts met by modify_content and
+    the other compare and swap updates.
+
+    The same instance can be shared between clients to aggregate them.
+    """
+
+    def __init__(self):  # type: () -> None
+        self._lock = threading.Lock()
+        self._counters = {}  # type: Dict[str, int]
+
+    def increment(self, name, value=1):  # type: (str, int) -> None
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def get(self, name):  # type: (str) -> int
+        """
+        :return: The current value of the counter, 0 if it has never been
+            incremented.
+        """
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self):  # type: () -> Dict[str, int]
+        """
+        :return: A copy of every counter.
+        """
+        with self._lock:
+            return dict(self._counters)
+
+    def reset(self):  # type: () -> None
+        with self._lock:
+            self._counters.clear()
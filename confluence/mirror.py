@@ -0,0 +1,231 @@
+import json
+import logging
+import math
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from confluence.models.content import Content
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# Fetched with each piece of content by default, the version is always
+# fetched as it's how changes are detected.
+MIRROR_EXPAND = ['version', 'ancestors', 'body.storage']
+
+# Added to the time since the last mirror when searching for changes, to
+# allow for CQL's minute precision and for content still being saved when
+# the last mirror started.
+OVERLAP_MINUTES = 5
+
+# The page size used to list the ids in a space when detecting deletions,
+# nothing is expanded so each page is small however many results it holds.
+LISTING_PAGE_SIZE = 1000
+
+
+def modified_since(checkpoint, now, overlap_minutes=OVERLAP_MINUTES):  # type: (float, float, int) -> str
+    """
+    :param checkpoint: The time, in seconds since the epoch, at which the
+        last mirror started.
+    :param now: The current time, from the same clock.
+
+    :return: A CQL clause matching content modified since the checkpoint.
+        The time is given relative to the server's clock, with now(), as
+        absolute CQL dates are read in the user's time zone.
+    """
+    minutes = int(math.ceil(max(now - checkpoint, 0) / 60.0)) + overlap_minutes
+    return 'lastmodified >= now("-{}m")'.format(minutes)
+
+
+class MirrorStore:
+    """
+    A local copy of the pages and blog posts in one or more spaces, held in
+    a SQLite database and kept up to date by mirror_space, along with a
+    checkpoint per space recording when it was last mirrored.
+
+    Unlike ContentStore nothing is ever evicted, the store always holds
+    every piece of content in each space mirrored. The store can be shared
+    between threads and, through the database file, between processes run
+    one after another.
+    """
+
+    def __init__(self, path):  # type: (str) -> None
+        """
+        :param path: The SQLite database file, created if it doesn't exist.
+        """
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS mirror_content ('
+                         'id INTEGER PRIMARY KEY, space TEXT NOT NULL, version INTEGER NOT NULL, data TEXT NOT NULL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS mirror_content_space ON mirror_content (space)')
+        self._db.execute('CREATE TABLE IF NOT EXISTS mirror_checkpoint (space TEXT PRIMARY KEY, time REAL NOT NULL)')
+        self._db.commit()
+
+    def checkpoint(self, space_key):  # type: (str) -> Optional[float]
+        """
+        :return: The time at which the last complete mirror of the space
+            started, None if it has never been mirrored.
+        """
+        with self._lock:
+            row = self._db.execute('SELECT time FROM mirror_checkpoint WHERE space = ?', (space_key,)).fetchone()
+        return row[0] if row else None
+
+    def versions(self, space_key):  # type: (str) -> Dict[int, int]
+        """
+        :return: The version number of each piece of content held for the
+            space, keyed by id.
+        """
+        with self._lock:
+            rows = self._db.execute('SELECT id, version FROM mirror_content WHERE space = ?', (space_key,)).fetchall()
+        return {content_id: version for content_id, version in rows}
+
+    def get(self, content_id):  # type: (int) -> Optional[Content]
+        with self._lock:
+            row = self._db.execute('SELECT data FROM mirror_content WHERE id = ?', (int(content_id),)).fetchone()
+        return Content(json.loads(row[0])) if row else None
+
+    def contents(self, space_key):  # type: (str) -> Iterator[Content]
+        with self._lock:
+            rows = self._db.execute('SELECT data FROM mirror_content WHERE space = ? ORDER BY id', (space_key,)).fetchall()
+        for row in rows:
+            yield Content(json.loads(row[0]))
+
+    def apply(self, space_key, changed, deleted, checkpoint=None):
+        # type: (str, Iterable[Dict[str, Any]], Iterable[int], Optional[float]) -> None
+        """
+        Record part or all of the result of mirroring a space in a single
+        transaction.
+
+        :param changed: The JSON of each new or changed piece of content,
+            including its version.
+        :param deleted: The ids of the content which no longer exists.
+        :param checkpoint: The time at which the mirror started, only given
+            with the last part so that the checkpoint moves forward once
+            all of the content it covers has been stored. None leaves the
+            checkpoint as it is.
+        """
+        with self._lock:
+            with self._db:
+                self._db.executemany('INSERT OR REPLACE INTO mirror_content VALUES (?, ?, ?, ?)',
+                                     [(int(c['id']), space_key, c['version']['number'], json.dumps(c)) for c in changed])
+                self._db.executemany('DELETE FROM mirror_content WHERE id = ?', [(int(i),) for i in deleted])
+                if checkpoint is not None:
+                    self._db.execute('INSERT OR REPLACE INTO mirror_checkpoint VALUES (?, ?)', (space_key, checkpoint))
+
+    def close(self):  # type: () -> None
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):  # type: () -> MirrorStore
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class MirrorResult:
+    """The outcome of mirroring a space."""
+
+    def __init__(self, space_key, full, updated, deleted):  # type: (str, bool, List[int], List[int]) -> None
+        """
+        :param full: True if this was the first mirror of the space, so
+            every piece of content was fetched.
+        :param updated: The ids of the content which was new or changed.
+        :param deleted: The ids of the content removed from the store.
+        """
+        self.space_key = space_key
+        self.full = full
+        self.updated = updated
+        self.deleted = deleted
+
+    def __str__(self):
+        return '{} {}: {} updated, {} deleted'.format(
+            'Full mirror of' if self.full else 'Mirrored changes to', self.space_key, len(self.updated), len(self.deleted))
+
+
+class MirrorRun:
+    """
+    The bookkeeping for one mirror of a space, shared by both clients which
+    do the requests.
+
+    A full mirror, made when the space has never been mirrored, passes
+    every piece of content to add. Otherwise the content listed as modified
+    since the checkpoint is passed to plan, and the stale ids it returns are
+    fetched and passed to add. Content is written to the store in batches of
+    LISTING_PAGE_SIZE as it's added and finish moves the checkpoint forward.
+    """
+
+    def __init__(self, store, space_key, expand=None, overlap_minutes=OVERLAP_MINUTES):
+        # type: (MirrorStore, str, Optional[List[str]], int) -> None
+        """
+        :param expand: The fields to expand on each piece of content,
+            defaults to MIRROR_EXPAND. The version is always included.
+        """
+        self.started = time.time()
+        self.expand = list(expand or MIRROR_EXPAND)
+        if 'version' not in self.expand:
+            self.expand.append('version')
+        self.space_key = space_key
+        self._store = store
+        self._checkpoint = store.checkpoint(space_key)
+        self._held = store.versions(space_key)
+        self._overlap_minutes = overlap_minutes
+        self._stale = []  # type: List[int]
+        self._deleted = []  # type: List[int]
+        self._batch = []  # type: List[Dict[str, Any]]
+        self._updated = []  # type: List[int]
+
+    @property
+    def full(self):  # type: () -> bool
+        return self._checkpoint is None
+
+    @property
+    def scope(self):  # type: () -> str
+        """CQL matching every page and blog post in the space."""
+        return 'space = "{}" and type in (page, blogpost)'.format(self.space_key)
+
+    @property
+    def changes(self):  # type: () -> str
+        """CQL matching the content modified since the checkpoint."""
+        return '{} and {}'.format(self.scope, modified_since(self._checkpoint, self.started, self._overlap_minutes))
+
+    def plan(self, listed, current=None):  # type: (Dict[int, int], Optional[Iterable[int]]) -> List[int]
+        """
+        :param listed: The version of each piece of content matching
+            changes, keyed by id.
+        :param current: The ids of all of the content in the space, if they
+            were listed to detect deletions.
+
+        :return: The ids of the content which needs to be fetched.
+        """
+        self._stale = [i for i, version in listed.items() if self._held.get(i) != version]
+        if current is not None:
+            current = set(current)
+            self._stale += [i for i in current if i not in self._held and i not in listed]
+            self._deleted = [i for i in self._held if i not in current]
+        return self._stale
+
+    def add(self, content):  # type: (Dict[str, Any]) -> None
+        """Record the JSON of a new or changed piece of content."""
+        self._batch.append(content)
+        if len(self._batch) >= LISTING_PAGE_SIZE:
+            self._flush()
+
+    def _flush(self):  # type: () -> None
+        self._store.apply(self.space_key, self._batch, [])
+        self._updated += [int(c['id']) for c in self._batch]
+        self._batch = []
+
+    def finish(self):  # type: () -> MirrorResult
+        """Remove deleted content and move the checkpoint forward."""
+        self._flush()
+        updated = set(self._updated)
+        if self.full:
+            self._deleted = [i for i in self._held if i not in updated]
+        else:
+            # Content which disappeared between the search and the fetch.
+            self._deleted += [i for i in self._stale if i not in updated and i in self._held and i not in self._deleted]
+        self._store.apply(self.space_key, [], self._deleted, self.started)
+        return MirrorResult(self.space_key, self.full, self._updated, self._deleted)
@@ -0,0 +1,264 @@
+import logging
+import mimetypes
+import os
+import threading
+import uuid
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Called with the number of bytes of the body sent so far and its total
+# size, None if that isn't known.
+ProgressCallback = Callable[[int, Optional[int]], None]
+
+
+class _BytesSource:
+    def __init__(self, data):  # type: (Union[bytes, bytearray, memoryview]) -> None
+        self._data = memoryview(data)
+        self.size = self._data.nbytes  # type: Optional[int]
+        self.rewindable = True
+
+    def chunks(self, chunk_size):  # type: (int) -> Iterator[bytes]
+        for start in range(0, self.size, chunk_size):  # type: ignore
+            yield self._data[start:start + chunk_size].tobytes()
+
+
+class _PathSource:
+    def __init__(self, path):  # type: (str) -> None
+        self._path = path
+        self.size = os.path.getsize(path)  # type: Optional[int]
+        self.rewindable = True
+
+    def chunks(self, chunk_size):  # type: (int) -> Iterator[bytes]
+        with open(self._path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                yield chunk
+
+
+class _FileSource:
+    def __init__(self, f):  # type: (Any) -> None
+        self._file = f
+        self._start = None  # type: Optional[int]
+        self.size = None  # type: Optional[int]
+        seekable = getattr(f, 'seekable', None)
+        self.rewindable = seekable() if seekable is not None else hasattr(f, 'seek')
+        if self.rewindable:
+            self._start = f.tell()
+            f.seek(0, os.SEEK_END)
+            self.size = f.tell() - self._start
+            f.seek(self._start)
+
+    def chunks(self, chunk_size):  # type: (int) -> Iterator[bytes]
+        if self._start is not None:
+            self._file.seek(self._start)
+        for chunk in iter(lambda: self._file.read(chunk_size), b''):
+            yield chunk
+
+
+class _IterableSource:
+    def __init__(self, iterable, size=None):  # type: (Iterable[bytes], Optional[int]) -> None
+        self._iterable = iterable
+        self.size = size
+        self.rewindable = False
+
+    def chunks(self, chunk_size):  # type: (int) -> Iterator[bytes]
+        for chunk in self._iterable:
+            yield bytes(chunk)
+
+
+# Each source produces the content of one file part in chunks, its size is
+# None if it isn't known in advance and it can only be read more than once
+# if rewindable.
+_Source = Union[_BytesSource, _PathSource, _FileSource, _IterableSource]
+
+
+def path_of(source):  # type: (Any) -> Optional[str]
+    """
+    :return: The path named by source if it's a string or path like object,
+        e.g. a pathlib.Path, otherwise None.
+    """
+    if isinstance(source, (str, type(u''))):
+        return source
+    if hasattr(source, '__fspath__'):
+        return source.__fspath__()
+    return None
+
+
+def _source(source):  # type: (Any) -> _Source
+    if isinstance(source, (bytearray, memoryview)) or (isinstance(source, bytes) and not isinstance(source, str)):
+        return _BytesSource(source)
+    path = path_of(source)
+    if path is not None:
+        return _PathSource(path)
+    if hasattr(source, 'read'):
+        return _FileSource(source)
+    return _IterableSource(source)
+
+
+def content_length(content):  # type: (Any) -> Optional[int]
+    """
+    :return: The number of bytes in file content given in any of the forms
+        accepted by MultipartEncoder, None if it can't be known in advance.
+    """
+    return _source(content).size
+
+
+def _quote(value):  # type: (str) -> str
+    # As browsers do, c.f. the HTML5 multipart/form-data encoding algorithm.
+    return value.replace('\\', '\\\\').replace('"', '%22').replace('\r', '%0D').replace('\n', '%0A')
+
+
+class MultipartEncoder:
+    """
+    A multipart/form-data request body which is produced in chunks as it's
+    sent, rather than built in memory first, so that files of any size can
+    be uploaded.
+
+    File content can be given as a path, a binary file object, bytes,
+    bytearray or memoryview, or an iterable of byte chunks. If the size of
+    every file is known, the length of the body is available as len and
+    sent as its Content-Length, otherwise the body is sent chunked.
+
+    The body can be read either with read, like a file, or by iterating
+    over it. A body can be sent again, e.g. to retry a failed request, once
+    rewind has been called, as long as none of its files came from a one
+    shot iterable or unseekable file.
+    """
+
+    def __init__(self, fields, boundary=None, chunk_size=UPLOAD_CHUNK_SIZE, progress=None):
+        # type: (List[Tuple[str, Any]], Optional[str], int, Optional[ProgressCallback]) -> None
+        """
+        :param fields: (name, value) pairs in the order to send them. value
+            is either a string for a plain form field or, for a file, a
+            (filename, content) or (filename, content, content type) tuple.
+            The content type is guessed from the filename if not given.
+        :param boundary: The multipart boundary, random by default.
+        :param chunk_size: The maximum number of bytes read from a file at a
+            time.
+        :param progress: Optionally called after each chunk of the body is
+            produced with the number of bytes produced so far and the total
+            size of the body, None if it isn't known.
+        """
+        self.boundary = boundary or uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self._parts = []  # type: List[Tuple[bytes, Union[bytes, _Source]]]
+
+        for name, value in fields:
+            if isinstance(value, tuple):
+                filename, content = value[0], value[1]
+                content_type = value[2] if len(value) > 2 else mimetypes.guess_type(filename)[0]
+                header = '--{}\r\nContent-Disposition: form-data; name="{}"; filename="{}"\r\n'.format(
+                    self.boundary, _quote(name), _quote(filename))
+                # Confluence takes the attachment's media type from the part,
+                # and works it out from the file name when there isn't one.
+                if content_type:
+                    header += 'Content-Type: {}\r\n'.format(content_type)
+                header += '\r\n'
+                self._parts.append((header.encode('utf-8'), _source(content)))
+            else:
+                header = '--{}\r\nContent-Disposition: form-data; name="{}"\r\n\r\n'.format(self.boundary, _quote(name))
+                self._parts.append((header.encode('utf-8'), value.encode('utf-8') if not isinstance(value, bytes) else value))
+
+        self._footer = '--{}--\r\n'.format(self.boundary).encode('utf-8')
+        sizes = [len(c) if isinstance(c, bytes) else c.size for _, c in self._parts]
+        self.len = None  # type: Optional[int]
+        if all(size is not None for size in sizes):
+            self.len = sum(len(header) + size + 2 for (header, _), size in zip(self._parts, sizes)) + len(self._footer)  # type: ignore
+
+        self.bytes_read = 0
+        self._started = False
+        self._iterator = None  # type: Optional[Iterator[bytes]]
+        # Removing what's been read from the front of a bytearray doesn't
+        # copy the rest, unlike slicing bytes.
+        self._buffer = bytearray()
+
+    @property
+    def content_type(self):  # type: () -> str
+        return 'multipart/form-data; boundary={}'.format(self.boundary)
+
+    @property
+    def rewindable(self):  # type: () -> bool
+        """True if the body can be produced again from the start."""
+        return not self._started or all(isinstance(c, bytes) or c.rewindable for _, c in self._parts)
+
+    def rewind(self):  # type: () -> None
+        if not self.rewindable:
+            raise ValueError('The body includes a file which can only be read once')
+        self.bytes_read = 0
+        self._started = False
+        self._iterator = None
+        self._buffer = bytearray()
+
+    def _generate(self):  # type: () -> Iterator[bytes]
+        for header, content in self._parts:
+            yield header
+            if isinstance(content, bytes):
+                yield content
+            else:
+                for chunk in content.chunks(self.chunk_size):
+                    if chunk:
+                        yield chunk
+            yield b'\r\n'
+        yield self._footer
+
+    def __iter__(self):  # type: () -> Iterator[bytes]
+        if self._started:
+            self.rewind()
+        self._started = True
+        for chunk in self._generate():
+            self.bytes_read += len(chunk)
+            if self.progress is not None:
+                self.progress(self.bytes_read, self.len)
+            yield chunk
+
+    def read(self, size=-1):  # type: (int) -> bytes
+        if self._iterator is None:
+            self._iterator = iter(self)
+
+        while size < 0 or len(self._buffer) < size:
+            try:
+                self._buffer += next(self._iterator)
+            except StopIteration:
+                break
+
+        if size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+class ProgressTotal:
+    """
+    Combines the progress of several bodies sent concurrently, e.g. the
+    batches of a bulk upload, into a single progress callback.
+    """
+
+    def __init__(self, progress, total):  # type: (ProgressCallback, Optional[int]) -> None
+        """
+        :param progress: Called with the bytes sent across all the bodies.
+        :param total: The total size of all the bodies, None if unknown.
+        """
+        self._progress = progress
+        self._total = total
+        self._lock = threading.Lock()
+        self._sent = {}  # type: Dict[Hashable, int]
+        self._sum = 0
+
+    def callback(self, key):  # type: (Hashable) -> ProgressCallback
+        """
+        :return: The progress callback to give the body identified by key.
+        """
+        def report(sent, _):  # type: (int, Optional[int]) -> None
+            with self._lock:
+                # A body's progress goes back to 0 if it's rewound for a retry.
+                self._sum += sent - self._sent.get(key, 0)
+                self._sent[key] = sent
+                total_sent = self._sum
+            self._progress(total_sent, self._total)
+
+        return report
@@ -0,0 +1,177 @@
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+try:
+    import queue
+except ImportError:  # pragma: no cover
+    import Queue as queue  # type: ignore
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error):  # type: (BaseException) -> None
+        self.error = error
+
+
+def prefetch(iterable, depth):  # type: (Iterable[Any], int) -> Iterator[Any]
+    """
+    Iterate over an iterable on a background thread, keeping up to depth
+    items ready ahead of the consumer.
+
+    Used to download the next pages of a paged resource while the caller is
+    still processing the current one. Exceptions raised by the iterable are
+    re-raised to the consumer in order and the background thread stops if the
+    consumer stops iterating early.
+
+    :param iterable: The iterable to consume, only ever advanced from the
+        background thread.
+    :param depth: The maximum number of items fetched but not yet consumed.
+
+    :return: An iterator yielding the same items as iterable.
+    """
+    if depth < 1:
+        raise ValueError('depth must be at least 1')
+
+    return _prefetch(iterable, depth)
+
+
+def _prefetch(iterable, depth):  # type: (Iterable[Any], int) -> Iterator[Any]
+    items = queue.Queue(maxsize=depth)  # type: queue.Queue
+    stopped = threading.Event()
+
+    def put(item):  # type: (Any) -> bool
+        while not stopped.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():  # type: () -> None
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_Failure(e))
+            return
+        put(_DONE)
+
+    worker = threading.Thread(target=produce, name='confluence-prefetch')
+    worker.daemon = True
+    worker.start()
+
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stopped.set()
+
+
+def offset_pages(fetch_page, start, limit, workers, ordered=True, total_size=None):
+    # type: (Callable[[int, int], Dict[str, Any]], int, int, int, bool, Optional[int]) -> Iterator[Dict[str, Any]]
+    """
+    Fetch the pages of a paged resource concurrently by their offsets.
+
+    Pages are requested at start, start + limit, start + 2 * limit and so on
+    with at most workers requests in flight. The end of the resource is
+    found from total_size when the server provides it, otherwise from the
+    first page which is short or has no next link. Pages speculatively
+    requested beyond the end are discarded, along with any errors fetching
+    them.
+
+    :param fetch_page: Called with (start, limit) to retrieve a single page.
+    :param start: The offset of the first page to fetch.
+    :param limit: The number of results on each page.
+    :param workers: The maximum number of pages fetched at once.
+    :param ordered: Yield pages in offset order if True, otherwise yield each
+        page as soon as it arrives.
+    :param total_size: The total number of results if known.
+
+    :return: An iterator over the decoded pages.
+    """
+    if workers < 1:
+        raise ValueError('workers must be at least 1')
+    if limit < 1:
+        raise ValueError('limit must be at least 1')
+
+    return _offset_pages(fetch_page, start, limit, workers, ordered, total_size)
+
+
+def _is_last_page(page, limit):  # type: (Dict[str, Any], int) -> bool
+    return 'next' not in page.get('_links', {}) or len(page['results']) < limit
+
+
+def _offset_pages(fetch_page, start, limit, workers, ordered, total_size):
+    # type: (Callable[[int, int], Dict[str, Any]], int, int, int, bool, Optional[int]) -> Iterator[Dict[str, Any]]
+    executor = ThreadPoolExecutor(max_workers=workers)
+    pending = {}  # type: Dict[Future, int]
+    # Errors from pages which may turn out to be past the end, by offset.
+    failed = {}  # type: Dict[int, BaseException]
+    state = {'next_offset': start, 'end': total_size}
+
+    def submit_up_to_capacity():  # type: () -> None
+        while len(pending) < workers and (state['end'] is None or state['next_offset'] < state['end']):
+            offset = state['next_offset']
+            pending[executor.submit(fetch_page, offset, limit)] = offset
+            state['next_offset'] += limit
+
+    def complete(future):  # type: (Future) -> Optional[Dict[str, Any]]
+        offset = pending.pop(future)
+        if state['end'] is not None and offset >= state['end']:
+            # Past the end, whatever happened to the request doesn't matter.
+            return None
+        error = future.exception()
+        if error is not None:
+            if ordered:
+                # Every page before this one has been yielded without
+                # reaching the end, so it's a real page.
+                raise error
+            failed[offset] = error
+            return None
+        page = future.result()
+        if _is_last_page(page, limit):
+            end = offset + len(page['results'])
+            state['end'] = end if state['end'] is None else min(state['end'], end)
+        return page
+
+    def raise_failure():  # type: () -> None
+        if state['end'] is not None:
+            for offset in [o for o in failed if o >= state['end']]:
+                del failed[offset]
+        # A failed page is only known to be real once the end is known to be
+        # after it, or nothing still in flight could show otherwise.
+        real = [o for o in failed if state['end'] is not None or not pending]
+        if real:
+            raise failed[min(real)]
+
+    try:
+        submit_up_to_capacity()
+        while pending:
+            if ordered:
+                future = min(pending, key=lambda f: pending[f])
+            else:
+                future = next(iter(wait(list(pending), return_when=FIRST_COMPLETED)[0]))
+
+            page = complete(future)
+            raise_failure()
+            if page is not None:
+                yield page
+            if not failed:
+                submit_up_to_capacity()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
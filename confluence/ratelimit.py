@@ -0,0 +1,142 @@
+import logging
+import threading
+import time
+from enum import Enum
+from typing import Optional
+
+from confluence.retry import clock
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+class RequestKind(Enum):
+    """The classes of request which can be rate limited separately."""
+
+    READ = 'read'
+    WRITE = 'write'
+    DOWNLOAD = 'download'
+
+
+class TokenBucket:
+    """
+    A thread safe token bucket.
+
+    Tokens are added at a fixed rate up to the capacity of the bucket and
+    each request takes one. A single bucket can be shared between any number
+    of threads and client instances to put a combined limit on them.
+    """
+
+    def __init__(self, rate, capacity=None):  # type: (float, Optional[float]) -> None
+        """
+        :param rate: The sustained number of requests per second allowed.
+        :param capacity: The number of requests which can be made in a burst
+            after a quiet period. Defaults to max(1, rate).
+        """
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens=1.0):  # type: (float) -> float
+        """
+        Take tokens from the bucket without blocking.
+
+        :param tokens: The number of tokens to take. Defaults to 1.
+
+        :return: The number of seconds the caller must wait before making its
+            request, used by callers which can't block the thread.
+        """
+        with self._lock:
+            now = clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= tokens
+
+            # Callers which find the bucket empty take their tokens in advance
+            # and wait out the debt, this keeps waiters in arrival order.
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self, tokens=1.0):  # type: (float) -> float
+        """
+        Take tokens from the bucket, blocking until they are available.
+
+        :param tokens: The number of tokens to take. Defaults to 1.
+
+        :return: The number of seconds spent waiting.
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class RateLimiter:
+    """
+    Limits requests made through a client with separate buckets for reads,
+    writes and attachment downloads.
+
+    Pass the same instance to several Confluence objects to share the limit
+    between them.
+    """
+
+    def __init__(self, reads=None, writes=None, downloads=None):
+        # type: (Optional[TokenBucket], Optional[TokenBucket], Optional[TokenBucket]) -> None
+        """
+        :param reads: Bucket for GET requests, None for no limit.
+        :param writes: Bucket for POST, PUT and DELETE requests, None for no
+            limit.
+        :param downloads: Bucket for attachment downloads. If None then
+            downloads count against the reads bucket instead.
+        """
+        self._buckets = {
+            RequestKind.READ: reads,
+            RequestKind.WRITE: writes,
+            RequestKind.DOWNLOAD: downloads if downloads is not None else reads,
+        }
+
+    @staticmethod
+    def per_second(reads=None, writes=None, downloads=None):
+        # type: (Optional[float], Optional[float], Optional[float]) -> RateLimiter
+        """
+        Convenience constructor taking requests per second for each kind.
+
+        :param reads: Maximum GET requests per second, None for no limit.
+        :param writes: Maximum POST/PUT/DELETE requests per second, None for
+            no limit.
+        :param downloads: Maximum attachment downloads per second, None to
+            count them as reads.
+
+        :return: A new rate limiter.
+        """
+        return RateLimiter(reads=TokenBucket(reads) if reads else None,
+                           writes=TokenBucket(writes) if writes else None,
+                           downloads=TokenBucket(downloads) if downloads else None)
+
+    def reserve(self, kind):  # type: (RequestKind) -> float
+        """
+        Account for a request of the given kind without blocking.
+
+        :param kind: The kind of request about to be made.
+
+        :return: The number of seconds to wait before sending it.
+        """
+        bucket = self._buckets[kind]
+        wait = bucket.reserve() if bucket is not None else 0.0
+        if wait:
+            logger.debug('Rate limited %s request for %.3fs', kind.value, wait)
+        return wait
+
+    def acquire(self, kind):  # type: (RequestKind) -> None
+        """
+        Block until a request of the given kind may be sent.
+
+        :param kind: The kind of request about to be made.
+        """
+        wait = self.reserve(kind)
+        if wait > 0:
+            time.sleep(wait)
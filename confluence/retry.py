@@ -0,0 +1,151 @@
+import logging
+import random
+import time
+from email.utils import mktime_tz, parsedate_tz
+from typing import Optional, Sequence
+
+import requests
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+clock = getattr(time, 'monotonic', time.time)
+
+
+class RetryPolicy:
+    """
+    Describes when and how long to wait before retrying a failed request.
+
+    429 and 503 responses mean that the server didn't process the request so
+    they are retried for every method. Other server errors and connection
+    failures are only retried for idempotent methods, a POST which may have
+    been applied is never sent twice.
+    """
+
+    def __init__(self,
+                 max_attempts=4,  # type: int
+                 backoff_factor=0.5,  # type: float
+                 max_backoff=30.0,  # type: float
+                 deadline=120.0,  # type: Optional[float]
+                 retry_statuses=(429, 500, 502, 503, 504),  # type: Sequence[int]
+                 idempotent_methods=('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'),  # type: Sequence[str]
+                 ):  # type: (...) -> None
+        """
+        :param max_attempts: The total number of attempts made for a single
+            request including the first one. Set to 1 to disable retries.
+        :param backoff_factor: The base delay in seconds, the nth retry waits
+            for a random time up to backoff_factor * 2^(n-1) seconds.
+        :param max_backoff: The longest time to wait between two attempts
+            unless the server asks for longer using Retry-After.
+        :param deadline: The total number of seconds that a single call may
+            spend retrying. No retry is made if the wait would take the call
+            past this point. None means no limit.
+        :param retry_statuses: The HTTP status codes which can be retried.
+        :param idempotent_methods: The HTTP methods which are safe to repeat
+            after a server error or a dropped connection.
+        """
+        if max_attempts < 1:
+            raise ValueError('max_attempts must be at least 1')
+
+        self.max_attempts = max_attempts
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        self.retry_statuses = frozenset(retry_statuses)
+        self.idempotent_methods = frozenset(m.upper() for m in idempotent_methods)
+
+    def _is_retryable_status(self, method, status_code):
+        # type: (str, int) -> bool
+        if status_code not in self.retry_statuses:
+            return False
+        return status_code in (429, 503) or method.upper() in self.idempotent_methods
+
+    def _is_retryable_error(self, method, error):
+        # type: (str, requests.RequestException) -> bool
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            # The request never reached the server.
+            return True
+        if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+            return method.upper() in self.idempotent_methods
+        return False
+
+    def backoff(self, attempt):  # type: (int) -> float
+        """
+        The jittered delay to wait before the next attempt.
+
+        :param attempt: The number of attempts made so far (1 based).
+
+        :return: A number of seconds between 0 and the capped exponential
+            backoff for this attempt.
+        """
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * (2 ** (attempt - 1))))
+
+    @staticmethod
+    def retry_after(response):  # type: (requests.Response) -> Optional[float]
+        """
+        Parse the Retry-After header on a response, if any.
+
+        :param response: The failed response.
+
+        :return: The number of seconds the server asked us to wait or None if
+            it didn't say.
+        """
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            parsed = parsedate_tz(value)
+            if parsed is None:
+                return None
+            return max(0.0, mktime_tz(parsed) - time.time())
+
+    def _delay(self, attempt, elapsed, requested=None):
+        # type: (int, float, Optional[float]) -> Optional[float]
+        if attempt >= self.max_attempts:
+            return None
+
+        delay = requested if requested is not None else self.backoff(attempt)
+
+        if self.deadline is not None and elapsed + delay > self.deadline:
+            return None
+
+        return delay
+
+    def delay_after_response(self, method, response, attempt, elapsed):
+        # type: (str, requests.Response, int, float) -> Optional[float]
+        """
+        Decide whether a response should be retried.
+
+        :param method: The HTTP method of the request.
+        :param response: The response which was received.
+        :param attempt: The number of attempts made so far (1 based).
+        :param elapsed: Seconds spent on this call so far.
+
+        :return: The number of seconds to wait before retrying or None if the
+            response should be returned to the caller as is.
+        """
+        if not self._is_retryable_status(method, response.status_code):
+            return None
+
+        return self._delay(attempt, elapsed, RetryPolicy.retry_after(response))
+
+    def delay_after_error(self, method, error, attempt, elapsed):
+        # type: (str, requests.RequestException, int, float) -> Optional[float]
+        """
+        Decide whether a request which failed to complete should be retried.
+
+        :param method: The HTTP method of the request.
+        :param error: The exception raised by requests.
+        :param attempt: The number of attempts made so far (1 based).
+        :param elapsed: Seconds spent on this call so far.
+
+        :return: The number of seconds to wait before retrying or None if the
+            exception should be raised to the caller.
+        """
+        if not self._is_retryable_error(method, error):
+            return None
+
+        return self._delay(attempt, elapsed)
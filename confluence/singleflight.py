@@ -0,0 +1,80 @@
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+class _Call:
+    def __init__(self):  # type: () -> None
+        self.done = threading.Event()
+        self.result = None  # type: Any
+        self.error = None  # type: Optional[BaseException]
+        self.shared = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key so that only one of them
+    does the work, e.g. sends a request, and the rest wait for and share its
+    result.
+
+    Calls are only coalesced while one is in flight, nothing is cached once
+    it completes. If the call raises then every caller waiting on it raises
+    the same exception.
+    """
+
+    def __init__(self):  # type: () -> None
+        self._lock = threading.Lock()
+        self._calls = {}  # type: Dict[Hashable, _Call]
+        self.coalesced = 0
+
+    def do(self, key, fn, timeout=None, shares_error=None):
+        # type: (Hashable, Callable[[], Any], Optional[float], Optional[Callable[[BaseException], bool]]) -> Any
+        """
+        :param key: Identifies calls which can share a result.
+        :param fn: Called if there's no call with the same key in flight.
+        :param timeout: The longest to wait, in seconds, for a call in
+            flight. None to wait for as long as it takes.
+        :param shares_error: Called with the error raised by the call in
+            flight, returns False if this caller shouldn't share it. All
+            errors are shared by default.
+
+        If the timeout runs out, or the error isn't shared, this caller calls
+        fn itself instead, so e.g. its own deadline applies.
+
+        :return: The result of fn, or of the in flight call with the same key.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.shared += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                leader = True
+
+        if not leader:
+            if not call.done.wait(timeout):
+                logger.debug('Gave up waiting for %s after %ss', key, timeout)
+                return fn()
+            if call.error is not None:
+                if shares_error is not None and not shares_error(call.error):
+                    return fn()
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+            if call.shared:
+                logger.debug('%d calls shared the result of %s', call.shared, key)
@@ -0,0 +1,185 @@
+import codecs
+import json
+import logging
+import re
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+_WHITESPACE = re.compile(r'\S')
+_STRUCTURE = re.compile(r'[{}\[\]"]')
+_STRING_BODY = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.DOTALL)
+_SCALAR_END = re.compile(r'[,}\]\s]')
+
+
+class StreamedPage:
+    """
+    Incrementally decodes a single page of results from a stream of bytes.
+
+    Iterating over the page yields each item of the top level "results"
+    array as soon as it has been received, so only one item needs to be held
+    in memory at a time rather than the whole page. Once iteration has
+    finished the remaining fields of the page (e.g. _links) are available on
+    the envelope attribute.
+    """
+
+    def __init__(self, chunks, loads=json.loads, key='results'):
+        # type: (Iterable[bytes], Callable[[str], Any], str) -> None
+        """
+        :param chunks: The raw body of the response, e.g.
+            response.iter_content(chunk_size).
+        :param loads: The function used to decode each item.
+        :param key: The key of the top level array to stream.
+        """
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._loads = loads
+        self._key = key
+        # Text before _pos has been scanned, when more input arrives it's
+        # moved to _consumed so the buffer never grows with the item.
+        self._consumed = []  # type: List[str]
+        self._head = []  # type: List[str]
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        self.envelope = None  # type: Optional[Dict[str, Any]]
+
+    def _fill(self):  # type: () -> None
+        """Append the next chunk to the buffer, raising if there isn't one."""
+        while not self._eof:
+            try:
+                text = self._decoder.decode(next(self._chunks))
+            except StopIteration:
+                self._eof = True
+                text = self._decoder.decode(b'', final=True)
+            if text:
+                self._consumed.append(self._buffer[:self._pos])
+                self._buffer = self._buffer[self._pos:] + text
+                self._pos = 0
+                return
+        raise ValueError('Unexpected end of JSON document')
+
+    def _trim(self):  # type: () -> str
+        """Drop everything before the current position, returning it."""
+        self._consumed.append(self._buffer[:self._pos])
+        consumed = ''.join(self._consumed)
+        self._consumed = []
+        self._buffer = self._buffer[self._pos:]
+        self._pos = 0
+        return consumed
+
+    def _search(self, pattern):  # type: (Any) -> Any
+        while True:
+            match = pattern.search(self._buffer, self._pos)
+            if match:
+                return match
+            self._pos = len(self._buffer)
+            self._fill()
+
+    def _peek(self):  # type: () -> str
+        """Skip whitespace and return the next character without consuming it."""
+        self._pos = self._search(_WHITESPACE).start()
+        return self._buffer[self._pos]
+
+    def _expect(self, characters):  # type: (str) -> str
+        c = self._peek()
+        if c not in characters:
+            raise ValueError('Expected one of {} at "{}"'.format(characters, self._buffer[self._pos:self._pos + 20]))
+        self._pos += 1
+        return c
+
+    def _skip_string(self):  # type: () -> None
+        # Called with the position just after the opening quote.
+        while True:
+            end = _STRING_BODY.match(self._buffer, self._pos).end()
+            if self._buffer[end:end + 1] == '"':
+                self._pos = end + 1
+                return
+            # The string continues in the next chunk, possibly part way through
+            # an escape sequence, so carry on from the last complete one.
+            self._pos = end
+            self._fill()
+
+    def _skip_value(self):  # type: () -> None
+        c = self._peek()
+        if c == '"':
+            self._pos += 1
+            self._skip_string()
+        elif c in '{[':
+            depth = 0
+            while True:
+                match = self._search(_STRUCTURE)
+                self._pos = match.end()
+                if match.group() == '"':
+                    self._skip_string()
+                elif match.group() in '{[':
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == 0:
+                        return
+        else:
+            while True:
+                match = _SCALAR_END.search(self._buffer, self._pos)
+                if match:
+                    self._pos = match.start()
+                    return
+                if self._eof:
+                    self._pos = len(self._buffer)
+                    return
+                self._fill()
+
+    def _find_array(self):  # type: () -> bool
+        """Move to just inside the array with the given key, False if it isn't there."""
+        self._expect('{')
+        if self._peek() == '}':
+            return False
+
+        while True:
+            # Everything read so far is kept in _head to decode the envelope.
+            self._peek()
+            self._head.append(self._trim())
+            self._expect('"')
+            self._skip_string()
+            self._head.append(self._trim())
+            key = json.loads(self._head[-1])
+            self._expect(':')
+            if key == self._key and self._peek() == '[':
+                self._pos += 1
+                return True
+            self._skip_value()
+            if self._expect(',}') == '}':
+                return False
+
+    def _read_rest(self):  # type: () -> str
+        while not self._eof:
+            self._pos = len(self._buffer)
+            try:
+                self._fill()
+            except ValueError:
+                break
+        self._pos = len(self._buffer)
+        return self._trim()
+
+    def __iter__(self):  # type: () -> Iterator[Any]
+        if not self._find_array():
+            self.envelope = json.loads(''.join(self._head) + self._read_rest())
+            return
+
+        prefix = ''.join(self._head) + self._trim()
+
+        if self._peek() != ']':
+            while True:
+                self._trim()
+                self._skip_value()
+                yield self._loads(self._trim())
+                if self._expect(',]') == ']':
+                    break
+        else:
+            self._pos += 1
+
+        # Everything other than the results is small so is decoded in one go
+        # with an empty results array.
+        self._trim()
+        self.envelope = json.loads(prefix + ']' + self._read_rest())
@@ -0,0 +1,72 @@
+import logging
+from typing import Optional, Tuple, Union
+
+from confluence.retry import clock
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+Timeout = Union[None, float, Tuple[float, float]]
+
+DEFAULT_TIMEOUT = (10.0, 300.0)
+
+
+class CallOptions:
+    """
+    The timeouts applying to a call, or a group of calls, on the client.
+
+    The deadline starts counting down as soon as the options are created and
+    bounds every request made with them, including retries and every page
+    of a paged call.
+    """
+
+    def __init__(self, timeout=None, deadline=None):  # type: (Timeout, Optional[float]) -> None
+        """
+        :param timeout: The requests library timeout for each individual
+            request, either a single number of seconds or a (connect, read)
+            tuple. None for no timeout.
+        :param deadline: The total number of seconds which all requests made
+            with these options may take. None for no deadline.
+        """
+        self.timeout = timeout
+        self.deadline = deadline
+        self._expires_at = clock() + deadline if deadline is not None else None
+
+    def nested(self, timeout=None, deadline=None):  # type: (Timeout, Optional[float]) -> CallOptions
+        """
+        :param timeout: Replaces the request timeout, None to keep this one.
+        :param deadline: A deadline in seconds from now, the result still
+            expires no later than these options do.
+
+        :return: Options for a group of calls made within this one.
+        """
+        options = CallOptions(self.timeout if timeout is None else timeout, deadline)
+        if self._expires_at is not None and (options._expires_at is None or self._expires_at < options._expires_at):
+            options.deadline = self.deadline
+            options._expires_at = self._expires_at
+        return options
+
+    def remaining(self):  # type: () -> Optional[float]
+        """
+        :return: The number of seconds left before the deadline, None if
+            there is no deadline.
+        """
+        return self._expires_at - clock() if self._expires_at is not None else None
+
+    def expired(self):  # type: () -> bool
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def request_timeout(self):  # type: () -> Timeout
+        """
+        :return: The timeout to pass to the next request, cut short so that
+            the request can't run past the deadline.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return self.timeout
+        if self.timeout is None:
+            return remaining, remaining
+        if isinstance(self.timeout, tuple):
+            return min(self.timeout[0], remaining), min(self.timeout[1], remaining)
+        return min(self.timeout, remaining)
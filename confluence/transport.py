@@ -0,0 +1,128 @@
+"""
+An HTTP/2 transport for the Confluence client.
+
+Requires Python 3.6+ and httpx with HTTP/2 support, install with
+``pip install confluence-rest-library[http2]``.
+"""
+import logging
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+
+import httpx
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from confluence.timeouts import Timeout
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+class Http2Session:
+    """
+    Sends requests through an httpx client with HTTP/2 enabled, so that all
+    calls to the same server are multiplexed over a single connection.
+
+    Only the parts of the requests.Session interface used by Confluence are
+    implemented. Responses are returned as requests.Response objects and
+    httpx errors are translated to the equivalent requests exceptions so the
+    retry policy and error handling are the same whichever transport is used.
+    Servers which don't negotiate HTTP/2 are spoken to over HTTP/1.1.
+    """
+
+    def __init__(self, basic_auth, verify=True, max_connections=10, keep_alive=True):
+        # type: (Tuple[str, str], Union[bool, str], int, bool) -> None
+        """
+        :param basic_auth: A username/password pair sent with every request.
+        :param verify: As for the requests library verify parameter.
+        :param max_connections: The maximum number of connections open at
+            once. With HTTP/2 a single connection per host is normally
+            enough however many requests are in flight.
+        :param keep_alive: Set to False to close each connection after use.
+        """
+        limits = httpx.Limits(max_connections=max_connections,
+                              max_keepalive_connections=max_connections if keep_alive else 0)
+        self._client = httpx.Client(http2=True, auth=basic_auth, verify=verify, limits=limits)
+
+    @staticmethod
+    def _timeout(timeout):  # type: (Timeout) -> httpx.Timeout
+        if timeout is None:
+            return httpx.Timeout(None)
+        connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        return httpx.Timeout(read, connect=connect)
+
+    @staticmethod
+    def _translate_error(error):  # type: (httpx.HTTPError) -> requests.RequestException
+        if isinstance(error, httpx.ConnectTimeout):
+            return requests.exceptions.ConnectTimeout(str(error))
+        if isinstance(error, httpx.TimeoutException):
+            return requests.exceptions.ReadTimeout(str(error))
+        return requests.exceptions.ConnectionError(str(error))
+
+    def request(self, method, url, params=None, data=None, headers=None, files=None, timeout=None, stream=False,
+                **kwargs):
+        # type: (str, str, Optional[Dict[str, Any]], Any, Optional[Dict[str, str]], Any, Timeout, bool, **Any) -> requests.Response
+        """
+        Send a single request. auth and verify are accepted for compatibility
+        with requests.Session but the values given to the constructor are
+        always used.
+
+        :return: The response, with the body already read unless stream is
+            True.
+        """
+        content = None
+        if isinstance(data, (bytes, str)):
+            content, data = data, None
+        elif hasattr(data, 'read'):
+            # A streamed body, e.g. a MultipartEncoder. It's sent chunked
+            # unless the caller sets its Content-Length.
+            content, data = iter(data), None
+
+        # httpx replaces any query string already on the url with params
+        # whereas requests merges them, and the next links of paged results
+        # rely on the latter.
+        request_url = httpx.URL(url)
+        if params:
+            request_url = request_url.copy_merge_params(params)
+
+        try:
+            request = self._client.build_request(method, request_url, content=content, data=data,
+                                                 files=files, headers=headers,
+                                                 timeout=Http2Session._timeout(timeout))
+            response = self._client.send(request, stream=stream)
+        except httpx.HTTPError as e:
+            raise Http2Session._translate_error(e)
+
+        result = requests.Response()
+        result.status_code = response.status_code
+        result.headers = CaseInsensitiveDict(response.headers)
+        result.url = str(response.url)
+        result.reason = response.reason_phrase
+        result.raw = _RawStream(response)
+        if not stream:
+            try:
+                result._content = response.read()
+            except httpx.HTTPError as e:
+                raise Http2Session._translate_error(e)
+            finally:
+                response.close()
+        return result
+
+    def close(self):  # type: () -> None
+        self._client.close()
+
+
+class _RawStream:
+    """Lets requests.Response.iter_content read the body of a streamed httpx response."""
+
+    def __init__(self, response):  # type: (httpx.Response) -> None
+        self._response = response
+
+    def stream(self, chunk_size, decode_content=True):  # type: (int, bool) -> Iterator[bytes]
+        try:
+            for chunk in self._response.iter_bytes(chunk_size):
+                yield chunk
+        except httpx.HTTPError as e:
+            raise Http2Session._translate_error(e)
+
+    def close(self):  # type: () -> None
+        self._response.close()
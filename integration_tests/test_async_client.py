@@ -0,0 +1,66 @@
+from confluence.asyncclient import AsyncConfluence
+from confluence.models.content import ContentStatus, ContentType
+from integration_tests.config import get_confluence_instance
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+c = get_confluence_instance()
+space_key = 'ASYNC'
+
+
+def setup_module():
+    c.create_space(space_key, 'Async Space')
+
+
+def teardown_module():
+    c.delete_space(space_key)
+
+
+def _async_client():  # type: () -> AsyncConfluence
+    return AsyncConfluence(c._base_url, c._basic_auth)
+
+
+def _run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+def test_concurrent_create_and_get():
+    async def run():
+        async with _async_client() as ac:
+            created = await asyncio.gather(*[
+                ac.create_content(ContentType.PAGE, 'Async page {}'.format(i), space_key, '<p>{}</p>'.format(i))
+                for i in range(5)
+            ])
+            fetched = await asyncio.gather(*[ac.get_content_by_id(p.id) for p in created])
+            await asyncio.gather(*[ac.delete_content(p.id, ContentStatus.CURRENT) for p in created])
+            return created, fetched
+
+    created, fetched = _run(run())
+    assert [p.id for p in created] == [p.id for p in fetched]
+
+
+def test_paged_results_are_async_iterable():
+    async def run():
+        async with _async_client() as ac:
+            return [s async for s in ac.get_spaces()]
+
+    assert space_key in [s.key for s in _run(run())]
+
+
+def test_watch_content():
+    page_id = c.create_content(ContentType.PAGE, 'Async watch page', space_key, '').id
+
+    async def run():
+        async with _async_client() as ac:
+            await ac.add_content_watch(page_id)
+            watching = await ac.is_user_watching_content(page_id)
+            await ac.remove_content_watch(page_id)
+            return watching
+
+    try:
+        assert _run(run())
+    finally:
+        c.delete_content(page_id, ContentStatus.CURRENT)
@@ -16,3 +16,18 @@ def test_context_managed_client():
         c.create_space('TCMC', 'Test context managed space', 'Description')
         c.delete_space('TCMC')
         assert str(c) is not None
+
+
+def test_client_outside_with_block_reuses_session():
+    """
+    Outside of a with block the client should lazily create a single pooled
+    session and reuse it until closed.
+    """
+    client = get_confluence_instance()
+    try:
+        list(client.get_spaces())
+        session = client.client
+        list(client.get_spaces())
+        assert client.client is session
+    finally:
+        client.close()
@@ -26,6 +26,12 @@ def test_get_all_spaces():
     assert 1 == len(list(spaces))
 
 
+def test_get_spaces_small_page_size():
+    all_spaces = [s.key for s in c.get_spaces()]
+    paged_spaces = [s.key for s in c.get_spaces(page_size=1)]
+    assert all_spaces == paged_spaces
+
+
 def test_get_space_no_expands():
     s = c.get_space('TEST')
     assert s.name == 'Test space'
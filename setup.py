@@ -28,6 +28,11 @@ setup(
     ],
     python_requires='>=2.7,!=3.0,!=3.1,!=3.2,!=3.3,!=3.4',
     setup_requires=['pytest-runner', 'typing', 'pycodestyle', 'bandit', 'mypy'],
-    install_requires=['requests >= 2.19.1, < 3.0.0a0'],
+    install_requires=['requests >= 2.19.1, < 3.0.0a0', 'futures >= 3.2.0; python_version < "3"'],
+    extras_require={
+        'async': ['aiohttp >= 3.5.0, < 4.0.0; python_version >= "3.6"'],
+        'fast': ['orjson >= 2.0.0; python_version >= "3.6"'],
+        'http2': ['httpx[http2] >= 0.18.0; python_version >= "3.6"']
+    },
     tests_require=['pytest >= 4.3.0, < 7.0.0', 'pytest-cov >= 2.5.0, < 4.0.0']
 )
@@ -0,0 +1,270 @@
+from confluence.asyncclient import AsyncConfluence
+from confluence.cache import HttpCache, ObjectCache
+from confluence.client import Confluence
+from confluence.contentstore import ContentStore
+from confluence.exceptions.authenticationerror import ConfluenceAuthenticationError
+from confluence.exceptions.generalerror import ConfluenceError
+from confluence.exceptions.permissionerror import ConfluencePermissionError
+from confluence.exceptions.resourcenotfound import ConfluenceResourceNotFound
+from confluence.exceptions.servererror import ConfluenceServerError
+from confluence.exceptions.sizemismatch import ConfluenceSizeMismatch
+from confluence.exceptions.timeout import ConfluenceTimeout
+from confluence.export import ExportManifest
+from confluence.models.content import Content
+from confluence.ratelimit import RateLimiter
+from confluence.retry import RetryPolicy
+import aiohttp
+import asyncio
+import inspect
+import logging
+import pytest
+import requests
+import time
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def _run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def _client(**kwargs):
+    return AsyncConfluence('http://localhost', ('user', 'pass'), **kwargs)
+
+
+def test_takes_same_parameters_as_confluence():
+    parameters = inspect.signature(AsyncConfluence.__init__).parameters
+    assert list(parameters) == list(inspect.signature(Confluence.__init__).parameters)
+    assert parameters['pool_maxsize'].default == 100
+    assert _client(page_size=10)._page_size == 10
+
+
+@pytest.mark.parametrize('option', [{'http_cache': HttpCache()}, {'object_cache': ObjectCache()},
+                                    {'coalesce_requests': True}])
+def test_unsupported_options(option):
+    with pytest.raises(ValueError):
+        _client(**option)
+
+
+def test_unsupported_content_store(tmpdir):
+    with pytest.raises(ValueError):
+        _client(content_store=ContentStore(str(tmpdir.join('store.db'))))
+
+
+def test_publish_pages_invalid_max_workers():
+    with pytest.raises(ValueError):
+        _run(_client().publish_pages([], max_workers=0))
+
+
+def test_add_attachments_invalid_max_workers():
+    with pytest.raises(ValueError):
+        _run(_client().add_attachments(1, [('a.txt', b'x')], max_workers=0))
+
+
+def test_sync_attachments_invalid_max_workers():
+    with pytest.raises(ValueError):
+        _run(_client().sync_attachments(1, [('a.txt', b'x')], max_workers=0))
+
+
+def test_get_content_by_ids_invalid_max_workers():
+    with pytest.raises(ValueError):
+        _run(_client().get_content_by_ids([1], max_workers=0))
+
+
+def _attachment(attachment_id, title, version=1):
+    return Content({'id': 'att{}'.format(attachment_id), 'type': 'attachment', 'status': 'current', 'title': title,
+                    'version': {'number': version, 'minorEdit': False}, 'extensions': {'fileSize': 3},
+                    '_links': {'download': '/download/attachments/{}/{}'.format(attachment_id, title)}})
+
+
+class _ExportServer:
+    """Stands in for the calls export_attachments makes."""
+
+    def __init__(self, client):
+        self.attachments = {1: [_attachment(10, 'a.bin')], 2: [_attachment(20, 'b.bin'), _attachment(21, 'bad.bin')]}
+        self.fail_walk = False
+        self.downloaded = []
+        client.search = self.search
+        client.get_attachments = self.get_attachments
+        client.download_attachment_resumable = self.download
+
+    async def search(self, cql, *args, **kwargs):
+        yield Content({'id': '2', 'type': 'page', 'status': 'current', '_links': {}})
+        if self.fail_walk:
+            raise ConfluenceError('content/search', {}, None, 'failed')
+
+    async def get_attachments(self, page_id, expand=None):
+        for attachment in self.attachments[page_id]:
+            yield attachment
+
+    async def download(self, attachment, path, max_resumes=5):
+        await asyncio.sleep(0.01)
+        if attachment.title == 'bad.bin':
+            raise ConfluenceSizeMismatch(path, {}, 3, 1)
+        with open(path, 'wb') as f:
+            f.write(b'abc')
+        self.downloaded.append(attachment.id)
+        return 3
+
+
+def test_export_attachments(tmpdir):
+    client = _client()
+    server = _ExportServer(client)
+
+    result = _run(client.export_attachments(str(tmpdir), root_page_id=1))
+    assert sorted(server.downloaded) == [10, 20]
+    assert [a.id for a, _ in result.failed] == [21]
+
+    server.downloaded = []
+    result = _run(client.export_attachments(str(tmpdir), root_page_id=1))
+    assert server.downloaded == []
+    assert sorted(a.id for a in result.skipped) == [10, 20]
+
+
+def test_export_attachments_finishes_downloads_when_walk_fails(tmpdir):
+    client = _client()
+    server = _ExportServer(client)
+    server.fail_walk = True
+
+    with pytest.raises(ConfluenceError):
+        _run(client.export_attachments(str(tmpdir), root_page_id=1))
+
+    # The downloads already started were recorded before the manifest closed.
+    with ExportManifest(str(tmpdir)) as manifest:
+        assert manifest.get(10) is not None
+
+
+def test_export_attachments_invalid_max_workers(tmpdir):
+    with pytest.raises(ValueError):
+        _run(_client().export_attachments(str(tmpdir), root_page_id=1, max_workers=0))
+
+
+class _Response:
+    """Enough of aiohttp.ClientResponse for AsyncConfluence."""
+
+    def __init__(self, status, body=b'', headers=None):
+        self.status = status
+        self.reason = 'Reason'
+        self.headers = headers or {}
+        self.body = body
+        self.released = False
+
+    async def read(self):
+        return self.body
+
+    def release(self):
+        self.released = True
+
+
+class _Session:
+    """Replies to each request with the next of the responses, or raises it if it's an exception."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    async def request(self, method, url, params=None, **kwargs):
+        self.requests.append((method, url, dict(params or [])))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    async def close(self):
+        pass
+
+
+def _mocked(*responses, **kwargs):
+    client = _client(retry_policy=RetryPolicy(backoff_factor=0), **kwargs)
+    client._session = _Session(*responses)
+    return client
+
+
+def test_request_retries_server_errors():
+    client = _mocked(_Response(503), _Response(502), _Response(200, b'{"id": "1"}'))
+    response = _run(client._request('GET', 'content/1', {}))
+    assert response.json() == {'id': '1'}
+    assert len(client._session.requests) == 3
+
+
+def test_request_retries_connection_errors_when_idempotent():
+    error = aiohttp.ServerDisconnectedError()
+    client = _mocked(error, _Response(200, b'{}'))
+    assert _run(client._request('GET', 'content/1', {})).status_code == 200
+
+    client = _mocked(error, _Response(200, b'{}'))
+    with pytest.raises(requests.exceptions.ConnectionError):
+        _run(client._request('POST', 'content', {}, data='{}'))
+    assert len(client._session.requests) == 1
+
+
+def test_request_errors_mapped():
+    for status, error in ((401, ConfluenceAuthenticationError), (403, ConfluencePermissionError),
+                          (404, ConfluenceResourceNotFound), (500, ConfluenceServerError)):
+        client = _mocked(*[_Response(status, b'{"message": "failed"}') for _ in range(4)])
+        with pytest.raises(error):
+            _run(client._request('GET', 'content/1', {}))
+
+
+def test_request_gives_up_at_deadline():
+    client = _mocked(_Response(503, headers={'Retry-After': '60'}), _Response(200), deadline=1)
+    with pytest.raises(ConfluenceTimeout):
+        _run(client._request('GET', 'content/1', {}))
+    assert len(client._session.requests) == 1
+
+
+def test_rate_limit_wait_past_deadline_times_out():
+    client = _mocked(_Response(200), _Response(200), rate_limiter=RateLimiter.per_second(reads=0.01), deadline=5)
+    _run(client._request('GET', 'content/1', {}))
+    started = time.time()
+    with pytest.raises(ConfluenceTimeout):
+        _run(client._request('GET', 'content/1', {}))
+    assert time.time() - started < 1
+    assert len(client._session.requests) == 1
+
+
+def test_to_response_reads_and_releases_body():
+    raw = _Response(201, b'{"a": 1}', {'ETag': '"v1"'})
+    response = _run(AsyncConfluence._to_response('http://localhost/x', raw))
+    assert (response.status_code, response.json(), response.headers['etag']) == (201, {'a': 1}, '"v1"')
+    assert response.url == 'http://localhost/x'
+    assert raw.released
+
+
+def test_to_response_streamed_leaves_body_unread():
+    raw = _Response(200, b'data')
+    response = _run(AsyncConfluence._to_response('http://localhost/x', raw, stream=True))
+    assert response.raw is raw
+    assert not raw.released
+
+    # Errors are read so that they can be reported.
+    raw = _Response(404, b'{"message": "missing"}')
+    assert _run(AsyncConfluence._to_response('http://localhost/x', raw, stream=True)).content == raw.body
+    assert raw.released
+
+
+def test_paged_results_follow_next_links():
+    first = b'{"results": [{"key": "A"}], "_links": {"next": "/rest/api/space?start=1&limit=1"}}'
+    second = b'{"results": [{"key": "B"}], "_links": {}}'
+    client = _mocked(_Response(200, first), _Response(200, second))
+
+    async def collect():
+        return [r async for r in client._get_paged_results(dict, 'space', {'type': 'global'}, ['homepage'],
+                                                           page_size=1)]
+
+    assert _run(collect()) == [{'key': 'A'}, {'key': 'B'}]
+    (_, url1, params1), (_, url2, params2) = client._session.requests
+    assert url1 == 'http://localhost/rest/api/space'
+    assert params1 == {'type': 'global', 'expand': 'homepage', 'limit': '1'}
+    assert url2 == 'http://localhost/rest/api/space?start=1&limit=1'
+    assert params2 == {}
+
+
+def test_query_parameters():
+    assert AsyncConfluence._query({'a': True, 'b': ['x', 'y'], 'c': 1}) == [('a', 'true'), ('b', 'x'), ('b', 'y'),
+                                                                            ('c', '1')]
@@ -0,0 +1,216 @@
+from confluence.asyncclient import AsyncConfluence
+from confluence.attachmentsync import HASH_PROPERTY, SyncResult, file_digest, hash_record, recorded_hash, unchanged
+from confluence.client import Confluence
+from confluence.models.content import Content
+from confluence.retry import RetryPolicy
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import pytest
+import re
+import requests
+import threading
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+DIGEST = hashlib.sha256(b'hello').hexdigest()
+
+
+def test_file_digest_from_path_and_bytes(tmpdir):
+    path = tmpdir.join('a.txt')
+    path.write_binary(b'hello')
+    assert file_digest(str(path)) == DIGEST
+    assert file_digest(memoryview(b'hello')) == DIGEST
+
+
+def test_file_digest_leaves_file_position():
+    f = io.BytesIO(b'xxhello')
+    f.seek(2)
+    assert file_digest(f) == DIGEST
+    assert f.tell() == 2
+
+
+def test_file_digest_rejects_one_shot_content():
+    with pytest.raises(ValueError):
+        file_digest(iter([b'hello']))
+
+
+def _attachment(version, record=None):
+    json = {'id': 'att1', 'type': 'attachment', 'status': 'current', 'title': 'a.txt',
+            'version': {'number': version, 'minorEdit': False}, 'metadata': {'properties': {}}, '_links': {}}
+    if record is not None:
+        json['metadata']['properties'][HASH_PROPERTY] = {'key': HASH_PROPERTY, 'value': record}
+    return Content(json)
+
+
+def test_unchanged_needs_hash_for_current_version():
+    record = hash_record(DIGEST, 'sha256', 2)
+    assert recorded_hash(_attachment(2, record)) == record
+    assert unchanged(_attachment(2, record), DIGEST)
+    assert not unchanged(_attachment(3, record), DIGEST)
+    assert not unchanged(_attachment(2, record), 'other')
+    assert not unchanged(_attachment(2), DIGEST)
+
+
+def test_sync_result_str():
+    result = SyncResult()
+    result.add_added('a')
+    result.add_skipped('b')
+    result.add_skipped('c')
+    result.add_failed('d', ValueError())
+    assert str(result) == '1 added, 0 updated, 2 skipped, 1 failed'
+
+
+class _AttachmentServer:
+    """Stands in for the attachments on page 1 and their content properties."""
+
+    def __init__(self, fail=()):
+        self.lock = threading.Lock()
+        self.attachments = {}
+        self.properties = {}
+        self.fail = set(fail)
+        self.uploaded = []
+
+    def attach(self, title, data, recorded=True):
+        attachment = self._create(title)
+        if recorded:
+            self.properties[attachment['id']] = {'key': HASH_PROPERTY, 'version': {'number': 1, 'minorEdit': False},
+                                                 'value': hash_record(hashlib.sha256(data).hexdigest(), 'sha256', 1)}
+
+    def _create(self, title):
+        attachment = {'id': 100 + len(self.attachments), 'type': 'attachment', 'status': 'current', 'title': title,
+                      'version': {'number': 1, 'minorEdit': False}, '_links': {}}
+        self.attachments[title] = attachment
+        return attachment
+
+    def _json(self, attachment):
+        prop = self.properties.get(attachment['id'])
+        return dict(attachment, metadata={'properties': {HASH_PROPERTY: prop} if prop else {}})
+
+    def handle(self, method, path, body):
+        with self.lock:
+            if path == 'content/1/child/attachment' and method == 'GET':
+                return 200, {'results': [self._json(a) for a in self.attachments.values()], '_links': {}}
+            if path == 'content/1/child/attachment':
+                names = [n.decode('utf-8') for n in re.findall(rb'filename="([^"]+)"', body)]
+                if self.fail.intersection(names):
+                    return 400, {'message': 'Rejected'}
+                self.uploaded += names
+                return 200, {'results': [self._create(name) for name in names]}
+            match = re.match(r'content/1/child/attachment/(\d+)/data$', path)
+            if match:
+                attachment = next(a for a in self.attachments.values() if a['id'] == int(match.group(1)))
+                if attachment['title'] in self.fail:
+                    return 400, {'message': 'Rejected'}
+                self.uploaded.append(attachment['title'])
+                attachment['version'] = {'number': attachment['version']['number'] + 1, 'minorEdit': False}
+                return 200, attachment
+            match = re.match(r'content/(\d+)/property(?:/.+)?$', path)
+            if match and method == 'GET':
+                prop = self.properties.get(int(match.group(1)))
+                return (200, prop) if prop else (404, {'message': 'Not found'})
+            if match:
+                self.properties[int(match.group(1))] = prop = json.loads(body)
+                return 200, prop
+            raise AssertionError('Unexpected {} {}'.format(method, path))
+
+
+class _Session:
+    def __init__(self, server):
+        self.server = server
+
+    def request(self, method, url, params=None, data=None, **kwargs):
+        status, payload = self.server.handle(method, url.split('/rest/api/')[1], data.read() if hasattr(data, 'read') else data)
+        response = requests.Response()
+        response.status_code = status
+        response.url = url
+        response._content = json.dumps(payload).encode('utf-8')
+        response.raw = io.BytesIO(response._content)
+        return response
+
+
+class _AsyncResponse:
+    def __init__(self, status, body):
+        self.status = status
+        self.reason = 'Reason'
+        self.headers = {}
+        self.body = body
+
+    async def read(self):
+        return self.body
+
+    def release(self):
+        pass
+
+
+class _AsyncSession:
+    def __init__(self, server):
+        self.server = server
+
+    async def request(self, method, url, params=None, data=None, **kwargs):
+        if data is not None and not isinstance(data, (str, bytes)):
+            data = b''.join([chunk async for chunk in data])
+        status, payload = self.server.handle(method, url.split('/rest/api/')[1], data)
+        return _AsyncResponse(status, json.dumps(payload).encode('utf-8'))
+
+    async def close(self):
+        pass
+
+
+def _server():
+    server = _AttachmentServer(fail=['bad.txt', 'broken.txt'])
+    server.attach('same.txt', b'same')
+    server.attach('changed.txt', b'old')
+    server.attach('broken.txt', b'old')
+    return server
+
+
+FILES = [('same.txt', b'same'), ('changed.txt', b'new'), ('new.txt', b'new'), ('bad.txt', b'bad'),
+         ('broken.txt', b'new')]
+
+
+def _check_sync(server, result):
+    assert [a.title for a in result.skipped] == ['same.txt']
+    assert [(a.title, a.version.number) for a in result.updated] == [('changed.txt', 2)]
+    assert [a.title for a in result.added] == ['new.txt']
+    assert sorted(f[0] for f, _ in result.failed) == ['bad.txt', 'broken.txt']
+    assert sorted(server.uploaded) == ['changed.txt', 'new.txt']
+
+    def recorded(title):
+        attachment = server.attachments[title]
+        return recorded_hash(Content(server._json(attachment)))
+
+    # Hashes are recorded against the new versions, failed uploads keep theirs.
+    assert recorded('changed.txt') == hash_record(hashlib.sha256(b'new').hexdigest(), 'sha256', 2)
+    assert recorded('new.txt') == hash_record(hashlib.sha256(b'new').hexdigest(), 'sha256', 1)
+    assert recorded('broken.txt') == hash_record(hashlib.sha256(b'old').hexdigest(), 'sha256', 1)
+    assert 'bad.txt' not in server.attachments
+
+
+def test_sync_attachments():
+    server = _server()
+    client = Confluence('http://localhost', ('user', 'pass'), retry_policy=RetryPolicy(backoff_factor=0))
+    client._client = _Session(server)
+
+    _check_sync(server, client.sync_attachments(1, FILES))
+
+    # Everything which was uploaded is now skipped without a request.
+    server.uploaded = []
+    result = client.sync_attachments(1, FILES[:3])
+    assert sorted(a.title for a in result.skipped) == ['changed.txt', 'new.txt', 'same.txt']
+    assert server.uploaded == []
+
+
+def test_async_sync_attachments():
+    server = _server()
+    client = AsyncConfluence('http://localhost', ('user', 'pass'), retry_policy=RetryPolicy(backoff_factor=0))
+    client._session = _AsyncSession(server)
+
+    loop = asyncio.new_event_loop()
+    try:
+        _check_sync(server, loop.run_until_complete(client.sync_attachments(1, FILES)))
+    finally:
+        loop.close()
@@ -0,0 +1,90 @@
+from confluence.bulk import PageSpec, run_in_order, size_batches
+import logging
+import pytest
+import threading
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+class _Published:
+    def __init__(self, content_id):
+        self.id = content_id
+
+
+class _Publisher:
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, spec, parent_id):
+        with self._lock:
+            self.calls.append((spec.title, parent_id))
+            if spec.title in self.fail:
+                raise ValueError(spec.title)
+            return _Published(len(self.calls) * 10)
+
+
+def test_parents_are_published_before_children():
+    root = PageSpec('root', 'SP', '', parent=1)
+    child = PageSpec('child', 'SP', '', parent=root)
+    grandchild = PageSpec('grandchild', 'SP', '', parent=child)
+    publisher = _Publisher()
+
+    results = run_in_order([grandchild, child, root], publisher, 4)
+
+    assert [r.spec for r in results] == [grandchild, child, root]
+    assert all(r.ok for r in results)
+    assert publisher.calls == [('root', 1), ('child', 10), ('grandchild', 20)]
+
+
+def test_failure_skips_descendants_only():
+    root = PageSpec('root', 'SP', '')
+    child = PageSpec('child', 'SP', '', parent=root)
+    other = PageSpec('other', 'SP', '')
+    publisher = _Publisher(fail=['root'])
+
+    results = run_in_order([root, child, other], publisher, 2)
+
+    assert [r.ok for r in results] == [False, False, True]
+    assert results[1].error is results[0].error
+    assert ('child', None) not in publisher.calls
+    assert results[2].content is not None
+
+
+def test_parent_outside_batch_fails():
+    child = PageSpec('child', 'SP', '', parent=PageSpec('missing', 'SP', ''))
+
+    results = run_in_order([child], _Publisher(), 1)
+
+    assert isinstance(results[0].error, ValueError)
+
+
+def test_cycle_fails():
+    a = PageSpec('a', 'SP', '')
+    b = PageSpec('b', 'SP', '', parent=a)
+    a.parent = b
+    publisher = _Publisher()
+
+    results = run_in_order([a, b], publisher, 1)
+
+    assert not any(r.ok for r in results)
+    assert publisher.calls == []
+
+
+def test_invalid_max_workers():
+    with pytest.raises(ValueError):
+        run_in_order([], _Publisher(), 0)
+
+
+def test_size_batches_bounded_by_bytes_and_count():
+    assert size_batches([4, 4, 4, 1, 1, 1], max_bytes=10, max_items=3) == [[0, 1], [2, 3, 4], [5]]
+
+
+def test_size_batches_isolates_large_and_unknown():
+    assert size_batches([1, 20, 1, None, 1], max_bytes=10, max_items=10) == [[1], [3], [0, 2, 4]]
+
+
+def test_size_batches_empty():
+    assert size_batches([], max_bytes=10, max_items=10) == []
@@ -0,0 +1,139 @@
+from confluence.cache import HttpCache, LRUCache, ObjectCache
+from confluence.client import Confluence
+import logging
+import pytest
+import requests
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert len(cache) == 2
+
+
+def test_lru_discard_and_clear():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.discard('a')
+    cache.discard('missing')
+    assert cache.get('a') is None
+    cache.put('b', 2)
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_lru_invalid_size():
+    with pytest.raises(ValueError):
+        LRUCache(0)
+
+
+def test_http_cache_revalidation():
+    cache = HttpCache()
+    assert cache.validators('k') == {}
+
+    cache.store('k', {'ETag': '"1"', 'Last-Modified': 'Mon, 01 Jan 2018 00:00:00 GMT'}, {'id': '1'})
+    assert cache.validators('k') == {'If-None-Match': '"1"', 'If-Modified-Since': 'Mon, 01 Jan 2018 00:00:00 GMT'}
+    assert cache.not_modified('k') == {'id': '1'}
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'revalidations': 1, 'entries': 1}
+
+
+def test_http_cache_ignores_responses_without_validators():
+    cache = HttpCache()
+    cache.store('k', {'ETag': '"1"'}, {'id': '1'})
+    cache.store('k', {}, {'id': '1'})
+    assert cache.validators('k') == {}
+    assert cache.not_modified('k') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_object_cache_hit_and_expiry():
+    cache = ObjectCache(ttl=60, ttls={'user': 0})
+    cache.put('k', 'content/1', {'id': '1'}, cache.generation('content/1'))
+    assert cache.get('k') == {'id': '1'}
+
+    cache.put('u', 'user', {'username': 'a'}, cache.generation('user'))
+    assert cache.get('u') is None
+
+    expired = ObjectCache(ttl=-1)
+    expired.put('k', 'content/1', {'id': '1'}, 0)
+    assert expired.get('k') is None
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'entries': 1}
+
+
+def test_object_cache_invalidated_by_writes_below_resource():
+    cache = ObjectCache()
+    cache.put('page', 'content/1', {'id': '1'}, cache.generation('content/1'))
+    cache.put('history', 'content/1/history', {}, cache.generation('content/1/history'))
+    cache.put('other', 'content/2', {'id': '2'}, cache.generation('content/2'))
+
+    cache.invalidate('content/1/property/key')
+    assert cache.get('page') is None
+    assert cache.get('history') is None
+    assert cache.get('other') == {'id': '2'}
+
+
+def test_object_cache_attachment_writes_invalidate_attachment():
+    cache = ObjectCache()
+    cache.put('attachment', 'content/att5', {'id': 'att5'}, cache.generation('content/att5'))
+    cache.invalidate('content/1/child/attachment/att5/data')
+    assert cache.get('attachment') is None
+
+
+def test_object_cache_ignores_results_fetched_during_write():
+    cache = ObjectCache()
+    generation = cache.generation('space/SP')
+    cache.invalidate('space/SP')
+    cache.put('space', 'space/SP', {'key': 'SP'}, generation)
+    assert cache.get('space') is None
+
+
+def test_object_cache_invalidation_records_are_bounded():
+    cache = ObjectCache(max_entries=2)
+    cache.put('old', 'content/1', {'id': '1'}, cache.generation('content/1'))
+    for i in range(2, 10):
+        cache.invalidate('content/{}'.format(i))
+    assert len(cache._invalidated) == 2
+
+    # Entries from before the oldest record kept can't be shown to be current.
+    assert cache.get('old') is None
+    cache.put('new', 'content/1', {'id': '1'}, cache.generation('content/1'))
+    assert cache.get('new') == {'id': '1'}
+
+
+class _RevalidatingSession:
+    """Serves a space with an ETag, answering 304 when the request carries it."""
+
+    def __init__(self):
+        self.headers = []
+
+    def request(self, method, url, params=None, headers=None, **kwargs):
+        self.headers.append(dict(headers or {}))
+        response = requests.Response()
+        response.url = url
+        response.headers['ETag'] = '"v1"'
+        if (headers or {}).get('If-None-Match') == '"v1"':
+            response.status_code = 304
+            response._content = b''
+        else:
+            response.status_code = 200
+            response._content = b'{"id": 1, "key": "SP", "name": "Space", "type": "global", "_links": {}}'
+        return response
+
+
+def test_client_revalidates_through_http_cache():
+    cache = HttpCache()
+    client = Confluence('http://localhost', ('user', 'pass'), http_cache=cache)
+    client._client = _RevalidatingSession()
+
+    assert [client.get_space('SP').name for _ in range(2)] == ['Space', 'Space']
+    assert client.client.headers == [{}, {'If-None-Match': '"v1"'}]
+    assert (cache.misses, cache.revalidations, cache.hits) == (1, 1, 1)
@@ -0,0 +1,489 @@
+from confluence.cache import ObjectCache
+from confluence.client import Confluence, _attachment_download, _attachment_files, _check_size, _count_chunk, _id_batches, \
+    _match_attachments, _open_destination, _range_response
+from confluence.contentstore import ContentStore
+from confluence.download import RangesNotSupported
+from confluence.exceptions.generalerror import ConfluenceError
+from confluence.exceptions.sizemismatch import ConfluenceSizeMismatch
+from confluence.exceptions.timeout import ConfluenceTimeout
+from confluence.mirror import MirrorStore
+from confluence.ratelimit import RateLimiter
+from confluence.models.content import Content
+from confluence.retry import RetryPolicy
+import hashlib
+import io
+import json
+import logging
+import os
+import pytest
+import requests
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def test_id_batches_limited_by_count():
+    assert list(_id_batches(range(1, 6), 2, 1000)) == [['1', '2'], ['3', '4'], ['5']]
+
+
+def test_id_batches_limited_by_length():
+    # Each id costs its length plus three for the encoded comma.
+    assert list(_id_batches([1234, 5678, 9], 100, 14)) == [['1234', '5678'], ['9']]
+
+
+def test_id_batches_keeps_oversized_id():
+    assert list(_id_batches(['123456789'], 100, 5)) == [['123456789']]
+
+
+def test_id_batches_empty():
+    assert list(_id_batches([], 10, 10)) == []
+
+
+def _attachment(extensions=None):
+    json = {'id': 1, 'type': 'attachment', 'status': 'current', 'title': 'a.txt',
+            '_links': {'download': '/download/attachments/1/a.txt'}}
+    if extensions is not None:
+        json['extensions'] = extensions
+    return Content(json)
+
+
+def test_attachment_files_named():
+    f = io.BytesIO(b'x')
+    f.name = '/tmp/b.txt'
+    assert _attachment_files(['/tmp/a.txt', f, ('c.txt', b'y')]) == [('a.txt', '/tmp/a.txt'), ('b.txt', f), ('c.txt', b'y')]
+
+
+def test_attachment_files_unique():
+    with pytest.raises(ValueError):
+        _attachment_files(['a/x.txt', 'b/x.txt'])
+    with pytest.raises(ValueError):
+        _attachment_files([b'unnamed'])
+
+
+def test_match_attachments_by_title():
+    a = _attachment()
+    assert _match_attachments(['b.txt', 'a.txt'], [a]) == [None, a]
+
+
+def test_attachment_download_size():
+    assert _attachment_download(_attachment({'fileSize': 12})) == ('/download/attachments/1/a.txt', 12)
+    assert _attachment_download(_attachment()) == ('/download/attachments/1/a.txt', None)
+
+
+def test_attachment_download_rejects_pages():
+    with pytest.raises(ValueError):
+        _attachment_download(Content({'id': 1, 'type': 'page', 'status': 'current', 'title': 'p'}))
+
+
+def test_count_chunk_updates_checksum():
+    checksum = hashlib.sha256()
+    size = _count_chunk('p', b'abc', 0, 6, checksum)
+    size = _count_chunk('p', b'def', size, 6, checksum)
+    _check_size('p', size, 6)
+    assert size == 6
+    assert checksum.hexdigest() == hashlib.sha256(b'abcdef').hexdigest()
+
+
+def test_count_chunk_fails_once_too_large():
+    with pytest.raises(ConfluenceSizeMismatch):
+        _count_chunk('p', b'abcd', 0, 3, None)
+
+
+def test_check_size_fails_when_short():
+    with pytest.raises(ConfluenceSizeMismatch) as e:
+        _check_size('p', 2, 3)
+    assert (e.value.expected, e.value.actual) == (3, 2)
+    _check_size('p', 2, None)
+
+
+def test_open_destination_removes_partial_file(tmpdir):
+    path = str(tmpdir.join('out'))
+    with pytest.raises(ValueError):
+        with _open_destination(path) as f:
+            f.write(b'partial')
+            raise ValueError()
+    assert not os.path.exists(path)
+
+
+def _range(status, headers):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers)
+    return response
+
+
+def test_range_response_appends_partial_content():
+    assert _range_response('p', _range(206, {'Content-Range': 'bytes 5-9/10'}), 5, 0, None) == ('ab', 10)
+
+
+def test_range_response_rejects_wrong_offset():
+    with pytest.raises(ConfluenceError):
+        _range_response('p', _range(206, {'Content-Range': 'bytes 0-9/10'}), 5, 0, None)
+
+
+def test_range_response_restarts_when_range_ignored():
+    assert _range_response('p', _range(200, {'Content-Length': '10'}), 5, 0, None) == ('wb', 10)
+    with pytest.raises(RangesNotSupported):
+        _range_response('p', _range(200, {}), 5, 5, 9)
+
+
+def test_range_response_already_complete():
+    assert _range_response('p', _range(416, {'Content-Range': 'bytes */10'}), 10, 0, None) == (None, 10)
+    with pytest.raises(ConfluenceError):
+        _range_response('p', _range(416, {'Content-Range': 'bytes */10'}), 5, 0, None)
+
+
+def test_coalesced_waiter_does_not_share_leaders_timeout():
+    client = Confluence('http://localhost', ('user', 'pass'))
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def fetch(path, params, options):
+        calls.append(options.deadline)
+        if len(calls) == 1:
+            started.set()
+            release.wait(5)
+            raise ConfluenceTimeout(path, params, options.deadline)
+        return {'id': '1'}
+
+    client._fetch_json = fetch
+
+    def leader():
+        with client.call_options(deadline=60):
+            with pytest.raises(ConfluenceTimeout):
+                client._get_json('content/1', {}, None)
+
+    thread = threading.Thread(target=leader)
+    thread.start()
+    started.wait(5)
+
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(client._get_json('content/1', {}, None)))
+    waiter.start()
+    for _ in range(500):
+        if client._single_flight.coalesced:
+            break
+        time.sleep(0.01)
+    release.set()
+    thread.join()
+    waiter.join()
+
+    assert results == [{'id': '1'}]
+    assert calls == [60, None]
+
+
+def test_coalesced_waiter_times_out_on_its_own_deadline():
+    client = Confluence('http://localhost', ('user', 'pass'))
+    started, release = threading.Event(), threading.Event()
+
+    def slow(path, params, options):
+        started.set()
+        release.wait(5)
+        return {'id': '1'}
+
+    client._fetch_json = slow
+    thread = threading.Thread(target=client._get_json, args=('content/1', {}, None))
+    thread.start()
+    started.wait(5)
+
+    # The waiter's deadline has already passed, so it gives up without
+    # waiting for the leader and raises its own timeout.
+    del client._fetch_json
+    try:
+        with client.call_options(deadline=0):
+            with pytest.raises(ConfluenceTimeout) as e:
+                client._get_json('content/1', {}, None)
+        assert 'deadline of 0s' in str(e.value)
+    finally:
+        release.set()
+        thread.join()
+
+
+def _stored_attachment(attachment_id, title, version=1, size=3):
+    return Content({'id': 'att{}'.format(attachment_id), 'type': 'attachment', 'status': 'current', 'title': title,
+                    'version': {'number': version, 'minorEdit': False}, 'extensions': {'fileSize': size},
+                    '_links': {'download': '/download/attachments/{}/{}'.format(attachment_id, title)}})
+
+
+class _ExportServer:
+    """Stands in for the calls export_attachments makes."""
+
+    def __init__(self):
+        self.tree = {1: [2, 3], 2: [], 3: []}
+        self.attachments = {1: [_stored_attachment(10, 'a.bin')],
+                            2: [_stored_attachment(20, 'b.bin'), _stored_attachment(21, 'bad.bin')],
+                            3: []}
+        self.unlistable = set()
+        self.downloaded = []
+
+    def install(self, client):
+        client.search = self.search
+        client.get_attachments = self.get_attachments
+        client.download_attachment_resumable = self.download
+
+    def search(self, cql, *args, **kwargs):
+        root = int(cql.split('=')[1].split()[0])
+        return iter([Content({'id': str(i), 'type': 'page', 'status': 'current', '_links': {}})
+                     for i in self.tree[root]])
+
+    def get_attachments(self, page_id, expand=None):
+        # A generator, like the paged results, so failures are raised while
+        # the attachments are iterated.
+        if page_id in self.unlistable:
+            raise ConfluenceError('content/{}/child/attachment'.format(page_id), {}, None, 'failed')
+        for attachment in self.attachments[page_id]:
+            yield attachment
+
+    def download(self, attachment, path, max_resumes=5):
+        if attachment.title == 'bad.bin':
+            raise ConfluenceSizeMismatch(path, {}, 3, 1)
+        self.downloaded.append(attachment.id)
+        with open(path, 'wb') as f:
+            f.write(b'abc')
+        return 3
+
+
+def test_export_attachments_walks_page_tree(tmpdir):
+    client = Confluence('http://localhost', ('user', 'pass'))
+    server = _ExportServer()
+    server.install(client)
+
+    result = client.export_attachments(str(tmpdir), root_page_id=1)
+
+    assert sorted(server.downloaded) == [10, 20]
+    assert tmpdir.join('1', 'a.bin').read_binary() == b'abc'
+    assert tmpdir.join('2', 'b.bin').read_binary() == b'abc'
+    assert [a.id for a, _ in result.failed] == [21]
+    assert str(result) == '2 downloaded (6 bytes), 0 skipped, 1 failed'
+
+
+def test_export_attachments_skips_unchanged(tmpdir):
+    client = Confluence('http://localhost', ('user', 'pass'))
+    server = _ExportServer()
+    server.install(client)
+    client.export_attachments(str(tmpdir), root_page_id=1)
+
+    server.downloaded = []
+    server.attachments[2][0] = _stored_attachment(20, 'b.bin', version=2)
+    result = client.export_attachments(str(tmpdir), root_page_id=1)
+
+    assert server.downloaded == [20]
+    assert [a.id for a in result.skipped] == [10]
+
+
+def test_export_attachments_records_listing_failures(tmpdir):
+    client = Confluence('http://localhost', ('user', 'pass'))
+    server = _ExportServer()
+    server.unlistable.add(2)
+    server.install(client)
+
+    result = client.export_attachments(str(tmpdir), root_page_id=1)
+
+    assert server.downloaded == [10]
+    assert [item for item, _ in result.failed] == [2]
+    assert client.metrics.get('export.failed') == 1
+
+
+def test_export_attachments_needs_one_source(tmpdir):
+    client = Confluence('http://localhost', ('user', 'pass'))
+    with pytest.raises(ValueError):
+        client.export_attachments(str(tmpdir))
+    with pytest.raises(ValueError):
+        client.export_attachments(str(tmpdir), space_key='SP', root_page_id=1)
+
+
+class _UploadSession:
+    """Records each request's headers and body, replying with the statuses given."""
+
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.requests = []
+
+    def request(self, method, url, data=None, headers=None, **kwargs):
+        body = b''.join(data) if data is not None else b''
+        self.requests.append((method, url, dict(headers or {}), body))
+        response = requests.Response()
+        response.status_code = self.statuses.pop(0) if self.statuses else 200
+        response.url = url
+        response._content = b'{"id": "att5", "type": "attachment", "status": "current", "title": "a.txt", ' \
+                            b'"_links": {}, "results": []}'
+        response.raw = io.BytesIO(response._content)
+        return response
+
+
+def _upload_client(*statuses):
+    client = Confluence('http://localhost', ('user', 'pass'), retry_policy=RetryPolicy(backoff_factor=0))
+    client._client = _UploadSession(*statuses)
+    return client
+
+
+def test_add_attachment_sends_content_length():
+    client = _upload_client()
+    client.add_attachment(1, io.BytesIO(b'hello'), file_name='a.txt')
+
+    method, url, headers, body = client.client.requests[0]
+    assert (method, url) == ('POST', 'http://localhost/rest/api/content/1/child/attachment')
+    assert headers['Content-Length'] == str(len(body))
+    assert headers['X-Atlassian-Token'] == 'nocheck'
+    assert b'filename="a.txt"\r\nContent-Type: text/plain\r\n\r\nhello\r\n' in body
+
+
+def test_add_attachment_iterable_sent_chunked():
+    client = _upload_client()
+    client.add_attachment(1, iter([b'hel', b'lo']), file_name='a.txt')
+
+    _, _, headers, body = client.client.requests[0]
+    assert 'Content-Length' not in headers
+    assert b'\r\n\r\nhello\r\n' in body
+
+
+def test_update_attachment_data_rewound_for_retry():
+    client = _upload_client(503, 200)
+    client.update_attachment_data(1, 5, io.BytesIO(b'hello'), file_name='a.txt', minor_edit=True)
+
+    first, second = client.client.requests
+    assert second[1] == 'http://localhost/rest/api/content/1/child/attachment/5/data'
+    assert first[3] == second[3]
+    assert b'name="minorEdit"\r\n\r\ntrue' in second[3]
+    assert b'\r\n\r\nhello\r\n' in second[3]
+
+
+def test_add_attachment_iterable_not_retried():
+    client = _upload_client(503, 200)
+    with pytest.raises(ConfluenceError):
+        client.add_attachment(1, iter([b'hello']), file_name='a.txt')
+    assert len(client.client.requests) == 1
+
+
+class _PagingSession:
+    """Records the params of each request, replying with an empty page."""
+
+    def __init__(self):
+        self.params = []
+
+    def request(self, method, url, params=None, **kwargs):
+        self.params.append(dict(params or {}))
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response._content = b'{"results": [], "_links": {}}'
+        return response
+
+
+def test_page_size_sent_as_limit():
+    client = Confluence('http://localhost', ('user', 'pass'), page_size=50)
+    client._client = _PagingSession()
+
+    list(client.get_spaces())
+    list(client.search('type = page', page_size=10))
+    list(client.get_attachments(1))
+
+    assert [params['limit'] for params in client.client.params] == ['50', '10', '50']
+
+
+def test_page_size_defaults_to_server_limit():
+    client = Confluence('http://localhost', ('user', 'pass'))
+    client._client = _PagingSession()
+
+    list(client.get_spaces())
+    list(client.get_spaces(page_size=5))
+
+    assert 'limit' not in client.client.params[0]
+    assert client.client.params[1]['limit'] == '5'
+
+
+def test_object_cache_shared_between_servers():
+    cache = ObjectCache()
+    clients = [Confluence(url, ('user', 'pass'), object_cache=cache) for url in ('http://a', 'http://b')]
+    for client in clients:
+        client._get_json = lambda path, params, expand, url=client._base_url: {'url': url}
+
+    assert [client._get_cached_json('content/1', {}, None) for client in clients] == [{'url': 'http://a'}, {'url': 'http://b'}]
+    assert clients[0]._get_cached_json('content/1', {}, None) == {'url': 'http://a'}
+
+
+def test_get_content_by_ids_batches_into_one_search():
+    client = Confluence('http://localhost', ('user', 'pass'))
+    client._client = _PagingSession()
+
+    assert client.get_content_by_ids([1, 2, 2]) == ({}, [1, 2])
+    assert client.client.params == [{'cql': 'id in (1,2)', 'limit': '2'}]
+
+
+def test_mirror_lists_space_in_large_pages(tmpdir):
+    client = Confluence('http://localhost', ('user', 'pass'))
+    client._client = _PagingSession()
+
+    with MirrorStore(str(tmpdir.join('mirror.db'))) as store:
+        store.apply('SP', [{'id': '1', 'version': {'number': 1}}], [], time.time())
+        result = client.mirror_space(store, 'SP', detect_deletions=True)
+
+    assert result.deleted == [1]
+    assert client.client.params[-1] == {'cql': 'space = "SP" and type in (page, blogpost)', 'limit': '1000'}
+
+
+def test_mirror_only_lists_space_when_detecting_deletions(tmpdir):
+    client = Confluence('http://localhost', ('user', 'pass'))
+    client._client = _PagingSession()
+
+    with MirrorStore(str(tmpdir.join('mirror.db'))) as store:
+        store.apply('SP', [{'id': '1', 'version': {'number': 1}}], [], time.time())
+        result = client.mirror_space(store, 'SP')
+        assert store.versions('SP') == {1: 1}
+
+    assert result.deleted == []
+    assert len(client.client.params) == 1
+
+
+def test_rate_limit_wait_past_deadline_times_out():
+    client = Confluence('http://localhost', ('user', 'pass'), rate_limiter=RateLimiter.per_second(reads=0.01))
+    client._client = _PagingSession()
+
+    with client.call_options(deadline=5):
+        client._request('GET', 'content', {})
+        started = time.time()
+        with pytest.raises(ConfluenceTimeout):
+            client._request('GET', 'content', {})
+
+    assert time.time() - started < 1
+    assert len(client.client.params) == 1
+
+
+class _RoutingSession:
+    """Replies to GETs with the JSON given for the path, recording each request."""
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.requests = []
+
+    def request(self, method, url, params=None, **kwargs):
+        path = url.split('/rest/api/')[1]
+        self.requests.append((path, dict(params or {})))
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response._content = json.dumps(self.routes[path]).encode('utf-8')
+        return response
+
+
+def _content(content_id, status, body=None):
+    content = {'id': str(content_id), 'type': 'page', 'status': status, 'title': 'Draft',
+               'version': {'number': 1, 'minorEdit': False}, '_links': {}}
+    if body is not None:
+        content['body'] = {'storage': {'value': body, 'representation': 'storage'}}
+    return content
+
+
+def test_content_store_fetches_drafts_by_status(tmpdir):
+    client = Confluence('http://localhost', ('user', 'pass'), content_store=ContentStore(str(tmpdir.join('store.db'))))
+    client._client = _RoutingSession({'content': {'results': [_content(5, 'draft')], '_links': {}},
+                                      'content/5': _content(5, 'draft', '<p>draft</p>')})
+
+    for _ in range(2):
+        assert [c.body.storage for c in client.get_content(status='draft', expand=['body.storage'])] == ['<p>draft</p>']
+
+    # Drafts change without a new version so aren't served from the store.
+    assert [r for r in client.client.requests if r[0] == 'content/5'] == \
+        [('content/5', {'status': 'draft', 'expand': 'body.storage,version'})] * 2
@@ -0,0 +1,42 @@
+from confluence.codec import JsonCodec, OrjsonCodec, UjsonCodec, default_codec
+import logging
+import pytest
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+DOCUMENT = {'id': '1', 'title': 'Unicode é€ "quoted"', 'version': {'number': 2, 'minorEdit': False}, 'labels': [None]}
+
+
+def _available_codecs():
+    codecs = [JsonCodec()]
+    for codec_type in (OrjsonCodec, UjsonCodec):
+        try:
+            codecs.append(codec_type())
+        except ImportError:
+            pass
+    return codecs
+
+
+@pytest.mark.parametrize('codec', _available_codecs(), ids=str)
+def test_round_trip(codec):
+    encoded = codec.dumps(DOCUMENT)
+    assert isinstance(encoded, bytes)
+    assert codec.loads(encoded) == DOCUMENT
+    assert codec.loads(encoded.decode('utf-8')) == DOCUMENT
+
+
+@pytest.mark.parametrize('codec', _available_codecs(), ids=str)
+def test_compatible_with_stdlib(codec):
+    assert JsonCodec().loads(codec.dumps(DOCUMENT)) == DOCUMENT
+    assert codec.loads(JsonCodec().dumps(DOCUMENT)) == DOCUMENT
+
+
+@pytest.mark.parametrize('codec', _available_codecs(), ids=str)
+def test_encodes_what_stdlib_encodes(codec):
+    document = {1: 'int key', True: [2 ** 70], None: 1.5}
+    assert codec.loads(codec.dumps(document)) == JsonCodec().loads(JsonCodec().dumps(document))
+
+
+def test_default_codec():
+    assert isinstance(default_codec(), JsonCodec)
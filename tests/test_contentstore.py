@@ -0,0 +1,53 @@
+from confluence.contentstore import ContentStore
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def test_storable_expansions():
+    assert ContentStore.storable(['body.storage'])
+    assert ContentStore.storable(['body.atlas_doc_format', 'version'])
+    assert not ContentStore.storable(['body.view', 'version'])
+    assert not ContentStore.storable(['body.storage', 'body.export_view'])
+    assert not ContentStore.storable(None)
+    assert not ContentStore.storable(['version'])
+    assert not ContentStore.storable(['body.storage', 'children.page'])
+
+
+def test_expand_key_is_order_independent():
+    assert ContentStore.expand_key(['version', 'body.view', 'body.storage']) == 'body.storage,body.view,version'
+    assert ContentStore.expand_key(['body.storage']) == 'body.storage,version'
+
+
+def test_get_only_returns_matching_version(tmpdir):
+    store = ContentStore(os.path.join(str(tmpdir), 'store.db'))
+    store.put_many([('1', 2, b'{"id":"1"}')], 'body.storage,version')
+
+    assert store.get_many({'1': 2}, 'body.storage,version') == {'1': b'{"id":"1"}'}
+    assert store.get_many({'1': 3}, 'body.storage,version') == {}
+    assert store.get_many({'1': 2}, 'body.view,version') == {}
+    assert store.stats() == {'hits': 1, 'misses': 2, 'bytes': 10}
+
+
+def test_persists_between_instances(tmpdir):
+    path = os.path.join(str(tmpdir), 'store.db')
+    store = ContentStore(path)
+    store.put_many([('1', 1, b'one'), ('2', 1, b'two')], 'e')
+    store.close()
+
+    store = ContentStore(path)
+    assert store.get_many({'1': 1, '2': 1}, 'e') == {'1': b'one', '2': b'two'}
+    assert store.stats()['bytes'] == 6
+
+
+def test_evicts_least_recently_used(tmpdir):
+    store = ContentStore(os.path.join(str(tmpdir), 'store.db'), max_bytes=10)
+    store.put_many([('1', 1, b'aaaa')], 'e')
+    store.put_many([('2', 1, b'bbbb')], 'e')
+    store.get_many({'1': 1}, 'e')
+    store.put_many([('3', 1, b'cccc')], 'e')
+
+    assert sorted(store.get_many({'1': 1, '2': 1, '3': 1}, 'e')) == ['1', '3']
+    assert store.stats()['bytes'] == 8
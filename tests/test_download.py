@@ -0,0 +1,61 @@
+from confluence.download import join_segments, parse_content_range, partial_path, partial_size, remove_segments, \
+    segment_ranges
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def test_partial_path():
+    assert partial_path('a.bin', 0) == 'a.bin.part'
+    assert partial_path('a.bin', 100) == 'a.bin.part.100'
+
+
+def test_segment_ranges_cover_file():
+    assert segment_ranges(10, 3, min_segment_size=1) == [(0, 3), (4, 7), (8, 9)]
+
+
+def test_segment_ranges_respect_minimum_size():
+    assert segment_ranges(10, 4, min_segment_size=4) == [(0, 4), (5, 9)]
+    assert segment_ranges(3, 4, min_segment_size=4) == [(0, 2)]
+
+
+def test_segment_ranges_empty_file():
+    assert segment_ranges(0, 4) == []
+
+
+def test_parse_content_range():
+    assert parse_content_range('bytes 10-19/100') == (10, 19, 100)
+    assert parse_content_range('bytes 10-19/*') == (10, 19, None)
+    assert parse_content_range('bytes */100') == (None, None, 100)
+    assert parse_content_range(None) is None
+    assert parse_content_range('rubbish') is None
+
+
+def test_join_segments(tmpdir):
+    path = str(tmpdir.join('a.bin'))
+    ranges = [(0, 1), (2, 3), (4, 4)]
+    for (start, _), data in zip(ranges, [b'ab', b'cd', b'e']):
+        with open(partial_path(path, start), 'wb') as f:
+            f.write(data)
+
+    join_segments(path, ranges)
+
+    with open(partial_path(path, 0), 'rb') as f:
+        assert f.read() == b'abcde'
+    assert not os.path.exists(partial_path(path, 2))
+    assert not os.path.exists(partial_path(path, 4))
+
+
+def test_remove_segments_keeps_first(tmpdir):
+    path = str(tmpdir.join('a.bin'))
+    ranges = [(0, 1), (2, 3)]
+    for start, _ in ranges:
+        with open(partial_path(path, start), 'wb') as f:
+            f.write(b'xy')
+
+    remove_segments(path, ranges)
+
+    assert partial_size(partial_path(path, 0)) == 2
+    assert partial_size(partial_path(path, 2)) == 0
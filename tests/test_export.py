@@ -0,0 +1,66 @@
+from confluence.export import ExportManifest, ExportResult, attachment_path, safe_filename
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def test_safe_filename():
+    assert safe_filename('report.pdf') == 'report.pdf'
+    assert safe_filename('../a/b?.txt') == '.._a_b_.txt'
+    assert safe_filename('..') == '_..'
+    assert safe_filename('') == '_'
+
+
+def test_attachment_path():
+    assert attachment_path('out', 123, 'a/b.txt') == os.path.join('out', '123', 'a_b.txt')
+
+
+def _export(directory, manifest, attachment_id, data, version=1):
+    path = attachment_path(directory, 1, 'a{}.bin'.format(attachment_id))
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'wb') as f:
+        f.write(data)
+    manifest.record(attachment_id, 1, 'a.bin', version, len(data), path)
+    return path
+
+
+def test_manifest_unchanged(tmpdir):
+    directory = str(tmpdir)
+    with ExportManifest(directory) as manifest:
+        path = _export(directory, manifest, 10, b'abc')
+
+        assert manifest.unchanged(10, 1, 3)
+        assert manifest.unchanged(10, 1, None)
+        assert not manifest.unchanged(10, 2, 3)
+        assert not manifest.unchanged(11, 1, 3)
+
+        with open(path, 'wb') as f:
+            f.write(b'a')
+        assert not manifest.unchanged(10, 1, 3)
+
+
+def test_manifest_reloaded(tmpdir):
+    directory = str(tmpdir)
+    with ExportManifest(directory) as manifest:
+        _export(directory, manifest, 10, b'abc')
+        _export(directory, manifest, 10, b'abcd', version=2)
+
+    with open(os.path.join(directory, 'manifest.jsonl'), 'a') as f:
+        f.write('{"id": 11, "trunc')
+
+    with ExportManifest(directory) as manifest:
+        assert manifest.get(10)['version'] == 2
+        assert manifest.get(10)['path'] == os.path.join('1', 'a10.bin')
+        assert manifest.get(11) is None
+        assert manifest.unchanged(10, 2, 4)
+
+
+def test_export_result_str():
+    result = ExportResult()
+    result.add_downloaded('a', 10)
+    result.add_skipped('b')
+    result.add_failed('c', ValueError())
+    assert str(result) == '1 downloaded (10 bytes), 1 skipped, 1 failed'
@@ -0,0 +1,184 @@
+from confluence.asyncclient import AsyncConfluence
+from confluence.client import Confluence
+from confluence.exceptions.versionconflict import ConfluenceVersionConflict
+from confluence.metrics import Metrics
+from confluence.retry import RetryPolicy
+import asyncio
+import io
+import json
+import logging
+import pytest
+import requests
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def test_counters():
+    metrics = Metrics()
+    assert metrics.get('a') == 0
+    metrics.increment('a')
+    metrics.increment('a', 2)
+    metrics.increment('b')
+    assert metrics.get('a') == 3
+    assert metrics.snapshot() == {'a': 3, 'b': 1}
+    metrics.reset()
+    assert metrics.snapshot() == {}
+
+
+def _client():
+    return Confluence('http://localhost', ('user', 'pass'), retry_policy=RetryPolicy(backoff_factor=0))
+
+
+def test_compare_and_swap_retries_conflicts():
+    client = _client()
+    versions = iter([1, 2, 3])
+
+    def update(version):
+        if version < 3:
+            raise ConfluenceVersionConflict('content/1', {}, None)
+        return version
+
+    assert client._compare_and_swap(lambda: next(versions), update, 5) == 3
+    assert client.metrics.snapshot() == {'cas.conflicts': 2, 'cas.retries': 2, 'cas.updates': 1}
+
+
+def test_compare_and_swap_gives_up():
+    client = _client()
+
+    def update(version):
+        raise ConfluenceVersionConflict('content/1', {}, None)
+
+    with pytest.raises(ConfluenceVersionConflict):
+        client._compare_and_swap(lambda: 1, update, 2)
+    assert client.metrics.snapshot() == {'cas.conflicts': 2, 'cas.retries': 1, 'cas.failures': 1}
+
+
+class _VersionedServer:
+    """
+    Holds one versioned object at path, which someone else edits just
+    before each of the first `conflicts` updates made to it.
+    """
+
+    def __init__(self, path, conflicts):
+        self.path = path
+        self.conflicts = conflicts
+        self.value = 'v1'
+        self.version = 1
+        self.writes = 0
+
+    def _json(self):
+        version = {'number': self.version, 'minorEdit': False}
+        if self.path.startswith('content/1/') or self.path.startswith('space/'):
+            return {'key': 'k', 'value': self.value, 'version': version}
+        return {'id': '1', 'type': 'page', 'status': 'current', 'title': 'Page', 'version': version,
+                'body': {'storage': {'value': self.value, 'representation': 'storage'}}, '_links': {}}
+
+    def handle(self, method, path, body):
+        assert path == self.path
+        if method == 'GET':
+            return 200, self._json()
+        self.writes += 1
+        data = json.loads(body)
+        if self.conflicts:
+            self.conflicts -= 1
+            self.version += 1
+            self.value += '+other'
+        if data['version']['number'] != self.version + 1:
+            return 409, {'message': 'Version conflict'}
+        self.version = data['version']['number']
+        self.value = data['value'] if 'value' in data else data['body']['storage']['value']
+        return 200, self._json()
+
+
+class _Session:
+    def __init__(self, server):
+        self.server = server
+
+    def request(self, method, url, params=None, data=None, **kwargs):
+        status, payload = self.server.handle(method, url.split('/rest/api/')[1], data)
+        response = requests.Response()
+        response.status_code = status
+        response.url = url
+        response._content = json.dumps(payload).encode('utf-8')
+        response.raw = io.BytesIO(response._content)
+        return response
+
+
+class _AsyncResponse:
+    def __init__(self, status, body):
+        self.status = status
+        self.reason = 'Reason'
+        self.headers = {}
+        self.body = body
+
+    async def read(self):
+        return self.body
+
+    def release(self):
+        pass
+
+
+class _AsyncSession:
+    def __init__(self, server):
+        self.server = server
+
+    async def request(self, method, url, params=None, data=None, **kwargs):
+        status, payload = self.server.handle(method, url.split('/rest/api/')[1], data)
+        return _AsyncResponse(status, json.dumps(payload).encode('utf-8'))
+
+    async def close(self):
+        pass
+
+
+MODIFY = [
+    ('content/1', lambda c, n: c.modify_content(1, lambda page: page.body.storage + '!', max_attempts=n)),
+    ('content/1/property/k', lambda c, n: c.modify_content_property(1, 'k', lambda value: value + '!', max_attempts=n)),
+    ('space/SP/property/k', lambda c, n: c.modify_space_property('SP', 'k', lambda value: value + '!', max_attempts=n)),
+]
+
+
+def _value(result):
+    return result.body.storage if hasattr(result, 'body') else result.value
+
+
+@pytest.mark.parametrize('path,modify', MODIFY)
+def test_modify_retries_conflicts(path, modify):
+    client = _client()
+    client._client = _Session(_VersionedServer(path, conflicts=2))
+
+    result = modify(client, 5)
+    # The transform was applied again to the other edits each time.
+    assert (_value(result), result.version.number) == ('v1+other+other!', 4)
+    assert client.metrics.snapshot() == {'cas.conflicts': 2, 'cas.retries': 2, 'cas.updates': 1}
+
+
+@pytest.mark.parametrize('path,modify', MODIFY)
+def test_modify_gives_up(path, modify):
+    client = _client()
+    server = _VersionedServer(path, conflicts=3)
+    client._client = _Session(server)
+
+    with pytest.raises(ConfluenceVersionConflict):
+        modify(client, 3)
+    assert server.writes == 3
+    assert client.metrics.snapshot() == {'cas.conflicts': 3, 'cas.retries': 2, 'cas.failures': 1}
+
+
+@pytest.mark.parametrize('path,modify', MODIFY)
+def test_async_modify_retries_conflicts(path, modify):
+    client = AsyncConfluence('http://localhost', ('user', 'pass'), retry_policy=RetryPolicy(backoff_factor=0))
+    server = _VersionedServer(path, conflicts=2)
+    client._session = _AsyncSession(server)
+
+    loop = asyncio.new_event_loop()
+    try:
+        result = loop.run_until_complete(modify(client, 5))
+        assert (_value(result), result.version.number) == ('v1+other+other!', 4)
+
+        server.conflicts = 5
+        with pytest.raises(ConfluenceVersionConflict):
+            loop.run_until_complete(modify(client, 2))
+    finally:
+        loop.close()
+    assert client.metrics.snapshot() == {'cas.conflicts': 4, 'cas.retries': 3, 'cas.updates': 1, 'cas.failures': 1}
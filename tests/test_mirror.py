@@ -0,0 +1,93 @@
+from confluence.mirror import MirrorResult, MirrorRun, MirrorStore, modified_since
+import confluence.mirror
+import logging
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def test_modified_since_rounds_up_and_overlaps():
+    assert modified_since(1000.0, 1000.0) == 'lastmodified >= now("-5m")'
+    assert modified_since(1000.0, 1061.0, overlap_minutes=1) == 'lastmodified >= now("-3m")'
+    assert modified_since(1000.0, 900.0, overlap_minutes=0) == 'lastmodified >= now("-0m")'
+
+
+def _page(content_id, version, body='body'):
+    return {'id': str(content_id), 'type': 'page', 'status': 'current', 'title': 'p{}'.format(content_id),
+            'version': {'number': version, 'minorEdit': False},
+            'body': {'storage': {'value': body, 'representation': 'storage'}}, '_links': {}}
+
+
+def test_store_apply(tmpdir):
+    path = str(tmpdir.join('mirror.db'))
+    with MirrorStore(path) as store:
+        assert store.checkpoint('SP') is None
+        store.apply('SP', [_page(1, 1), _page(2, 1)], [], 100.0)
+        store.apply('SP', [_page(2, 2, 'new')], [1], 200.0)
+        store.apply('OTHER', [_page(3, 1)], [], 300.0)
+
+    with MirrorStore(path) as store:
+        assert store.checkpoint('SP') == 200.0
+        assert store.versions('SP') == {2: 2}
+        assert store.get(1) is None
+        assert store.get(2).body.storage == 'new'
+        assert [c.id for c in store.contents('OTHER')] == [3]
+
+
+def test_mirror_result_str():
+    assert str(MirrorResult('SP', True, [1, 2], [])) == 'Full mirror of SP: 2 updated, 0 deleted'
+    assert str(MirrorResult('SP', False, [], [3])) == 'Mirrored changes to SP: 0 updated, 1 deleted'
+
+
+def test_full_run_stores_in_batches(tmpdir, monkeypatch):
+    monkeypatch.setattr(confluence.mirror, 'LISTING_PAGE_SIZE', 2)
+    with MirrorStore(str(tmpdir.join('mirror.db'))) as store:
+        run = MirrorRun(store, 'SP')
+        assert run.full and 'version' in run.expand
+        for i in range(3):
+            run.add(_page(i, 1))
+        assert store.versions('SP') == {0: 1, 1: 1}
+        assert store.checkpoint('SP') is None
+
+        result = run.finish()
+        assert store.versions('SP') == {0: 1, 1: 1, 2: 1}
+        assert store.checkpoint('SP') == run.started
+        assert result.updated == [0, 1, 2]
+
+
+def test_failed_run_leaves_checkpoint(tmpdir, monkeypatch):
+    monkeypatch.setattr(confluence.mirror, 'LISTING_PAGE_SIZE', 1)
+    with MirrorStore(str(tmpdir.join('mirror.db'))) as store:
+        store.apply('SP', [_page(1, 1)], [], 100.0)
+        run = MirrorRun(store, 'SP')
+        run.plan({1: 2, 2: 1})
+        run.add(_page(1, 2))
+
+        assert store.versions('SP') == {1: 2}
+        assert store.checkpoint('SP') == 100.0
+
+
+def test_incremental_run_plan():
+    store = MirrorStore(':memory:')
+    store.apply('SP', [_page(1, 1), _page(2, 1), _page(3, 1)], [], 100.0)
+    run = MirrorRun(store, 'SP', overlap_minutes=0)
+    assert not run.full
+    assert run.changes.startswith('space = "SP" and type in (page, blogpost) and lastmodified >= now(')
+
+    # 1 changed, 2 unchanged, 3 deleted and 4 moved into the space.
+    assert sorted(run.plan({1: 2, 2: 1}, [1, 2, 4])) == [1, 4]
+    run.add(_page(4, 1))
+    result = run.finish()
+    # 1 disappeared before it could be fetched.
+    assert (sorted(result.updated), sorted(result.deleted)) == ([4], [1, 3])
+    assert store.versions('SP') == {2: 1, 4: 1}
+
+
+def test_incremental_run_without_listing_keeps_content():
+    store = MirrorStore(':memory:')
+    store.apply('SP', [_page(1, 1), _page(2, 1)], [], 100.0)
+    run = MirrorRun(store, 'SP')
+    assert run.plan({2: 2}) == [2]
+    run.add(_page(2, 2))
+    assert run.finish().deleted == []
+    assert store.versions('SP') == {1: 1, 2: 2}
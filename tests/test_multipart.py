@@ -0,0 +1,107 @@
+from confluence.multipart import MultipartEncoder, ProgressTotal, content_length, path_of
+import io
+import logging
+import pytest
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+EXPECTED = b'--b\r\nContent-Disposition: form-data; name="minorEdit"\r\n\r\ntrue\r\n' \
+           b'--b\r\nContent-Disposition: form-data; name="file"; filename="a.txt"\r\n' \
+           b'Content-Type: text/plain\r\n\r\nhello world\r\n--b--\r\n'
+
+
+def _encoder(content, **kwargs):
+    return MultipartEncoder([('minorEdit', 'true'), ('file', ('a.txt', content))], boundary='b', chunk_size=4, **kwargs)
+
+
+def test_body_from_bytes():
+    encoder = _encoder(b'hello world')
+    assert encoder.content_type == 'multipart/form-data; boundary=b'
+    assert encoder.len == len(EXPECTED)
+    assert b''.join(encoder) == EXPECTED
+
+
+def test_body_from_path(tmpdir):
+    path = tmpdir.join('a.txt')
+    path.write_binary(b'hello world')
+    assert b''.join(_encoder(str(path))) == EXPECTED
+    assert b''.join(_encoder(path)) == EXPECTED
+
+
+def test_body_from_file_object_starts_at_current_position():
+    f = io.BytesIO(b'xxhello world')
+    f.seek(2)
+    encoder = _encoder(f)
+    assert encoder.len == len(EXPECTED)
+    assert b''.join(encoder) == EXPECTED
+
+
+def test_body_from_iterable_has_no_length():
+    encoder = _encoder(iter([b'hello', b' ', b'world']))
+    assert encoder.len is None
+    assert b''.join(encoder) == EXPECTED
+    assert not encoder.rewindable
+    with pytest.raises(ValueError):
+        encoder.rewind()
+
+
+def test_read_in_pieces():
+    encoder = _encoder(memoryview(b'hello world'))
+    pieces = []
+    while True:
+        piece = encoder.read(7)
+        if not piece:
+            break
+        assert len(piece) <= 7
+        pieces.append(piece)
+    assert b''.join(pieces) == EXPECTED
+
+
+def test_rewind_and_progress():
+    progress = []
+    encoder = _encoder(io.BytesIO(b'hello world'), progress=lambda sent, total: progress.append((sent, total)))
+    assert encoder.read() == EXPECTED
+    assert progress[-1] == (len(EXPECTED), len(EXPECTED))
+
+    assert encoder.rewindable
+    encoder.rewind()
+    assert encoder.bytes_read == 0
+    assert encoder.read() == EXPECTED
+
+
+def test_content_type_guessed_from_filename():
+    def header(*value):
+        return b''.join(MultipartEncoder([('file', value)], boundary='b')).split(b'\r\n\r\n')[0]
+
+    assert header('a.png', b'').endswith(b'filename="a.png"\r\nContent-Type: image/png')
+    assert header('a.png', b'', 'image/gif').endswith(b'Content-Type: image/gif')
+    assert header('a.unknownext', b'').endswith(b'filename="a.unknownext"')
+
+
+def test_filename_quoted():
+    encoder = MultipartEncoder([('file', ('a"b\n.txt', b''))], boundary='b')
+    assert b'filename="a%22b%0A.txt"' in b''.join(encoder)
+
+
+def test_path_of():
+    assert path_of('a.txt') == 'a.txt'
+    assert path_of(b'data') is None
+    assert path_of(io.BytesIO()) is None
+
+
+def test_content_length():
+    assert content_length(b'abc') == 3
+    assert content_length(io.BytesIO(b'abcd')) == 4
+    assert content_length(iter([b'a'])) is None
+
+
+def test_progress_total_combines_bodies():
+    progress = []
+    total = ProgressTotal(lambda sent, size: progress.append((sent, size)), 30)
+    first, second = total.callback(1), total.callback(2)
+    first(10, 15)
+    second(5, 15)
+    first(15, 15)
+    first(0, 15)
+    assert progress == [(10, 30), (15, 30), (20, 30), (5, 30)]
@@ -0,0 +1,117 @@
+from confluence.paging import offset_pages, prefetch
+import logging
+import pytest
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def test_prefetch_preserves_order():
+    assert list(prefetch(iter(range(100)), 3)) == list(range(100))
+
+
+def test_prefetch_reraises_errors_in_order():
+    def pages():
+        yield 1
+        yield 2
+        raise KeyError('boom')
+
+    results = []
+    with pytest.raises(KeyError):
+        for p in prefetch(pages(), 2):
+            results.append(p)
+    assert results == [1, 2]
+
+
+def test_prefetch_runs_ahead_of_consumer():
+    fetched = threading.Event()
+
+    def pages():
+        yield 1
+        yield 2
+        fetched.set()
+
+    it = prefetch(pages(), 2)
+    assert next(it) == 1
+    assert fetched.wait(5)
+
+
+def test_prefetch_invalid_depth():
+    with pytest.raises(ValueError):
+        prefetch([], 0)
+
+
+def _fake_resource(total, limit):
+    def fetch_page(start, page_limit):
+        assert page_limit == limit
+        results = list(range(start, min(start + page_limit, total)))
+        links = {'next': 'more'} if start + page_limit < total else {}
+        return {'results': results, 'start': start, 'limit': page_limit, 'size': len(results), '_links': links}
+    return fetch_page
+
+
+def test_offset_pages_in_order():
+    pages = offset_pages(_fake_resource(1000, 25), 25, 25, 8)
+    assert [r for p in pages for r in p['results']] == list(range(25, 1000))
+
+
+def test_offset_pages_unordered_returns_everything_once():
+    pages = offset_pages(_fake_resource(1000, 25), 0, 25, 8, ordered=False)
+    assert sorted(r for p in pages for r in p['results']) == list(range(1000))
+
+
+def test_offset_pages_uses_total_size():
+    requested = []
+
+    def fetch_page(start, limit):
+        requested.append(start)
+        return _fake_resource(100, 10)(start, limit)
+
+    list(offset_pages(fetch_page, 0, 10, 4, total_size=100))
+    assert sorted(requested) == list(range(0, 100, 10))
+
+
+def test_offset_pages_stops_after_short_page():
+    pages = list(offset_pages(_fake_resource(30, 25), 25, 25, 8))
+    assert [r for p in pages for r in p['results']] == list(range(25, 30))
+
+
+def _failing_past(total, limit, before_last=None):
+    resource = _fake_resource(total, limit)
+
+    def fetch_page(start, page_limit):
+        if start >= total:
+            try:
+                raise IOError('no such page')
+            finally:
+                if before_last is not None:
+                    before_last.set()
+        if before_last is not None and start + page_limit >= total:
+            # Let the page past the end fail first.
+            before_last.wait(1)
+            time.sleep(0.05)
+        return resource(start, page_limit)
+    return fetch_page
+
+
+def test_offset_pages_ignores_errors_past_the_end():
+    pages = offset_pages(_failing_past(30, 10), 0, 10, 8)
+    assert [r for p in pages for r in p['results']] == list(range(30))
+
+
+def test_offset_pages_unordered_ignores_errors_past_the_end():
+    pages = offset_pages(_failing_past(25, 10, threading.Event()), 0, 10, 4, ordered=False)
+    assert sorted(r for p in pages for r in p['results']) == list(range(25))
+
+
+def test_offset_pages_raises_errors_before_the_end():
+    def fetch_page(start, limit):
+        if start == 10:
+            raise IOError('failed')
+        return _fake_resource(50, 10)(start, limit)
+
+    for ordered in (True, False):
+        with pytest.raises(IOError):
+            list(offset_pages(fetch_page, 0, 10, 4, ordered=ordered))
@@ -0,0 +1,35 @@
+from confluence.ratelimit import RateLimiter, RequestKind, TokenBucket
+import logging
+import pytest
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def test_burst_does_not_wait():
+    bucket = TokenBucket(rate=10, capacity=5)
+    assert all(bucket.acquire() == 0 for _ in range(5))
+
+
+def test_empty_bucket_waits_for_refill():
+    bucket = TokenBucket(rate=100, capacity=1)
+    bucket.acquire()
+    assert 0 < bucket.acquire() <= 0.01
+
+
+def test_invalid_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+
+
+def test_downloads_share_reads_bucket_by_default():
+    reads = TokenBucket(rate=100, capacity=1)
+    limiter = RateLimiter(reads=reads)
+    limiter.acquire(RequestKind.DOWNLOAD)
+    assert reads.acquire() > 0
+
+
+def test_unlimited_kinds_never_block():
+    limiter = RateLimiter.per_second(reads=1)
+    for _ in range(100):
+        limiter.acquire(RequestKind.WRITE)
@@ -0,0 +1,62 @@
+from confluence.retry import RetryPolicy
+import logging
+import requests
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def _response(status_code, headers=None):
+    r = requests.Response()
+    r.status_code = status_code
+    r.headers.update(headers or {})
+    return r
+
+
+def test_throttled_post_is_retried():
+    policy = RetryPolicy(backoff_factor=0.1)
+    assert policy.delay_after_response('POST', _response(429), 1, 0) is not None
+
+
+def test_server_error_post_is_not_retried():
+    policy = RetryPolicy()
+    assert policy.delay_after_response('POST', _response(500), 1, 0) is None
+    assert policy.delay_after_response('GET', _response(500), 1, 0) is not None
+
+
+def test_client_errors_are_not_retried():
+    policy = RetryPolicy()
+    assert policy.delay_after_response('GET', _response(404), 1, 0) is None
+
+
+def test_retry_after_is_honoured():
+    policy = RetryPolicy()
+    assert policy.delay_after_response('GET', _response(429, {'Retry-After': '7'}), 1, 0) == 7
+
+
+def test_retry_after_http_date():
+    assert RetryPolicy.retry_after(_response(503, {'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})) == 0
+
+
+def test_attempts_are_bounded():
+    policy = RetryPolicy(max_attempts=3)
+    assert policy.delay_after_response('GET', _response(503), 2, 0) is not None
+    assert policy.delay_after_response('GET', _response(503), 3, 0) is None
+
+
+def test_deadline_stops_retries():
+    policy = RetryPolicy(deadline=10)
+    assert policy.delay_after_response('GET', _response(429, {'Retry-After': '5'}), 1, 4) == 5
+    assert policy.delay_after_response('GET', _response(429, {'Retry-After': '5'}), 1, 6) is None
+
+
+def test_backoff_is_capped():
+    policy = RetryPolicy(backoff_factor=1, max_backoff=2)
+    assert all(0 <= policy.backoff(10) <= 2 for _ in range(100))
+
+
+def test_connection_errors():
+    policy = RetryPolicy()
+    assert policy.delay_after_error('POST', requests.exceptions.ConnectTimeout(), 1, 0) is not None
+    assert policy.delay_after_error('POST', requests.exceptions.ReadTimeout(), 1, 0) is None
+    assert policy.delay_after_error('GET', requests.exceptions.ConnectionError(), 1, 0) is not None
@@ -0,0 +1,138 @@
+from confluence.singleflight import SingleFlight
+import logging
+import pytest
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def _run_concurrently(flight, key, fn, callers):
+    results = []
+    errors = []
+
+    def call():
+        try:
+            results.append(flight.do(key, fn))
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_concurrent_calls_share_one_result():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return {'id': '1'}
+
+    timer = threading.Timer(0.2, release.set)
+    timer.start()
+    results, errors = _run_concurrently(flight, 'k', fn, 5)
+
+    assert len(calls) == 1
+    assert results == [{'id': '1'}] * 5
+    assert all(r is results[0] for r in results)
+    assert flight.coalesced == 4
+
+
+def test_errors_raised_to_every_caller():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fn():
+        release.wait(5)
+        raise ValueError('failed')
+
+    timer = threading.Timer(0.2, release.set)
+    timer.start()
+    results, errors = _run_concurrently(flight, 'k', fn, 3)
+
+    assert results == []
+    assert len(errors) == 3
+
+
+def test_sequential_calls_not_shared():
+    flight = SingleFlight()
+    calls = []
+    flight.do('k', lambda: calls.append(1))
+    flight.do('k', lambda: calls.append(1))
+    assert len(calls) == 2
+    assert flight.coalesced == 0
+
+
+def test_key_released_after_error():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        flight.do('k', fail)
+    assert flight.do('k', lambda: 1) == 1
+
+
+def _wait_until(condition):
+    for _ in range(500):
+        if condition():
+            return
+        time.sleep(0.01)
+    raise AssertionError('condition never met')
+
+
+def _start_leader(flight, fn):
+    results = []
+    thread = threading.Thread(target=lambda: results.append(flight.do('k', fn)))
+    thread.start()
+    return thread, results
+
+
+def test_waiter_calls_fn_when_its_timeout_runs_out():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return 'leader'
+
+    thread, results = _start_leader(flight, slow)
+    started.wait(5)
+    assert flight.do('k', lambda: 'own', timeout=0) == 'own'
+    release.set()
+    thread.join()
+    assert results == ['leader']
+
+
+def test_waiter_calls_fn_when_error_not_shared():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ValueError('leader')
+
+    leader = threading.Thread(target=lambda: pytest.raises(ValueError, flight.do, 'k', fail))
+    leader.start()
+    started.wait(5)
+
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(
+        flight.do('k', lambda: 'own', shares_error=lambda e: not isinstance(e, ValueError))))
+    waiter.start()
+    _wait_until(lambda: flight.coalesced == 1)
+    release.set()
+    leader.join()
+    waiter.join()
+    assert results == ['own']
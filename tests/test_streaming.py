@@ -0,0 +1,83 @@
+from confluence.streaming import StreamedPage
+import json
+import logging
+import pytest
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def _chunks(document, size):
+    data = json.dumps(document, ensure_ascii=False).encode('utf-8')
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+PAGE = {
+    'results': [
+        {'id': '1', 'title': 'Quotes " and \\ backslashes', 'body': {'storage': {'value': '<p class="a">é€</p>'}}},
+        {'id': '2', 'title': 'Brackets ]} in strings {[', 'labels': [1, 2.5, True, None]},
+    ],
+    'start': 0,
+    'limit': 2,
+    'size': 2,
+    '_links': {'next': '/rest/api/content?start=2'},
+}
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 64, 100000])
+def test_results_are_streamed(chunk_size):
+    page = StreamedPage(_chunks(PAGE, chunk_size))
+    assert list(page) == PAGE['results']
+    assert page.envelope['_links'] == PAGE['_links']
+    assert page.envelope['results'] == []
+
+
+def test_results_after_other_keys():
+    document = {'_links': {}, 'size': 0, 'results': [{'a': 1}]}
+    page = StreamedPage(_chunks(document, 5))
+    assert list(page) == [{'a': 1}]
+    assert page.envelope == {'_links': {}, 'size': 0, 'results': []}
+
+
+def test_empty_results():
+    page = StreamedPage(_chunks({'results': [], '_links': {}}, 3))
+    assert list(page) == []
+    assert page.envelope == {'results': [], '_links': {}}
+
+
+def test_missing_results():
+    page = StreamedPage(_chunks({'_links': {}}, 3))
+    assert list(page) == []
+    assert page.envelope == {'_links': {}}
+
+
+def test_items_are_yielded_before_the_page_ends():
+    def chunks():
+        yield b'{"results": [{"id": 1}, '
+        raise IOError('connection dropped')
+
+    results = iter(StreamedPage(chunks()))
+    assert next(results) == {'id': 1}
+    with pytest.raises(IOError):
+        next(results)
+
+
+def test_buffer_holds_only_unscanned_text():
+    # A large item arriving in small chunks mustn't be copied on each one.
+    document = {'results': [{'body': 'x' * 10000, 'labels': list(range(1000))}], '_links': {}}
+    sizes = []
+
+    def chunks():
+        for chunk in _chunks(document, 16):
+            sizes.append(len(page._buffer))
+            yield chunk
+
+    page = StreamedPage(chunks())
+    assert list(page) == document['results']
+    assert page.envelope == {'results': [], '_links': {}}
+    assert max(sizes) <= 32
+
+
+def test_truncated_document():
+    with pytest.raises(ValueError):
+        list(StreamedPage([b'{"results": [{"id": 1']))
@@ -0,0 +1,44 @@
+from confluence.timeouts import CallOptions
+import logging
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def test_no_deadline():
+    options = CallOptions(timeout=(5, 30))
+    assert options.remaining() is None
+    assert not options.expired()
+    assert options.request_timeout() == (5, 30)
+
+
+def test_request_timeout_capped_by_deadline():
+    options = CallOptions(timeout=(5, 30), deadline=10)
+    connect, read = options.request_timeout()
+    assert connect == 5
+    assert 9 < read <= 10
+
+    assert 9 < CallOptions(timeout=30, deadline=10).request_timeout() <= 10
+    assert all(9 < t <= 10 for t in CallOptions(deadline=10).request_timeout())
+
+
+def test_expired():
+    options = CallOptions(deadline=0)
+    assert options.expired()
+    assert options.remaining() <= 0
+
+
+def test_nested_keeps_earlier_deadline():
+    outer = CallOptions(timeout=5, deadline=10)
+
+    inner = outer.nested(deadline=60)
+    assert inner.deadline == 10
+    assert inner.remaining() <= 10
+    assert inner.timeout == 5
+
+    inner = outer.nested(timeout=1, deadline=2)
+    assert inner.deadline == 2
+    assert inner.timeout == 1
+
+    assert outer.nested().deadline == 10
+    assert CallOptions().nested(deadline=3).deadline == 3
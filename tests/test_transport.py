@@ -0,0 +1,104 @@
+import logging
+import pytest
+import requests
+
+httpx = pytest.importorskip('httpx')
+
+from confluence.transport import Http2Session  # noqa: E402
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def test_timeout_conversion():
+    assert Http2Session._timeout(None) == httpx.Timeout(None)
+    assert Http2Session._timeout(5) == httpx.Timeout(5)
+    assert Http2Session._timeout((2, 30)) == httpx.Timeout(30, connect=2)
+
+
+def test_errors_translated_to_requests_exceptions():
+    assert isinstance(Http2Session._translate_error(httpx.ConnectTimeout('')), requests.exceptions.ConnectTimeout)
+    assert isinstance(Http2Session._translate_error(httpx.ReadTimeout('')), requests.exceptions.ReadTimeout)
+    assert isinstance(Http2Session._translate_error(httpx.ConnectError('')), requests.exceptions.ConnectionError)
+    assert not isinstance(Http2Session._translate_error(httpx.ConnectError('')), requests.exceptions.Timeout)
+
+
+def _session(handler):
+    session = Http2Session(('user', 'pass'))
+    session._client = httpx.Client(transport=httpx.MockTransport(handler))
+    return session
+
+
+def _echo(request):
+    return httpx.Response(200, json={'url': str(request.url), 'body': request.read().decode('utf-8'),
+                                     'type': request.headers.get('Content-Type'),
+                                     'length': request.headers.get('Content-Length'),
+                                     'chunked': request.headers.get('Transfer-Encoding')})
+
+
+def test_params_merged_onto_query_string():
+    response = _session(_echo).request('GET', 'http://localhost/rest/api/content?start=25&limit=25',
+                                       params={'expand': 'version'})
+    sent = httpx.URL(response.json()['url'])
+    assert dict(sent.params) == {'start': '25', 'limit': '25', 'expand': 'version'}
+
+
+def test_bytes_and_str_data_sent_as_content():
+    session = _session(_echo)
+    assert session.request('POST', 'http://localhost/', data=b'{"a": 1}').json()['body'] == '{"a": 1}'
+    sent = session.request('POST', 'http://localhost/', data='{"b": 2}').json()
+    assert sent['body'] == '{"b": 2}'
+    assert sent['length'] == '8'
+
+
+def test_readable_data_streamed():
+    class Body:
+        def __init__(self):
+            self.chunks = [b'hel', b'lo']
+
+        def read(self, size=-1):
+            return b''.join(self.chunks)
+
+        def __iter__(self):
+            return iter(self.chunks)
+
+    sent = _session(_echo).request('POST', 'http://localhost/', data=Body()).json()
+    assert sent['body'] == 'hello'
+    assert sent['chunked'] == 'chunked'
+
+
+def test_form_data_and_files():
+    session = _session(_echo)
+    assert session.request('POST', 'http://localhost/', data={'a': '1'}).json()['body'] == 'a=1'
+    sent = session.request('POST', 'http://localhost/', files={'file': ('a.txt', b'hello')}).json()
+    assert sent['type'].startswith('multipart/form-data')
+    assert 'filename="a.txt"' in sent['body']
+    assert 'hello' in sent['body']
+
+
+def test_response_translated():
+    def handler(request):
+        return httpx.Response(404, headers={'X-Test': 'yes'}, content=b'missing')
+
+    response = _session(handler).request('GET', 'http://localhost/')
+    assert response.status_code == 404
+    assert response.headers['x-test'] == 'yes'
+    assert response.content == b'missing'
+    assert response.url == 'http://localhost/'
+
+
+def test_streamed_response():
+    def handler(request):
+        return httpx.Response(200, content=iter([b'abc', b'def']))
+
+    response = _session(handler).request('GET', 'http://localhost/', stream=True)
+    assert b''.join(response.iter_content(chunk_size=2)) == b'abcdef'
+    response.close()
+
+
+def test_transport_errors_translated():
+    def handler(request):
+        raise httpx.ConnectError('refused', request=request)
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        _session(handler).request('GET', 'http://localhost/')